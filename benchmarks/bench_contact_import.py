@@ -0,0 +1,95 @@
+"""Filas por segundo al importar contactos: escritura fila a fila frente a lotes.
+
+Genera un CSV con N filas (con teléfonos repetidos y etiquetas) e importa el
+mismo archivo para dos usuarios nuevos:
+
+- fila a fila: un SELECT por teléfono y un objeto Contact por fila (la
+  implementación anterior de import_csv/import_excel);
+- por lotes: src.utils.importers.import_contacts (set de repetidos, IN por
+  bloques e INSERT de varias filas con ON CONFLICT DO NOTHING).
+
+Uso:
+    python benchmarks/bench_contact_import.py
+    python benchmarks/bench_contact_import.py --rows 100000
+    DATABASE_URL=postgresql://... python benchmarks/bench_contact_import.py   # base vacía
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'import.db')
+
+from src.main import app
+from src.migrate import upgrade
+from src.models.user import db, Contact, User
+from src.utils.importers import IMPORT_BATCH_SIZE, ImportReport, batched, contact_records, csv_rows, import_contacts
+
+TAGS = ['', '', 'vip', 'cliente', 'vip,cliente', 'proveedor']
+
+
+def build_csv(rows, duplicates=0.05):
+    rng = random.Random(42)
+    lines = ['name,phone,email,tags']
+    for i in range(rows):
+        # Un porcentaje de filas repite un teléfono anterior
+        number = rng.randrange(i) if i and rng.random() < duplicates else i
+        lines.append(f'Contacto {i},6{number:08d},c{i}@ejemplo.com,"{rng.choice(TAGS)}"')
+    return ('\n'.join(lines) + '\n').encode()
+
+
+def row_by_row(user_id, records, report, batch_size=IMPORT_BATCH_SIZE):
+    """Escritura anterior: comprobación e INSERT por fila a través del ORM"""
+    tag_cache = {}
+    for batch in batched(records, batch_size):
+        for row_num, record in batch:
+            # autoflush: el SELECT ve también las filas pendientes del lote
+            if Contact.query.filter_by(user_id=user_id, phone=record['phone']).first():
+                report.reject(row_num, f"Ya existe contacto con teléfono {record['phone']}")
+                continue
+            contact = Contact(user_id=user_id, name=record['name'], phone=record['phone'], email=record['email'])
+            contact.set_tags(record['tags'], tag_cache=tag_cache)
+            db.session.add(contact)
+            report.imported += 1
+        db.session.commit()
+    return report
+
+
+def run(label, writer, data, email):
+    user = User(email=email, name=label)
+    user.set_password('benchmark')
+    db.session.add(user)
+    db.session.commit()
+
+    report = ImportReport()
+    started = time.perf_counter()
+    writer(user.id, contact_records(csv_rows(io.BytesIO(data)), report), report)
+    elapsed = time.perf_counter() - started
+    print(f'{label:<14}{report.read:>9}{report.imported:>11}{report.rejected:>11}'
+          f'{elapsed:>10.2f}{report.read / elapsed:>12.0f}')
+    return report.read / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', type=int, default=20000)
+    args = parser.parse_args()
+
+    data = build_csv(args.rows)
+    with app.app_context():
+        upgrade(db.engine, log=lambda message: None)
+        suffix = int(time.time())
+        print(f'{"escritura":<14}{"leídas":>9}{"importadas":>11}{"rechazadas":>11}{"s":>10}{"filas/s":>12}')
+        before = run('fila a fila', row_by_row, data, f'bench-rows-{suffix}@example.com')
+        after = run('por lotes', import_contacts, data, f'bench-batch-{suffix}@example.com')
+        print(f'x{after / before:.1f}')
+
+
+if __name__ == '__main__':
+    main()
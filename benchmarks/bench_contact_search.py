@@ -0,0 +1,112 @@
+"""Latencia p50/p99 de la búsqueda de contactos: ILIKE '%término%' frente al índice de texto.
+
+Crea una base de datos con N contactos repartidos entre varios usuarios, aplica
+las migraciones (FTS5 en SQLite, pg_trgm en PostgreSQL) y mide la primera página
+de resultados para una batería de términos.
+
+Uso:
+    python benchmarks/bench_contact_search.py
+    python benchmarks/bench_contact_search.py --contacts 1000000 --tenants 2
+    DATABASE_URL=postgresql://... python benchmarks/bench_contact_search.py   # base vacía
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'search.db')
+
+from src.main import app
+from src.migrate import upgrade
+from src.models.user import db, Contact, User
+from src.utils import search
+
+FIRST_NAMES = ['José', 'María', 'Ángel', 'Lucía', 'Jesús', 'Sofía', 'Martín', 'Inés', 'Raúl', 'Elena',
+               'Íñigo', 'Begoña', 'Nuria', 'Óscar', 'Adrián', 'Marta', 'Pablo', 'Carmen', 'Iván', 'Noelia']
+LAST_NAMES = ['García', 'Martínez', 'López', 'Sánchez', 'Pérez', 'Gómez', 'Núñez', 'Muñoz', 'Álvarez',
+              'Jiménez', 'Rodríguez', 'Fernández', 'Díaz', 'Ruiz', 'Hernández', 'Castaño', 'Ibáñez', 'Peña']
+TERMS = ['jose', 'garcia', 'nunez', 'mar', 'ibanez pena', 'lucia martinez', 'zzzz', '600 12', '4455', 'ejemplo.com']
+
+
+def seed(contacts, tenants, batch=20000):
+    rng = random.Random(42)
+    base = datetime(2023, 1, 1)
+    users = [{'id': i + 1, 'email': f'bench{i}@example.com', 'password_hash': 'x', 'name': f'Bench {i}',
+              'data_version': 0} for i in range(tenants)]
+    db.session.execute(User.__table__.insert(), users)
+
+    rows = []
+    for i in range(contacts):
+        first, last, last2 = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), rng.choice(LAST_NAMES)
+        rows.append({
+            'user_id': i % tenants + 1,
+            'name': f'{first} {last} {last2}',
+            'email': f'{first.lower()}.{i}@ejemplo.com' if i % 2 else None,
+            'phone': f'+34 6{i:08d}',
+            'status': 'activo',
+            'created_at': base + timedelta(seconds=i)
+        })
+        if len(rows) >= batch:
+            db.session.execute(Contact.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(Contact.__table__.insert(), rows)
+    db.session.commit()
+
+
+def first_page(user_id, term, indexed):
+    query = Contact.query.filter_by(user_id=user_id)
+    if indexed:
+        query, rank_order = search.apply_contact_search(query, term, user_id)
+    else:
+        query, rank_order = search._like_search(query, term, search.phone_digits(term))
+    ordering = [Contact.created_at.desc(), Contact.id.desc()]
+    if rank_order is not None:
+        ordering.insert(0, rank_order)
+    return query.order_by(*ordering).limit(20).all()
+
+
+def measure(tenants, indexed, repeat):
+    timings = []
+    for _ in range(repeat):
+        for term in TERMS:
+            user_id = random.randint(1, tenants)
+            start = time.perf_counter()
+            first_page(user_id, term, indexed)
+            timings.append((time.perf_counter() - start) * 1000)
+            db.session.rollback()
+    timings.sort()
+    return statistics.median(timings), timings[int(len(timings) * 0.99) - 1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--contacts', type=int, default=200000)
+    parser.add_argument('--tenants', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=10)
+    args = parser.parse_args()
+
+    with app.app_context():
+        upgrade(db.engine, log=lambda message: None)
+        if not db.session.query(Contact.id).first():
+            started = time.perf_counter()
+            seed(args.contacts, args.tenants)
+            print(f'{args.contacts} contactos en {args.tenants} usuarios creados en {time.perf_counter() - started:.1f} s')
+
+        print(f'Backend de búsqueda: {search.search_backend()}')
+        print(f'{"ruta":<22}{"p50 ms":>10}{"p99 ms":>10}')
+        for label, indexed in (('ILIKE %término%', False), ('índice de texto', True)):
+            first_page(1, 'calentamiento', indexed)
+            p50, p99 = measure(args.tenants, indexed, args.repeat)
+            print(f'{label:<22}{p50:>10.2f}{p99:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Micro-benchmark de serialización JSON: ruta anterior (isoformat + encoder estándar)
+frente a FastJSONProvider sobre una respuesta de 10k contactos.
+
+Uso:
+    python benchmarks/bench_json.py
+    python benchmarks/bench_json.py --contacts 50000 --repeat 5
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+from src.models.user import Contact
+from src.utils import json_provider
+from src.utils.json_provider import FastJSONProvider
+
+
+def build_contacts(count):
+    base = datetime(2024, 1, 1, 12, 30, 15, 123456)
+    return [
+        Contact(
+            id=i,
+            user_id=1,
+            name=f'Contacto {i}',
+            email=f'contacto{i}@example.com',
+            phone=f'+34600{i:06d}',
+            status='activo',
+            tags='["cliente", "vip"]',
+            notes='Notas de ejemplo' if i % 3 == 0 else None,
+            created_at=base + timedelta(minutes=i),
+            updated_at=base + timedelta(minutes=i, seconds=30),
+            last_message=None
+        )
+        for i in range(count)
+    ]
+
+
+def legacy_to_dict(contact):
+    """to_dict() anterior: convierte cada datetime con isoformat() en Python"""
+    data = contact.to_dict()
+    for key in ('created_at', 'updated_at', 'last_message'):
+        value = data[key]
+        data[key] = value.isoformat() if value else None
+    return data
+
+
+def timed(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--contacts', type=int, default=10000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = Flask(__name__)
+    legacy = DefaultJSONProvider(app)
+    fast = FastJSONProvider(app)
+    contacts = build_contacts(args.contacts)
+
+    def run_legacy():
+        return legacy.dumps({'contacts': [legacy_to_dict(c) for c in contacts]}).encode('utf-8')
+
+    def run_fast():
+        return fast.dumps_bytes({'contacts': [c.to_dict() for c in contacts]})
+
+    def run_fast_stdlib():
+        orjson, json_provider.orjson = json_provider.orjson, None
+        try:
+            return fast.dumps_bytes({'contacts': [c.to_dict() for c in contacts]})
+        finally:
+            json_provider.orjson = orjson
+
+    rows = [('isoformat + json estándar', run_legacy)]
+    if json_provider.orjson is not None:
+        rows.append(('FastJSONProvider (orjson)', run_fast))
+    rows.append(('FastJSONProvider (sin orjson)', run_fast_stdlib))
+
+    # Calentamiento para no penalizar a la primera ruta medida
+    for _, fn in rows:
+        fn()
+
+    print(f'{args.contacts} contactos, mejor de {args.repeat} ejecuciones')
+    print(f'{"ruta":<34}{"ms":>10}{"MB":>8}{"x":>7}')
+    baseline = None
+    for label, fn in rows:
+        elapsed, body = timed(fn, args.repeat)
+        baseline = baseline or elapsed
+        print(f'{label:<34}{elapsed * 1000:>10.1f}{len(body) / 1e6:>8.2f}{baseline / elapsed:>7.2f}')
+
+
+if __name__ == '__main__':
+    main()
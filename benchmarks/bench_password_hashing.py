@@ -0,0 +1,64 @@
+"""Benchmark de hashing de contraseñas: logins/seg por núcleo para cada método.
+
+Uso:
+    python benchmarks/bench_password_hashing.py
+    python benchmarks/bench_password_hashing.py --methods scrypt pbkdf2:sha256:600000 --seconds 3
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+DEFAULT_METHODS = [
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+    'scrypt:65536:8:1',
+    'pbkdf2:sha256:260000',
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:1000000',
+]
+
+
+def measure(method, seconds, threads):
+    """Ejecuta verificaciones durante `seconds` y devuelve logins/seg"""
+    password = 'correct horse battery staple'
+    stored = generate_password_hash(password, method)
+
+    def worker(deadline):
+        done = 0
+        while time.perf_counter() < deadline:
+            check_password_hash(stored, password)
+            done += 1
+        return done
+
+    deadline = time.perf_counter() + seconds
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        total = sum(executor.map(worker, [deadline] * threads))
+    elapsed = time.perf_counter() - start
+    return total / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--methods', nargs='+', default=DEFAULT_METHODS)
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--threads', type=int, default=os.cpu_count() or 1,
+                        help='hilos para medir el escalado del pool (por defecto, núcleos)')
+    args = parser.parse_args()
+
+    print(f'Núcleos: {os.cpu_count()}  hilos del pool: {args.threads}')
+    print(f'{"método":<26}{"ms/login":>10}{"logins/s/núcleo":>18}{"logins/s (pool)":>18}')
+    for method in args.methods:
+        single = measure(method, args.seconds, 1)
+        pooled = measure(method, args.seconds, args.threads)
+        print(f'{method:<26}{1000 / single:>10.1f}{single:>18.1f}{pooled:>18.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Comprueba cuántas sentencias SQL lanza cada endpoint de estadísticas.
+
+Crea una base SQLite temporal (o usa DATABASE_URL), registra un usuario con
+algunos datos y llama a cada endpoint dos veces; la segunda llamada (con la
+autenticación ya cacheada) no debe superar su presupuesto de consultas.
+Termina con código 1 si alguno lo supera.
+
+Uso:
+    python benchmarks/check_query_counts.py
+    python benchmarks/check_query_counts.py -v   # muestra las sentencias
+"""
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if not os.environ.get('DATABASE_URL'):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'queries.db')
+
+from sqlalchemy import event
+from src.main import app
+from src.migrate import upgrade
+from src.models.user import db
+
+# Endpoint -> máximo de sentencias (incluye las de sesión/ETag de la petición)
+BUDGETS = {
+    '/api/automation/activity/stats': 1,
+    '/api/campaigns/stats': 1,
+    '/api/contacts/stats': 1,
+    '/api/dashboard/stats': 5,
+    '/api/dashboard/performance': 3,
+    '/api/dashboard/quick-actions': 2
+}
+
+
+def seed(client):
+    client.post('/api/auth/register', json={'email': 'queries@example.com', 'password': 'secret123', 'name': 'Q'})
+    for i in range(5):
+        client.post('/api/contacts/', json={'name': f'Contacto {i}', 'phone': f'60000000{i}', 'email': ''})
+    client.post('/api/campaigns/', json={'name': 'Campaña', 'message': 'Hola', 'contact_ids': [1, 2, 3]})
+
+
+def main():
+    verbose = '-v' in sys.argv
+    with app.app_context():
+        upgrade(db.engine, log=lambda message: None)
+        engine = db.engine
+
+    statements = []
+    event.listen(engine, 'before_cursor_execute',
+                 lambda connection, cursor, statement, *args: statements.append(statement))
+
+    client = app.test_client()
+    seed(client)
+
+    failed = 0
+    for url, budget in BUDGETS.items():
+        client.get(url)
+        statements.clear()
+        response = client.get(url)
+        used = len(statements)
+        ok = response.status_code == 200 and used <= budget
+        failed += not ok
+        print(f"{'✅' if ok else '❌'} {url:<36} {used:>3} consultas (máximo {budget}) HTTP {response.status_code}")
+        if verbose or not ok:
+            for statement in statements:
+                print('    ' + ' '.join(statement.split()))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
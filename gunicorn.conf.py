@@ -0,0 +1,22 @@
+"""Configuración de gunicorn.
+
+La aplicación se importa una vez en el proceso maestro (preload_app) y los
+workers la heredan con fork, así que arrancan en milisegundos. El esquema no
+se toca aquí: las migraciones se aplican en el paso de release.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+preload_app = os.environ.get('GUNICORN_PRELOAD', 'true').lower() == 'true'
+
+
+def post_fork(server, worker):
+    """Descartar conexiones heredadas del maestro: cada worker abre las suyas"""
+    from src.main import app
+    from src.models.user import db
+
+    with app.app_context():
+        db.engine.dispose(close=False)
@@ -1,13 +1,25 @@
 import os
 import sys
+import time
 from datetime import timedelta
 
+# Medir el arranque del worker desde el inicio de la importación
+IMPORT_STARTED = time.perf_counter()
+
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory, session
+from flask import Flask, session
 from flask_cors import CORS
+from werkzeug.middleware.proxy_fix import ProxyFix
 from src.models.user import db
+from src.utils.auth import auth_cache_stats
+from src.utils.db_engine import engine_options, init_engine_profile, ping, pool_report
+from src.utils.rate_limit import init_rate_limiter
+from src.utils.replica import init_replica
+from src.utils.compression import init_compression
+from src.utils.static_manifest import init_static_manifest
+from src.utils.json_provider import FastJSONProvider
 
 # Importar todas las rutas
 from src.routes.auth import auth_bp
@@ -19,7 +31,9 @@ from src.routes.dashboard import dashboard_bp
 
 def create_app():
     """Factory function para crear la aplicación Flask"""
+    create_started = time.perf_counter()
     app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.json = FastJSONProvider(app)
     
     # Configuración de la aplicación
     app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'nexus-communicator-secret-key-2024-production')
@@ -30,6 +44,11 @@ def create_app():
     app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
     app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=7)
     
+    # Configuración del modo token (access/refresh firmados, sin estado en el servidor)
+    app.config['JWT_SECRET_KEY'] = os.environ.get('JWT_SECRET_KEY', app.config['SECRET_KEY'])
+    app.config['ACCESS_TOKEN_EXPIRES'] = timedelta(minutes=int(os.environ.get('ACCESS_TOKEN_MINUTES', 15)))
+    app.config['REFRESH_TOKEN_EXPIRES'] = timedelta(days=int(os.environ.get('REFRESH_TOKEN_DAYS', 7)))
+    
     # Configuración de CORS para permitir requests desde el frontend
     CORS(app, 
          supports_credentials=True,
@@ -54,14 +73,43 @@ def create_app():
         os.makedirs(os.path.dirname(db_path), exist_ok=True)
         app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{db_path}"
     
+    # Réplica de lectura opcional para el dashboard y las estadísticas
+    replica_url = os.environ.get('DATABASE_REPLICA_URL')
+    if replica_url:
+        if replica_url.startswith('postgres://'):
+            replica_url = replica_url.replace('postgres://', 'postgresql://', 1)
+        app.config['SQLALCHEMY_BINDS'] = {'replica': {'url': replica_url, **engine_options(replica_url)}}
+    # Segundos que un usuario lee del primario después de escribir (read-your-writes)
+    app.config['REPLICA_STICKY_SECONDS'] = int(os.environ.get('REPLICA_STICKY_SECONDS', 10))
+    
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
-        'pool_pre_ping': True,
-        'pool_recycle': 300,
-    }
+    # Perfil por dialecto: PRAGMAs/timeout en SQLite, pool y statement_timeout en PostgreSQL
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(app.config['SQLALCHEMY_DATABASE_URI'])
+    
+    # Rate limiting (memory por worker, sqlite:///ruta por host o redis:// entre nodos)
+    app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() == 'true'
+    app.config['RATE_LIMIT_BACKEND'] = os.environ.get('RATE_LIMIT_BACKEND', 'memory')
+    
+    # Detrás de un proxy (Render) la IP real del cliente llega en X-Forwarded-For
+    proxy_hops = int(os.environ.get('PROXY_FIX_X_FOR', 0))
+    if proxy_hops:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=proxy_hops, x_proto=proxy_hops)
+    
+    # Compresión de respuestas (br/zstd si están instalados, gzip siempre)
+    app.config['COMPRESSION_ENABLED'] = os.environ.get('COMPRESSION_ENABLED', 'true').lower() == 'true'
+    app.config['COMPRESSION_MIN_SIZE'] = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    
+    # Frontend estático: archivos de hasta este tamaño se sirven desde memoria
+    app.config['STATIC_MANIFEST_MAX_FILE_SIZE'] = int(os.environ.get('STATIC_MANIFEST_MAX_FILE_SIZE', 4 * 1024 * 1024))
     
     # Inicializar extensiones
     db.init_app(app)
+    init_engine_profile(app)
+    init_replica(app)
+    init_compression(app)
+    init_rate_limiter(app)
+    # Después de la compresión: el manifiesto reutiliza sus codificadores
+    init_static_manifest(app)
     
     # Registrar blueprints
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
@@ -71,13 +119,9 @@ def create_app():
     app.register_blueprint(automation_bp, url_prefix='/api/automation')
     app.register_blueprint(dashboard_bp, url_prefix='/api/dashboard')
     
-    # Crear las tablas de la base de datos
-    with app.app_context():
-        try:
-            db.create_all()
-            print("✅ Base de datos inicializada correctamente")
-        except Exception as e:
-            print(f"❌ Error al inicializar la base de datos: {e}")
+    # El esquema se gestiona con migraciones (python -m src.migrate upgrade) como
+    # paso de release: los workers no tocan la base de datos al arrancar y el
+    # pool abre la primera conexión con la primera petición.
     
     # Ruta de salud para verificar que el servidor está funcionando
     @app.route('/health')
@@ -88,47 +132,73 @@ def create_app():
             'version': '1.0.0'
         }, 200
     
+    # Métricas del cache de autenticación de este worker
+    @app.route('/health/auth')
+    def health_auth():
+        return {
+            'status': 'healthy',
+            'auth_cache': auth_cache_stats()
+        }, 200
+    
+    # Estado del pool de conexiones de este worker
+    @app.route('/health/db')
+    def health_db():
+        try:
+            latency = ping(db.engine)
+        except Exception as e:
+            return {
+                'status': 'unhealthy',
+                'error': str(e),
+                'pool': pool_report(db.engine)
+            }, 503
+        report = {
+            'status': 'healthy',
+            'dialect': db.engine.dialect.name,
+            'ping_ms': latency,
+            'pool': pool_report(db.engine)
+        }
+        replica = db.engines.get('replica')
+        if replica is not None:
+            try:
+                report['replica'] = {'ping_ms': ping(replica), 'pool': pool_report(replica)}
+            except Exception as e:
+                # Sin réplica las lecturas siguen funcionando contra el primario
+                report['replica'] = {'error': str(e), 'pool': pool_report(replica)}
+        return report, 200
+    
+    # Tiempos de arranque de este worker
+    @app.route('/health/startup')
+    def health_startup():
+        return {
+            'status': 'healthy',
+            'pid': os.getpid(),
+            'startup': app.config['STARTUP_REPORT']
+        }, 200
+    
     # Ruta para servir archivos estáticos del frontend (si están presentes)
     @app.route('/', defaults={'path': ''})
     @app.route('/<path:path>')
     def serve_frontend(path):
         """Servir archivos del frontend si están disponibles"""
-        static_folder_path = app.static_folder
-        if static_folder_path is None:
-            return {
-                'message': 'Nexus Communicator API',
-                'version': '1.0.0',
-                'endpoints': {
-                    'auth': '/api/auth',
-                    'profile': '/api/profile',
-                    'contacts': '/api/contacts',
-                    'campaigns': '/api/campaigns',
-                    'automation': '/api/automation',
-                    'dashboard': '/api/dashboard',
-                    'health': '/health'
-                }
-            }, 200
+        manifest = app.extensions.get('static_manifest')
+        # Rutas desconocidas resuelven a index.html (SPA) desde el manifiesto en memoria
+        asset = manifest.resolve(path) if manifest is not None else None
+        if asset is not None:
+            return manifest.send(asset)
 
-        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-            return send_from_directory(static_folder_path, path)
-        else:
-            index_path = os.path.join(static_folder_path, 'index.html')
-            if os.path.exists(index_path):
-                return send_from_directory(static_folder_path, 'index.html')
-            else:
-                return {
-                    'message': 'Nexus Communicator API',
-                    'version': '1.0.0',
-                    'endpoints': {
-                        'auth': '/api/auth',
-                        'profile': '/api/profile',
-                        'contacts': '/api/contacts',
-                        'campaigns': '/api/campaigns',
-                        'automation': '/api/automation',
-                        'dashboard': '/api/dashboard',
-                        'health': '/health'
-                    }
-                }, 200
+        return {
+            'message': 'Nexus Communicator API',
+            'version': '1.0.0',
+            'endpoints': {
+                'auth': '/api/auth',
+                'profile': '/api/profile',
+                'contacts': '/api/contacts',
+                'campaigns': '/api/campaigns',
+                'automation': '/api/automation',
+                'dashboard': '/api/dashboard',
+                'health': '/health'
+            }
+        }, 200
     
     # Manejo de errores
     @app.errorhandler(404)
@@ -148,6 +218,13 @@ def create_app():
     def unauthorized(error):
         return {'error': 'No autorizado'}, 401
     
+    app.config['STARTUP_REPORT'] = {
+        'import_ms': round((create_started - IMPORT_STARTED) * 1000, 1),
+        'create_app_ms': round((time.perf_counter() - create_started) * 1000, 1)
+    }
+    print(f"⏱️ Arranque: importación {app.config['STARTUP_REPORT']['import_ms']} ms, "
+          f"create_app {app.config['STARTUP_REPORT']['create_app_ms']} ms")
+    
     return app
 
 # Crear la aplicación
@@ -162,5 +239,10 @@ if __name__ == '__main__':
     print(f"🔧 Modo debug: {debug}")
     print(f"🗄️ Base de datos: {'PostgreSQL (Producción)' if os.environ.get('DATABASE_URL') else 'SQLite (Desarrollo)'}")
     
+    # En desarrollo se aplican las migraciones pendientes antes de servir
+    from src.migrate import upgrade
+    with app.app_context():
+        upgrade(db.engine)
+    
     app.run(host='0.0.0.0', port=port, debug=debug)
 
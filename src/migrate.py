@@ -0,0 +1,151 @@
+"""Migraciones versionadas del esquema.
+
+Cada archivo src/migrations/NNNN_descripcion.py define `upgrade(connection)`.
+Se ejecutan en orden, una transacción por migración, y quedan registradas en
+la tabla schema_migrations. Es un paso de release independiente de los workers:
+
+    python -m src.migrate upgrade   # aplica las pendientes
+    python -m src.migrate status    # lista aplicadas y pendientes
+"""
+import importlib.util
+import os
+import re
+import sys
+import time
+from datetime import datetime
+
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import sqlalchemy as sa
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(__file__), 'migrations')
+MIGRATION_FILE = re.compile(r'^(\d{4})_(\w+)\.py$')
+# Clave arbitraria para el advisory lock de PostgreSQL (evita dos releases simultáneos)
+ADVISORY_LOCK_KEY = 727274
+
+schema_migrations = sa.Table(
+    'schema_migrations', sa.MetaData(),
+    sa.Column('version', sa.String(32), primary_key=True),
+    sa.Column('name', sa.String(255), nullable=False),
+    sa.Column('applied_at', sa.DateTime, nullable=False)
+)
+
+
+def discover():
+    """Migraciones disponibles ordenadas por versión: [(version, nombre, ruta)]"""
+    found = []
+    for filename in sorted(os.listdir(MIGRATIONS_DIR)):
+        match = MIGRATION_FILE.match(filename)
+        if match:
+            found.append((match.group(1), match.group(2), os.path.join(MIGRATIONS_DIR, filename)))
+    return found
+
+
+def load(version, name, path):
+    spec = importlib.util.spec_from_file_location(f'src.migrations.m{version}_{name}', path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def applied_versions(connection):
+    schema_migrations.create(connection, checkfirst=True)
+    return {row.version for row in connection.execute(sa.select(schema_migrations.c.version))}
+
+
+# Utilidades para las migraciones
+
+def has_table(connection, table):
+    return sa.inspect(connection).has_table(table)
+
+
+def has_column(connection, table, column):
+    return column in {col['name'] for col in sa.inspect(connection).get_columns(table)}
+
+
+def has_index(connection, table, index):
+    return index in {idx['name'] for idx in sa.inspect(connection).get_indexes(table)}
+
+
+def add_column(connection, table, column):
+    """ALTER TABLE ... ADD COLUMN si la columna no existe (portable SQLite/PostgreSQL)"""
+    if has_column(connection, table, column.name):
+        return False
+    column_type = column.type.compile(dialect=connection.dialect)
+    ddl = f'ALTER TABLE {table} ADD COLUMN {column.name} {column_type}'
+    if column.server_default is not None:
+        ddl += f' DEFAULT {column.server_default.arg}'
+    if not column.nullable:
+        ddl += ' NOT NULL'
+    connection.execute(sa.text(ddl))
+    return True
+
+
+def create_index(connection, index):
+    """Crear el índice si no existe"""
+    if has_index(connection, index.table.name, index.name):
+        return False
+    index.create(connection)
+    return True
+
+
+def upgrade(engine, log=print):
+    """Aplicar las migraciones pendientes; devuelve las versiones aplicadas"""
+    applied_now = []
+    with engine.connect() as connection:
+        if connection.dialect.name == 'postgresql':
+            connection.execute(sa.text('SELECT pg_advisory_lock(:key)'), {'key': ADVISORY_LOCK_KEY})
+            connection.commit()
+        try:
+            with connection.begin():
+                applied = applied_versions(connection)
+
+            for version, name, path in discover():
+                if version in applied:
+                    continue
+                started = time.perf_counter()
+                module = load(version, name, path)
+                with connection.begin():
+                    module.upgrade(connection)
+                    connection.execute(schema_migrations.insert().values(
+                        version=version, name=name, applied_at=datetime.utcnow()
+                    ))
+                applied_now.append(version)
+                log(f'✅ Migración {version}_{name} aplicada en {(time.perf_counter() - started) * 1000:.0f} ms')
+        finally:
+            if connection.dialect.name == 'postgresql':
+                connection.execute(sa.text('SELECT pg_advisory_unlock(:key)'), {'key': ADVISORY_LOCK_KEY})
+                connection.commit()
+
+    if not applied_now:
+        log('✅ Esquema al día, no hay migraciones pendientes')
+    return applied_now
+
+
+def status(engine, log=print):
+    with engine.connect() as connection:
+        with connection.begin():
+            applied = applied_versions(connection)
+    for version, name, _ in discover():
+        log(f"{'[x]' if version in applied else '[ ]'} {version}_{name}")
+
+
+def main(argv):
+    from src.main import app
+    from src.models.user import db
+
+    command = argv[1] if len(argv) > 1 else 'upgrade'
+    with app.app_context():
+        if command == 'upgrade':
+            upgrade(db.engine)
+        elif command == 'status':
+            status(db.engine)
+        else:
+            print(f'Comando desconocido: {command} (usa upgrade o status)')
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,122 @@
+"""Esquema inicial (el que creaba db.create_all() al arrancar).
+
+Es idempotente: en bases de datos ya creadas con create_all solo añade las
+tablas y columnas que falten.
+"""
+import sqlalchemy as sa
+from src.migrate import add_column, has_table
+
+metadata = sa.MetaData()
+
+tables = [
+    sa.Table(
+        'users', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('email', sa.String(120), unique=True, nullable=False),
+        sa.Column('password_hash', sa.String(255), nullable=False),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('phone', sa.String(20)),
+        sa.Column('company', sa.String(100)),
+        sa.Column('whatsapp_api_key', sa.Text),
+        sa.Column('gmail_api_key', sa.Text),
+        sa.Column('gemini_api_key', sa.Text),
+        sa.Column('gemini_auto_reply_enabled', sa.Boolean),
+        sa.Column('gemini_knowledge_base', sa.Text),
+        sa.Column('email_notifications', sa.Boolean),
+        sa.Column('push_notifications', sa.Boolean),
+        sa.Column('sms_notifications', sa.Boolean),
+        sa.Column('profile_visible', sa.Boolean),
+        sa.Column('data_sharing', sa.Boolean),
+        sa.Column('analytics', sa.Boolean),
+        sa.Column('language', sa.String(10)),
+        sa.Column('timezone', sa.String(50)),
+        sa.Column('theme', sa.String(10)),
+        sa.Column('created_at', sa.DateTime),
+        sa.Column('updated_at', sa.DateTime),
+        sa.Column('last_login', sa.DateTime)
+    ),
+    sa.Table(
+        'contacts', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('name', sa.String(100), nullable=False),
+        sa.Column('email', sa.String(120)),
+        sa.Column('phone', sa.String(20), nullable=False),
+        sa.Column('status', sa.String(20)),
+        sa.Column('tags', sa.Text),
+        sa.Column('notes', sa.Text),
+        sa.Column('created_at', sa.DateTime),
+        sa.Column('updated_at', sa.DateTime),
+        sa.Column('last_message', sa.DateTime)
+    ),
+    sa.Table(
+        'campaigns', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('name', sa.String(200), nullable=False),
+        sa.Column('message', sa.Text, nullable=False),
+        sa.Column('status', sa.String(20)),
+        sa.Column('sent_count', sa.Integer),
+        sa.Column('opened_count', sa.Integer),
+        sa.Column('clicked_count', sa.Integer),
+        sa.Column('total_recipients', sa.Integer),
+        sa.Column('scheduled_at', sa.DateTime),
+        sa.Column('media_url', sa.String(500)),
+        sa.Column('media_type', sa.String(50)),
+        sa.Column('created_at', sa.DateTime),
+        sa.Column('updated_at', sa.DateTime),
+        sa.Column('sent_at', sa.DateTime)
+    ),
+    sa.Table(
+        'campaign_contacts', metadata,
+        sa.Column('campaign_id', sa.Integer, sa.ForeignKey('campaigns.id'), primary_key=True),
+        sa.Column('contact_id', sa.Integer, sa.ForeignKey('contacts.id'), primary_key=True)
+    ),
+    sa.Table(
+        'media_files', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('campaign_id', sa.Integer, sa.ForeignKey('campaigns.id'), nullable=False),
+        sa.Column('filename', sa.String(255), nullable=False),
+        sa.Column('original_filename', sa.String(255), nullable=False),
+        sa.Column('filepath', sa.String(500), nullable=False),
+        sa.Column('mimetype', sa.String(100)),
+        sa.Column('file_size', sa.Integer),
+        sa.Column('created_at', sa.DateTime)
+    ),
+    sa.Table(
+        'imported_files', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('filename', sa.String(255), nullable=False),
+        sa.Column('file_type', sa.String(50), nullable=False),
+        sa.Column('file_url', sa.String(500)),
+        sa.Column('contacts_imported', sa.Integer),
+        sa.Column('status', sa.String(20)),
+        sa.Column('error_message', sa.Text),
+        sa.Column('created_at', sa.DateTime),
+        sa.Column('completed_at', sa.DateTime)
+    ),
+    sa.Table(
+        'bot_activities', metadata,
+        sa.Column('id', sa.Integer, primary_key=True),
+        sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id'), nullable=False),
+        sa.Column('activity_type', sa.String(50), nullable=False),
+        sa.Column('contact_phone', sa.String(20)),
+        sa.Column('contact_name', sa.String(100)),
+        sa.Column('message_content', sa.Text),
+        sa.Column('response_content', sa.Text),
+        sa.Column('status', sa.String(20)),
+        sa.Column('created_at', sa.DateTime)
+    ),
+]
+
+
+def upgrade(connection):
+    for table in tables:
+        if not has_table(connection, table.name):
+            table.create(connection)
+            continue
+        # Tablas creadas por versiones anteriores de create_all: completar columnas
+        for column in table.columns:
+            if column.nullable and not column.primary_key:
+                add_column(connection, table.name, column)
@@ -0,0 +1,20 @@
+"""Contador de cambios por usuario (ETags) y lista de tokens revocados."""
+import sqlalchemy as sa
+from src.migrate import add_column, has_table
+
+revoked_tokens = sa.Table(
+    'revoked_tokens', sa.MetaData(),
+    sa.Column('jti', sa.String(64), primary_key=True),
+    sa.Column('user_id', sa.Integer, nullable=True),
+    sa.Column('token_type', sa.String(20), nullable=False),
+    sa.Column('expires_at', sa.DateTime, nullable=False),
+    sa.Column('revoked_at', sa.DateTime)
+)
+
+
+def upgrade(connection):
+    add_column(connection, 'users',
+               sa.Column('data_version', sa.Integer, nullable=False, server_default='0'))
+
+    if not has_table(connection, 'revoked_tokens'):
+        revoked_tokens.create(connection)
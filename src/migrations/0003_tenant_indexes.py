@@ -0,0 +1,139 @@
+"""Índices para las consultas por usuario y teléfono único por usuario."""
+import json
+
+import sqlalchemy as sa
+from src.migrate import create_index
+
+metadata = sa.MetaData()
+
+
+def _table(name, *columns):
+    # Solo hacen falta los nombres de columna para emitir CREATE INDEX
+    return sa.Table(name, metadata, *(sa.Column(column) for column in columns))
+
+
+contacts = _table('contacts', 'user_id', 'created_at', 'status', 'phone')
+campaigns = _table('campaigns', 'user_id', 'created_at', 'status')
+campaign_contacts = _table('campaign_contacts', 'contact_id', 'campaign_id')
+media_files = _table('media_files', 'campaign_id')
+imported_files = _table('imported_files', 'user_id', 'created_at')
+bot_activities = _table('bot_activities', 'user_id', 'created_at', 'activity_type', 'status')
+revoked_tokens = _table('revoked_tokens', 'expires_at')
+
+indexes = [
+    sa.Index('ix_contacts_user_created', contacts.c.user_id, contacts.c.created_at),
+    sa.Index('ix_contacts_user_status', contacts.c.user_id, contacts.c.status),
+    sa.Index('uq_contacts_user_phone', contacts.c.user_id, contacts.c.phone, unique=True),
+    sa.Index('ix_campaigns_user_created', campaigns.c.user_id, campaigns.c.created_at),
+    sa.Index('ix_campaigns_user_status', campaigns.c.user_id, campaigns.c.status),
+    sa.Index('ix_campaign_contacts_contact', campaign_contacts.c.contact_id, campaign_contacts.c.campaign_id),
+    sa.Index('ix_media_files_campaign', media_files.c.campaign_id),
+    sa.Index('ix_imported_files_user_created', imported_files.c.user_id, imported_files.c.created_at),
+    sa.Index('ix_bot_activities_user_created', bot_activities.c.user_id, bot_activities.c.created_at),
+    sa.Index('ix_bot_activities_user_type_created', bot_activities.c.user_id,
+             bot_activities.c.activity_type, bot_activities.c.created_at),
+    sa.Index('ix_bot_activities_user_status', bot_activities.c.user_id, bot_activities.c.status),
+    sa.Index('ix_revoked_tokens_expires', revoked_tokens.c.expires_at),
+]
+
+
+# Copia de los contactos eliminados al fusionar duplicados, para revisarlos
+merged_contacts = sa.Table(
+    'merged_contacts', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('merged_into_id', sa.Integer, nullable=False),
+    sa.Column('user_id', sa.Integer, nullable=False),
+    sa.Column('name', sa.String(100)),
+    sa.Column('email', sa.String(120)),
+    sa.Column('phone', sa.String(20)),
+    sa.Column('status', sa.String(20)),
+    sa.Column('tags', sa.Text),
+    sa.Column('notes', sa.Text),
+    sa.Column('created_at', sa.DateTime),
+    sa.Column('updated_at', sa.DateTime),
+    sa.Column('last_message', sa.DateTime),
+    sa.Column('merged_at', sa.DateTime, server_default=sa.func.current_timestamp())
+)
+
+CONTACT_COLUMNS = 'id, user_id, name, email, phone, status, tags, notes, created_at, updated_at, last_message'
+
+
+def _tag_names(raw):
+    try:
+        value = json.loads(raw) if raw else []
+    except ValueError:
+        value = raw.split(',')
+    return value if isinstance(value, list) else [value]
+
+
+def merged_fields(rows):
+    """Campos del contacto conservado (rows[0]) completados con los de sus duplicados"""
+    keep = rows[0]
+    tags, seen = [], set()
+    for row in rows:
+        for tag in _tag_names(row.tags):
+            name = str(tag).strip()
+            if name and name.lower() not in seen:
+                seen.add(name.lower())
+                tags.append(name)
+    notes = []
+    for row in rows:
+        if row.notes and row.notes.strip() and row.notes.strip() not in notes:
+            notes.append(row.notes.strip())
+    return {
+        'email': keep.email or next((row.email for row in rows if row.email), None),
+        'tags': json.dumps(tags) if tags else keep.tags,
+        'notes': '\n\n'.join(notes) if notes else keep.notes,
+    }
+
+
+def merge_duplicate_contacts(connection):
+    """Dejar un contacto por (user_id, phone).
+
+    El más antiguo hereda las campañas, el email, las etiquetas, las notas y el
+    último mensaje del resto; los eliminados se copian en merged_contacts.
+    """
+    duplicates = connection.execute(sa.text(
+        'SELECT user_id, phone, MIN(id) AS keep_id FROM contacts '
+        'GROUP BY user_id, phone HAVING COUNT(*) > 1'
+    )).all()
+    if not duplicates:
+        return 0
+    merged_contacts.create(connection, checkfirst=True)
+
+    removed = 0
+    for user_id, phone, keep_id in duplicates:
+        params = {'user_id': user_id, 'phone': phone, 'keep_id': keep_id}
+        group = 'FROM contacts WHERE user_id = :user_id AND phone = :phone'
+        loser_ids = f'SELECT id {group} AND id <> :keep_id'
+        rows = connection.execute(sa.text(f'SELECT email, tags, notes {group} ORDER BY id'), params).all()
+        connection.execute(sa.text(
+            f'INSERT INTO merged_contacts ({CONTACT_COLUMNS}, merged_into_id) '
+            f'SELECT {CONTACT_COLUMNS}, :keep_id {group} AND id <> :keep_id'
+        ), params)
+        connection.execute(sa.text(
+            'UPDATE contacts SET email = :email, tags = :tags, notes = :notes, '
+            f'last_message = (SELECT MAX(last_message) {group}) WHERE id = :keep_id'
+        ), {**params, **merged_fields(rows)})
+
+        connection.execute(sa.text(
+            'INSERT INTO campaign_contacts (campaign_id, contact_id) '
+            'SELECT DISTINCT cc.campaign_id, :keep_id FROM campaign_contacts cc '
+            'JOIN contacts c ON c.id = cc.contact_id '
+            'WHERE c.user_id = :user_id AND c.phone = :phone AND c.id <> :keep_id '
+            'AND cc.campaign_id NOT IN '
+            '(SELECT campaign_id FROM campaign_contacts WHERE contact_id = :keep_id)'
+        ), params)
+        connection.execute(sa.text(f'DELETE FROM campaign_contacts WHERE contact_id IN ({loser_ids})'), params)
+        removed += connection.execute(sa.text(f'DELETE FROM contacts WHERE id IN ({loser_ids})'), params).rowcount
+    return removed
+
+
+def upgrade(connection):
+    removed = merge_duplicate_contacts(connection)
+    if removed:
+        print(f'   {removed} contactos duplicados fusionados antes de crear uq_contacts_user_phone '
+              '(copia de los eliminados en merged_contacts)')
+
+    for index in indexes:
+        create_index(connection, index)
@@ -0,0 +1,66 @@
+"""Índices de búsqueda de contactos: FTS5 en SQLite, pg_trgm + unaccent en PostgreSQL."""
+import sqlalchemy as sa
+from src.migrate import has_table
+
+# Teléfono solo con dígitos (mismo criterio que src/utils/search.phone_digits)
+SQLITE_PHONE_DIGITS = "replace(replace(replace(replace(replace(replace(coalesce({0}, ''), ' ', ''), '-', ''), '+', ''), '(', ''), ')', ''), '.', '')"
+
+SQLITE_STATEMENTS = [
+    # Nombre y email sin acentos; owner = 'u<user_id>' acota la búsqueda al usuario dentro del índice
+    "CREATE VIRTUAL TABLE contacts_fts USING fts5("
+    "owner, name, email, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+    # Trigramas para buscar cualquier fragmento del teléfono
+    "CREATE VIRTUAL TABLE contacts_phone_fts USING fts5(phone, tokenize = 'trigram')",
+    "CREATE TRIGGER contacts_search_ai AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts (rowid, owner, name, email) VALUES (new.id, 'u' || new.user_id, new.name, new.email); "
+    f"INSERT INTO contacts_phone_fts (rowid, phone) VALUES (new.id, {SQLITE_PHONE_DIGITS.format('new.phone')}); "
+    "END",
+    "CREATE TRIGGER contacts_search_au AFTER UPDATE OF user_id, name, email, phone ON contacts BEGIN "
+    "DELETE FROM contacts_fts WHERE rowid = old.id; "
+    "DELETE FROM contacts_phone_fts WHERE rowid = old.id; "
+    "INSERT INTO contacts_fts (rowid, owner, name, email) VALUES (new.id, 'u' || new.user_id, new.name, new.email); "
+    f"INSERT INTO contacts_phone_fts (rowid, phone) VALUES (new.id, {SQLITE_PHONE_DIGITS.format('new.phone')}); "
+    "END",
+    "CREATE TRIGGER contacts_search_ad AFTER DELETE ON contacts BEGIN "
+    "DELETE FROM contacts_fts WHERE rowid = old.id; "
+    "DELETE FROM contacts_phone_fts WHERE rowid = old.id; "
+    "END",
+    "INSERT INTO contacts_fts (rowid, owner, name, email) SELECT id, 'u' || user_id, name, email FROM contacts",
+    f"INSERT INTO contacts_phone_fts (rowid, phone) SELECT id, {SQLITE_PHONE_DIGITS.format('phone')} FROM contacts",
+]
+
+POSTGRESQL_STATEMENTS = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE EXTENSION IF NOT EXISTS unaccent',
+    # unaccent() no es IMMUTABLE: envoltorio con diccionario fijo para poder indexarlo
+    "CREATE OR REPLACE FUNCTION nexus_unaccent(text) RETURNS text AS "
+    "$$ SELECT public.unaccent('public.unaccent'::regdictionary, $1) $$ "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT",
+    "CREATE OR REPLACE FUNCTION nexus_contact_search_text(name text, email text) RETURNS text AS "
+    "$$ SELECT lower(nexus_unaccent(coalesce(name, '') || ' ' || coalesce(email, ''))) $$ "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE",
+    "CREATE OR REPLACE FUNCTION nexus_phone_digits(phone text) RETURNS text AS "
+    "$$ SELECT regexp_replace(coalesce(phone, ''), '[^0-9]', '', 'g') $$ "
+    "LANGUAGE sql IMMUTABLE PARALLEL SAFE",
+    'CREATE INDEX IF NOT EXISTS ix_contacts_search_trgm ON contacts '
+    'USING gin (nexus_contact_search_text(name, email) gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS ix_contacts_phone_trgm ON contacts '
+    'USING gin (nexus_phone_digits(phone) gin_trgm_ops)',
+]
+
+
+def upgrade(connection):
+    if connection.dialect.name == 'sqlite':
+        if has_table(connection, 'contacts_fts'):
+            return
+        for statement in SQLITE_STATEMENTS:
+            connection.execute(sa.text(statement))
+
+    elif connection.dialect.name == 'postgresql':
+        # Sin permisos para crear extensiones la búsqueda sigue funcionando con ILIKE
+        try:
+            with connection.begin_nested():
+                for statement in POSTGRESQL_STATEMENTS:
+                    connection.execute(sa.text(statement))
+        except sa.exc.DBAPIError as e:
+            print(f'   ⚠️ Índices de búsqueda no creados (se usará ILIKE): {e.orig}')
@@ -0,0 +1,89 @@
+"""Tablas tags y contact_tags, con los datos de la columna JSON contacts.tags."""
+import json
+from datetime import datetime
+
+import sqlalchemy as sa
+from src.migrate import has_table
+
+TAG_MAX_LENGTH = 50
+BATCH_SIZE = 1000
+
+metadata = sa.MetaData()
+
+users = sa.Table('users', metadata, sa.Column('id', sa.Integer, primary_key=True))
+contacts = sa.Table(
+    'contacts', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer),
+    sa.Column('tags', sa.Text)
+)
+tags = sa.Table(
+    'tags', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete='CASCADE'), nullable=False),
+    sa.Column('name', sa.String(TAG_MAX_LENGTH), nullable=False),
+    sa.Column('created_at', sa.DateTime),
+    sa.Index('uq_tags_user_name', 'user_id', 'name', unique=True)
+)
+contact_tags = sa.Table(
+    'contact_tags', metadata,
+    sa.Column('contact_id', sa.Integer, sa.ForeignKey('contacts.id', ondelete='CASCADE'), primary_key=True),
+    sa.Column('tag_id', sa.Integer, sa.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    sa.Index('ix_contact_tags_tag', 'tag_id', 'contact_id')
+)
+
+
+def normalize(raw):
+    """Copia de normalize_tags() en el momento de la migración"""
+    try:
+        value = json.loads(raw) if raw.lstrip().startswith('[') else raw.split(',')
+    except ValueError:
+        value = raw.split(',')
+    if not isinstance(value, list):
+        value = [value]
+    names, seen = [], set()
+    for item in value:
+        name = ' '.join(str(item).split())[:TAG_MAX_LENGTH] if item is not None else ''
+        if name and name.lower() not in seen:
+            seen.add(name.lower())
+            names.append(name)
+    return names
+
+
+def backfill(connection):
+    tag_ids = {}
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(contacts.c.id, contacts.c.user_id, contacts.c.tags)
+            .where(contacts.c.id > last_id, contacts.c.tags.isnot(None))
+            .order_by(contacts.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+
+        links = []
+        for contact_id, user_id, raw in rows:
+            names = normalize(raw)
+            for name in names:
+                key = (user_id, name)
+                if key not in tag_ids:
+                    tag_ids[key] = connection.execute(
+                        tags.insert().values(user_id=user_id, name=name, created_at=datetime.utcnow())
+                    ).inserted_primary_key[0]
+                links.append({'contact_id': contact_id, 'tag_id': tag_ids[key]})
+            # Reescribir el JSON ya limpio (sin espacios sobrantes ni duplicados)
+            cleaned = json.dumps(names) if names else None
+            if cleaned != raw:
+                connection.execute(contacts.update().where(contacts.c.id == contact_id).values(tags=cleaned))
+        if links:
+            connection.execute(contact_tags.insert(), links)
+
+
+def upgrade(connection):
+    if has_table(connection, 'tags'):
+        return
+    tags.create(connection)
+    contact_tags.create(connection)
+    backfill(connection)
@@ -0,0 +1,109 @@
+"""Tablas de agregados diarios del dashboard, rellenadas desde los datos existentes."""
+from collections import defaultdict
+from datetime import timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import sqlalchemy as sa
+from src.migrate import has_table
+
+COUNTERS = ('contacts_new', 'campaigns_sent', 'campaigns_completed',
+            'messages_sent', 'messages_opened', 'messages_clicked')
+BATCH_SIZE = 5000
+
+metadata = sa.MetaData()
+
+users = sa.Table(
+    'users', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('timezone', sa.String(50))
+)
+contacts = sa.Table(
+    'contacts', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer),
+    sa.Column('created_at', sa.DateTime)
+)
+campaigns = sa.Table(
+    'campaigns', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer),
+    sa.Column('status', sa.String(20)),
+    sa.Column('sent_count', sa.Integer),
+    sa.Column('opened_count', sa.Integer),
+    sa.Column('clicked_count', sa.Integer),
+    sa.Column('sent_at', sa.DateTime)
+)
+bot_activities = sa.Table(
+    'bot_activities', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer),
+    sa.Column('activity_type', sa.String(50)),
+    sa.Column('status', sa.String(20)),
+    sa.Column('created_at', sa.DateTime)
+)
+daily_user_stats = sa.Table(
+    'daily_user_stats', metadata,
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    sa.Column('day', sa.Date, primary_key=True),
+    *[sa.Column(name, sa.Integer, nullable=False, server_default='0') for name in COUNTERS]
+)
+daily_bot_activity = sa.Table(
+    'daily_bot_activity', metadata,
+    sa.Column('user_id', sa.Integer, sa.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True),
+    sa.Column('day', sa.Date, primary_key=True),
+    sa.Column('activity_type', sa.String(50), primary_key=True),
+    sa.Column('status', sa.String(20), primary_key=True),
+    sa.Column('total', sa.Integer, nullable=False, server_default='0')
+)
+
+
+def zone_for(name):
+    try:
+        return ZoneInfo(name) if name else timezone.utc
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
+def backfill(connection):
+    zones = defaultdict(lambda: timezone.utc)
+    zones.update({row.id: zone_for(row.timezone) for row in connection.execute(sa.select(users))})
+
+    def day(user_id, moment):
+        return moment.replace(tzinfo=timezone.utc).astimezone(zones[user_id]).date()
+
+    streaming = connection.execution_options(yield_per=BATCH_SIZE)
+    user_rows = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    bot_rows = defaultdict(int)
+
+    for row in streaming.execute(sa.select(contacts.c.user_id, contacts.c.created_at)
+                                 .where(contacts.c.created_at.isnot(None))):
+        user_rows[(row.user_id, day(row.user_id, row.created_at))]['contacts_new'] += 1
+
+    for row in streaming.execute(sa.select(campaigns).where(campaigns.c.sent_at.isnot(None))):
+        counters = user_rows[(row.user_id, day(row.user_id, row.sent_at))]
+        counters['campaigns_sent'] += 1
+        counters['campaigns_completed'] += 1 if row.status == 'completed' else 0
+        counters['messages_sent'] += row.sent_count or 0
+        counters['messages_opened'] += row.opened_count or 0
+        counters['messages_clicked'] += row.clicked_count or 0
+
+    for row in streaming.execute(sa.select(bot_activities).where(bot_activities.c.created_at.isnot(None))):
+        bot_rows[(row.user_id, day(row.user_id, row.created_at), row.activity_type, row.status or '')] += 1
+
+    records = [{'user_id': user_id, 'day': local_day, **counters}
+               for (user_id, local_day), counters in user_rows.items()]
+    for start in range(0, len(records), BATCH_SIZE):
+        connection.execute(daily_user_stats.insert(), records[start:start + BATCH_SIZE])
+
+    records = [{'user_id': user_id, 'day': local_day, 'activity_type': activity_type, 'status': status, 'total': total}
+               for (user_id, local_day, activity_type, status), total in bot_rows.items()]
+    for start in range(0, len(records), BATCH_SIZE):
+        connection.execute(daily_bot_activity.insert(), records[start:start + BATCH_SIZE])
+
+
+def upgrade(connection):
+    if has_table(connection, 'daily_user_stats'):
+        return
+    daily_user_stats.create(connection)
+    daily_bot_activity.create(connection)
+    backfill(connection)
@@ -0,0 +1,60 @@
+"""Contadores desnormalizados en users, calculados desde los datos existentes."""
+import sqlalchemy as sa
+from src.migrate import add_column
+
+CAMPAIGN_STATUSES = ('draft', 'scheduled', 'active', 'completed', 'paused')
+COUNTERS = (
+    'contacts_total', 'contacts_active',
+    'campaigns_total', *[f'campaigns_{status}' for status in CAMPAIGN_STATUSES],
+    'messages_sent_total', 'bot_activity_total', 'bot_activity_failed'
+)
+
+metadata = sa.MetaData()
+
+users = sa.Table(
+    'users', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    *[sa.Column(name, sa.Integer) for name in COUNTERS]
+)
+contacts = sa.Table(
+    'contacts', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer),
+    sa.Column('status', sa.String(20))
+)
+campaigns = sa.Table(
+    'campaigns', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer),
+    sa.Column('status', sa.String(20)),
+    sa.Column('sent_count', sa.Integer)
+)
+bot_activities = sa.Table(
+    'bot_activities', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer),
+    sa.Column('status', sa.String(20))
+)
+
+
+def counted(table, *conditions, column=None):
+    """Subconsulta correlacionada: COUNT(*) o SUM(column) de las filas del usuario"""
+    aggregate = sa.func.count() if column is None else sa.func.coalesce(sa.func.sum(column), 0)
+    return sa.select(aggregate).where(table.c.user_id == users.c.id, *conditions).scalar_subquery()
+
+
+def upgrade(connection):
+    for name in COUNTERS:
+        add_column(connection, 'users', sa.Column(name, sa.Integer, nullable=False, server_default='0'))
+
+    values = {
+        'contacts_total': counted(contacts),
+        'contacts_active': counted(contacts, contacts.c.status == 'activo'),
+        'campaigns_total': counted(campaigns),
+        'messages_sent_total': counted(campaigns, column=campaigns.c.sent_count),
+        'bot_activity_total': counted(bot_activities),
+        'bot_activity_failed': counted(bot_activities, bot_activities.c.status == 'failed')
+    }
+    for status in CAMPAIGN_STATUSES:
+        values[f'campaigns_{status}'] = counted(campaigns, campaigns.c.status == status)
+    connection.execute(users.update().values(values))
@@ -0,0 +1,39 @@
+"""Columnas de progreso de las importaciones en segundo plano y cola de trabajos."""
+import sqlalchemy as sa
+from src.migrate import add_column, create_index
+
+metadata = sa.MetaData()
+
+imported_files = sa.Table(
+    'imported_files', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('file_type', sa.String(50)),
+    sa.Column('status', sa.String(20)),
+    sa.Column('error_message', sa.Text),
+    sa.Column('completed_at', sa.DateTime)
+)
+
+
+def upgrade(connection):
+    add_column(connection, 'imported_files', sa.Column('rows_read', sa.Integer, nullable=False, server_default='0'))
+    add_column(connection, 'imported_files', sa.Column('rows_rejected', sa.Integer, nullable=False, server_default='0'))
+    add_column(connection, 'imported_files', sa.Column('rows_total', sa.Integer))
+    add_column(connection, 'imported_files', sa.Column('source_path', sa.String(500)))
+    add_column(connection, 'imported_files', sa.Column('attempts', sa.Integer, nullable=False, server_default='0'))
+    add_column(connection, 'imported_files', sa.Column('started_at', sa.DateTime))
+    add_column(connection, 'imported_files', sa.Column('heartbeat_at', sa.DateTime))
+    create_index(connection, sa.Index('ix_imported_files_status', imported_files.c.status, imported_files.c.id))
+
+    # Las importaciones de Google se quedaban en 'processing' sin procesarse: conservan
+    # la URL, así que pasan a la cola. Las de archivo interrumpidas ya no tienen el archivo.
+    connection.execute(
+        imported_files.update()
+        .where(imported_files.c.status == 'processing',
+               imported_files.c.file_type.in_(['google_sheets', 'google_drive']))
+        .values(status='queued')
+    )
+    connection.execute(
+        imported_files.update()
+        .where(imported_files.c.status == 'processing')
+        .values(status='failed', error_message='Importación interrumpida', completed_at=sa.func.current_timestamp())
+    )
@@ -0,0 +1,7 @@
+"""Opciones de las importaciones (hoja de Excel elegida)."""
+import sqlalchemy as sa
+from src.migrate import add_column
+
+
+def upgrade(connection):
+    add_column(connection, 'imported_files', sa.Column('options', sa.Text))
@@ -0,0 +1,129 @@
+"""Teléfono normalizado (E.164) de los contactos y región por defecto de cada usuario."""
+import re
+
+import sqlalchemy as sa
+from src.migrate import add_column, create_index
+
+try:
+    import phonenumbers
+except ImportError:
+    phonenumbers = None
+
+# Copia de src/utils/phones en el momento de la migración
+DEFAULT_REGION = 'ES'
+REGIONS = {
+    'ES': ('34', '', 9),
+    'PT': ('351', '', 9),
+    'FR': ('33', '0', 9),
+    'IT': ('39', '', None),
+    'DE': ('49', '0', None),
+    'GB': ('44', '0', 10),
+    'IE': ('353', '0', None),
+    'NL': ('31', '0', 9),
+    'BE': ('32', '0', None),
+    'CH': ('41', '0', 9),
+    'US': ('1', '1', 10),
+    'CA': ('1', '1', 10),
+    'MX': ('52', '', 10),
+    'AR': ('54', '0', None),
+    'CO': ('57', '', 10),
+    'CL': ('56', '', 9),
+    'PE': ('51', '0', 9),
+    'VE': ('58', '0', 10),
+    'EC': ('593', '0', 9),
+    'UY': ('598', '0', 8),
+    'BR': ('55', '0', None),
+}
+E164_MIN_DIGITS = 8
+E164_MAX_DIGITS = 15
+
+metadata = sa.MetaData()
+
+users = sa.Table(
+    'users', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('default_region', sa.String(2))
+)
+contacts = sa.Table(
+    'contacts', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer),
+    sa.Column('phone', sa.String(20)),
+    sa.Column('phone_e164', sa.String(20))
+)
+
+
+def fallback_e164(value, region):
+    """Copia de _fallback_e164() en el momento de la migración"""
+    digits = re.sub(r'\D', '', value)
+    if value.startswith('+'):
+        number = digits
+    elif digits.startswith('00'):
+        number = digits[2:]
+    else:
+        if region not in REGIONS:
+            return None
+        code, trunk, length = REGIONS[region]
+        national = digits[len(trunk):] if trunk and digits.startswith(trunk) else digits
+        if length and len(national) == len(code) + length and national.startswith(code):
+            national = national[len(code):]
+        number = code + national
+    if not E164_MIN_DIGITS <= len(number) <= E164_MAX_DIGITS:
+        return None
+    return f'+{number}'
+
+
+def normalize(value, region):
+    """Copia de normalize_phone() en el momento de la migración"""
+    value = (value or '').strip()
+    if not value:
+        return None
+    region = (region or DEFAULT_REGION).upper()
+    if phonenumbers is None:
+        return fallback_e164(value, region)
+    try:
+        number = phonenumbers.parse(value, region)
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_possible_number(number):
+        return None
+    return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+
+
+def backfill_user(connection, user_id, region):
+    """Copia de backfill_user(): el contacto más antiguo se queda con cada número"""
+    taken = set(connection.execute(
+        sa.select(contacts.c.phone_e164).where(contacts.c.user_id == user_id, contacts.c.phone_e164.isnot(None))
+    ).scalars())
+    rows = connection.execute(
+        sa.select(contacts.c.id, contacts.c.phone)
+        .where(contacts.c.user_id == user_id, contacts.c.phone_e164.is_(None))
+        .order_by(contacts.c.id)
+    )
+
+    updates = []
+    for contact_id, phone in rows:
+        phone_e164 = normalize(phone, region)
+        if phone_e164 is None or phone_e164 in taken:
+            continue
+        taken.add(phone_e164)
+        updates.append({'contact_id': contact_id, 'e164': phone_e164})
+
+    if updates:
+        connection.execute(
+            contacts.update().where(contacts.c.id == sa.bindparam('contact_id'))
+            .values(phone_e164=sa.bindparam('e164')),
+            updates
+        )
+
+
+def upgrade(connection):
+    add_column(connection, 'users', sa.Column('default_region', sa.String(2), nullable=False, server_default="'ES'"))
+    add_column(connection, 'contacts', sa.Column('phone_e164', sa.String(20)))
+    create_index(connection, sa.Index('uq_contacts_user_phone_e164', contacts.c.user_id, contacts.c.phone_e164,
+                                      unique=True))
+
+    # Los duplicados en otro formato se quedan sin phone_e164: python -m src.utils.phones backfill los lista
+    regions = connection.execute(sa.select(users.c.id, users.c.default_region).order_by(users.c.id)).all()
+    for user_id, region in regions:
+        backfill_user(connection, user_id, region)
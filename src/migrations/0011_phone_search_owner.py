@@ -0,0 +1,59 @@
+"""Usuario propietario en los índices de búsqueda por teléfono (como en contacts_fts)."""
+import sqlalchemy as sa
+from src.migrate import has_table
+
+# Teléfono solo con dígitos (mismo criterio que src/utils/search.phone_digits)
+SQLITE_PHONE_DIGITS = "replace(replace(replace(replace(replace(replace(coalesce({0}, ''), ' ', ''), '-', ''), '+', ''), '(', ''), ')', ''), '.', '')"
+# Con el tokenizador trigram el owner se busca como subcadena: 'u<id>u' evita que u12 coincida con u123
+SQLITE_PHONE_OWNER = "'u' || {0} || 'u'"
+
+SQLITE_STATEMENTS = [
+    'DROP TRIGGER IF EXISTS contacts_search_ai',
+    'DROP TRIGGER IF EXISTS contacts_search_au',
+    'DROP TABLE IF EXISTS contacts_phone_fts',
+    "CREATE VIRTUAL TABLE contacts_phone_fts USING fts5(owner, phone, tokenize = 'trigram')",
+    "CREATE TRIGGER contacts_search_ai AFTER INSERT ON contacts BEGIN "
+    "INSERT INTO contacts_fts (rowid, owner, name, email) VALUES (new.id, 'u' || new.user_id, new.name, new.email); "
+    "INSERT INTO contacts_phone_fts (rowid, owner, phone) VALUES "
+    f"(new.id, {SQLITE_PHONE_OWNER.format('new.user_id')}, {SQLITE_PHONE_DIGITS.format('new.phone')}); "
+    "END",
+    "CREATE TRIGGER contacts_search_au AFTER UPDATE OF user_id, name, email, phone ON contacts BEGIN "
+    "DELETE FROM contacts_fts WHERE rowid = old.id; "
+    "DELETE FROM contacts_phone_fts WHERE rowid = old.id; "
+    "INSERT INTO contacts_fts (rowid, owner, name, email) VALUES (new.id, 'u' || new.user_id, new.name, new.email); "
+    "INSERT INTO contacts_phone_fts (rowid, owner, phone) VALUES "
+    f"(new.id, {SQLITE_PHONE_OWNER.format('new.user_id')}, {SQLITE_PHONE_DIGITS.format('new.phone')}); "
+    "END",
+    "INSERT INTO contacts_phone_fts (rowid, owner, phone) "
+    f"SELECT id, {SQLITE_PHONE_OWNER.format('user_id')}, {SQLITE_PHONE_DIGITS.format('phone')} FROM contacts",
+]
+
+POSTGRESQL_STATEMENTS = [
+    # btree_gin permite incluir user_id en los índices GIN de trigramas
+    'CREATE EXTENSION IF NOT EXISTS btree_gin',
+    'DROP INDEX IF EXISTS ix_contacts_phone_trgm',
+    'CREATE INDEX IF NOT EXISTS ix_contacts_phone_trgm ON contacts '
+    'USING gin (user_id, nexus_phone_digits(phone) gin_trgm_ops)',
+    'DROP INDEX IF EXISTS ix_contacts_search_trgm',
+    'CREATE INDEX IF NOT EXISTS ix_contacts_search_trgm ON contacts '
+    'USING gin (user_id, nexus_contact_search_text(name, email) gin_trgm_ops)',
+]
+
+
+def upgrade(connection):
+    if connection.dialect.name == 'sqlite':
+        # Sin los índices de 0004 la búsqueda usa LIKE y no hay nada que rehacer
+        if not has_table(connection, 'contacts_phone_fts'):
+            return
+        for statement in SQLITE_STATEMENTS:
+            connection.execute(sa.text(statement))
+
+    elif connection.dialect.name == 'postgresql':
+        if not connection.execute(sa.text("SELECT to_regproc('nexus_phone_digits') IS NOT NULL")).scalar():
+            return
+        try:
+            with connection.begin_nested():
+                for statement in POSTGRESQL_STATEMENTS:
+                    connection.execute(sa.text(statement))
+        except sa.exc.DBAPIError as e:
+            print(f'   ⚠️ Índices de búsqueda por usuario no creados (se mantienen los anteriores): {e.orig}')
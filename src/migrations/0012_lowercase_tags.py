@@ -0,0 +1,116 @@
+"""Etiquetas en minúsculas: fusiona las que solo difieren en mayúsculas (VIP y vip)."""
+import json
+
+import sqlalchemy as sa
+
+TAG_MAX_LENGTH = 50
+BATCH_SIZE = 1000
+
+metadata = sa.MetaData()
+
+users = sa.Table(
+    'users', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('data_version', sa.Integer)
+)
+contacts = sa.Table(
+    'contacts', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('tags', sa.Text)
+)
+tags = sa.Table(
+    'tags', metadata,
+    sa.Column('id', sa.Integer, primary_key=True),
+    sa.Column('user_id', sa.Integer),
+    sa.Column('name', sa.String(TAG_MAX_LENGTH))
+)
+contact_tags = sa.Table(
+    'contact_tags', metadata,
+    sa.Column('contact_id', sa.Integer, primary_key=True),
+    sa.Column('tag_id', sa.Integer, primary_key=True)
+)
+
+
+def normalize(raw):
+    """Copia de normalize_tags() en el momento de la migración"""
+    try:
+        value = json.loads(raw) if raw.lstrip().startswith('[') else raw.split(',')
+    except ValueError:
+        value = raw.split(',')
+    if not isinstance(value, list):
+        value = [value]
+    names, seen = [], set()
+    for item in value:
+        name = ' '.join(str(item).split()).lower()[:TAG_MAX_LENGTH] if item is not None else ''
+        if name and name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names
+
+
+def merge_tags(connection):
+    """Dejar una etiqueta por (usuario, nombre en minúsculas): la más antigua recibe los contactos del resto"""
+    groups = {}
+    for tag_id, user_id, name in connection.execute(sa.select(tags.c.id, tags.c.user_id, tags.c.name).order_by(tags.c.id)):
+        groups.setdefault((user_id, name.lower()), []).append((tag_id, name))
+
+    renames = []
+    for (user_id, lowered), members in groups.items():
+        keep_id, keep_name = members[0]
+        for tag_id, _ in members[1:]:
+            # Los contactos con ambas etiquetas ya tienen el vínculo con la conservada
+            connection.execute(
+                contact_tags.insert().from_select(
+                    ['contact_id', 'tag_id'],
+                    sa.select(contact_tags.c.contact_id, sa.literal(keep_id))
+                    .where(contact_tags.c.tag_id == tag_id)
+                    .where(~contact_tags.c.contact_id.in_(
+                        sa.select(contact_tags.c.contact_id).where(contact_tags.c.tag_id == keep_id)
+                    ))
+                )
+            )
+            connection.execute(contact_tags.delete().where(contact_tags.c.tag_id == tag_id))
+            connection.execute(tags.delete().where(tags.c.id == tag_id))
+        if keep_name != lowered:
+            renames.append({'tag_id': keep_id, 'lowered': lowered})
+
+    # Al final, cuando ya no quedan nombres que choquen con uq_tags_user_name
+    if renames:
+        connection.execute(
+            tags.update().where(tags.c.id == sa.bindparam('tag_id')).values(name=sa.bindparam('lowered')),
+            renames
+        )
+
+
+def rewrite_contacts(connection):
+    last_id = 0
+    while True:
+        rows = connection.execute(
+            sa.select(contacts.c.id, contacts.c.tags)
+            .where(contacts.c.id > last_id, contacts.c.tags.isnot(None))
+            .order_by(contacts.c.id).limit(BATCH_SIZE)
+        ).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        updates = []
+        for contact_id, raw in rows:
+            names = normalize(raw)
+            cleaned = json.dumps(names) if names else None
+            if cleaned != raw:
+                updates.append({'contact_id': contact_id, 'cleaned': cleaned})
+        if updates:
+            connection.execute(
+                contacts.update().where(contacts.c.id == sa.bindparam('contact_id')).values(tags=sa.bindparam('cleaned')),
+                updates
+            )
+
+
+def upgrade(connection):
+    merge_tags(connection)
+    rewrite_contacts(connection)
+    # Las respuestas cacheadas (ETag) de los usuarios con etiquetas ya no valen
+    connection.execute(
+        users.update().where(users.c.id.in_(sa.select(tags.c.user_id).distinct()))
+        .values(data_version=users.c.data_version + 1)
+    )
@@ -0,0 +1,18 @@
+"""Archivos subidos de las importaciones guardados en la base de datos (import_file_chunks)."""
+import sqlalchemy as sa
+from src.migrate import has_table
+
+metadata = sa.MetaData()
+
+imported_files = sa.Table('imported_files', metadata, sa.Column('id', sa.Integer, primary_key=True))
+import_file_chunks = sa.Table(
+    'import_file_chunks', metadata,
+    sa.Column('import_id', sa.Integer, sa.ForeignKey('imported_files.id', ondelete='CASCADE'), primary_key=True),
+    sa.Column('seq', sa.Integer, primary_key=True),
+    sa.Column('data', sa.LargeBinary, nullable=False)
+)
+
+
+def upgrade(connection):
+    if not has_table(connection, 'import_file_chunks'):
+        import_file_chunks.create(connection)
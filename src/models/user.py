@@ -1,16 +1,93 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from werkzeug.security import generate_password_hash, check_password_hash
+import json
+from src.utils.passwords import password_hasher
+from src.utils.phones import DEFAULT_REGION, normalize_phone
+from src.utils.replica import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
+
+class SerializerMixin:
+    """Serialización a diccionario con soporte de campos dispersos (?fields=)"""
+    
+    # Campos que devuelve to_dict(), en orden
+    serializable_fields = ()
+    # Relaciones serializadas como listas de diccionarios
+    serializable_relations = ()
+    
+    def to_dict(self, fields=None):
+        """Convierte el objeto a diccionario (solo los campos pedidos, si se indican)"""
+        names = self.serializable_fields if fields is None else \
+            [name for name in self.serializable_fields if name in fields]
+        
+        # Las fechas se dejan como datetime: el proveedor JSON las codifica en ISO 8601.
+        # Los atributos ya cargados se leen del __dict__ sin pasar por el descriptor del ORM.
+        loaded = self.__dict__
+        data = {}
+        for name in names:
+            value = loaded[name] if name in loaded else getattr(self, name)
+            if name in self.serializable_relations:
+                value = [item.to_dict() for item in value]
+            data[name] = value
+        return data
+    
+    @classmethod
+    def load_options(cls, fields=None):
+        """Opciones de carga para no leer columnas diferidas que no se van a serializar"""
+        mapper = db.inspect(cls)
+        options = []
+        for prop in mapper.column_attrs:
+            if prop.deferred and (fields is None or prop.key in fields) \
+                    and prop.key in cls.serializable_fields:
+                options.append(db.undefer(getattr(cls, prop.key)))
+        for name in cls.serializable_relations:
+            if fields is None or name in fields:
+                relation = getattr(cls, name)
+                target = relation.property.mapper.class_
+                options.append(db.selectinload(relation).options(*target.load_options()))
+        return options
 
 # Tabla de asociación para la relación muchos a muchos entre campañas y contactos
 campaign_contacts = db.Table('campaign_contacts',
     db.Column('campaign_id', db.Integer, db.ForeignKey('campaigns.id'), primary_key=True),
-    db.Column('contact_id', db.Integer, db.ForeignKey('contacts.id'), primary_key=True)
+    db.Column('contact_id', db.Integer, db.ForeignKey('contacts.id'), primary_key=True),
+    # La PK (campaign_id, contact_id) cubre campaña -> contactos; este índice el sentido inverso
+    db.Index('ix_campaign_contacts_contact', 'contact_id', 'campaign_id')
+)
+
+# Etiquetas normalizadas de cada contacto (la columna JSON contacts.tags se mantiene en paralelo)
+contact_tags = db.Table('contact_tags',
+    db.Column('contact_id', db.Integer, db.ForeignKey('contacts.id', ondelete='CASCADE'), primary_key=True),
+    db.Column('tag_id', db.Integer, db.ForeignKey('tags.id', ondelete='CASCADE'), primary_key=True),
+    db.Index('ix_contact_tags_tag', 'tag_id', 'contact_id')
 )
 
-class User(db.Model):
+TAG_MAX_LENGTH = 50
+CAMPAIGN_STATUSES = ('draft', 'scheduled', 'active', 'completed', 'paused')
+
+
+def normalize_tags(value):
+    """Lista de etiquetas limpia y en minúsculas: acepta lista, JSON o texto separado por comas"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        try:
+            value = json.loads(value) if value.lstrip().startswith('[') else value.split(',')
+        except ValueError:
+            value = value.split(',')
+    if not isinstance(value, (list, tuple)):
+        value = [value]
+    
+    names = []
+    seen = set()
+    for item in value:
+        name = ' '.join(str(item).split()).lower()[:TAG_MAX_LENGTH] if item is not None else ''
+        if name and name not in seen:
+            seen.add(name)
+            names.append(name)
+    return names
+
+class User(SerializerMixin, db.Model):
     __tablename__ = 'users'
     
     id = db.Column(db.Integer, primary_key=True)
@@ -20,14 +97,14 @@ class User(db.Model):
     phone = db.Column(db.String(20), nullable=True)
     company = db.Column(db.String(100), nullable=True)
     
-    # API Keys
-    whatsapp_api_key = db.Column(db.Text, nullable=True)
-    gmail_api_key = db.Column(db.Text, nullable=True)
-    gemini_api_key = db.Column(db.Text, nullable=True)
+    # API Keys (carga diferida: solo se leen cuando se usan)
+    whatsapp_api_key = db.deferred(db.Column(db.Text, nullable=True), group='api_keys')
+    gmail_api_key = db.deferred(db.Column(db.Text, nullable=True), group='api_keys')
+    gemini_api_key = db.deferred(db.Column(db.Text, nullable=True), group='api_keys')
     
     # Configuración de automatización
     gemini_auto_reply_enabled = db.Column(db.Boolean, default=False)
-    gemini_knowledge_base = db.Column(db.Text, nullable=True)
+    gemini_knowledge_base = db.deferred(db.Column(db.Text, nullable=True))
     
     # Configuración de notificaciones
     email_notifications = db.Column(db.Boolean, default=True)
@@ -42,6 +119,8 @@ class User(db.Model):
     # Configuración del sistema
     language = db.Column(db.String(10), default='es')
     timezone = db.Column(db.String(50), default='Europe/Madrid')
+    # Región para interpretar los teléfonos sin prefijo internacional (ISO 3166, 'ES')
+    default_region = db.Column(db.String(2), nullable=False, default=DEFAULT_REGION, server_default=DEFAULT_REGION)
     theme = db.Column(db.String(10), default='light')
     
     # Timestamps
@@ -49,49 +128,88 @@ class User(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     last_login = db.Column(db.DateTime, nullable=True)
     
+    # Contador de cambios de los datos del usuario (base de los ETags)
+    data_version = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
+    # Contadores desnormalizados, mantenidos en cada flush (src/utils/counters.py)
+    contacts_total = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    contacts_active = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    campaigns_total = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    campaigns_draft = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    campaigns_scheduled = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    campaigns_active = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    campaigns_completed = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    campaigns_paused = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    messages_sent_total = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bot_activity_total = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    bot_activity_failed = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    
     # Relaciones
     contacts = db.relationship('Contact', backref='user', lazy=True, cascade='all, delete-orphan')
     campaigns = db.relationship('Campaign', backref='user', lazy=True, cascade='all, delete-orphan')
     imported_files = db.relationship('ImportedFile', backref='user', lazy=True, cascade='all, delete-orphan')
     bot_activities = db.relationship('BotActivity', backref='user', lazy=True, cascade='all, delete-orphan')
+    tags = db.relationship('Tag', backref='user', lazy=True, cascade='all, delete-orphan')
+    
+    serializable_fields = (
+        'id',
+        'email',
+        'name',
+        'phone',
+        'company',
+        'whatsapp_api_key',
+        'gmail_api_key',
+        'gemini_api_key',
+        'gemini_auto_reply_enabled',
+        'gemini_knowledge_base',
+        'email_notifications',
+        'push_notifications',
+        'sms_notifications',
+        'profile_visible',
+        'data_sharing',
+        'analytics',
+        'language',
+        'timezone',
+        'default_region',
+        'theme',
+        'created_at',
+        'updated_at',
+        'last_login'
+    )
+    
+    @classmethod
+    def phone_region(cls, user_id):
+        """Región por defecto del usuario para normalizar teléfonos"""
+        return db.session.query(cls.default_region).filter(cls.id == user_id).scalar() or DEFAULT_REGION
+    
+    @property
+    def campaigns_by_status(self):
+        """Campañas por estado según los contadores"""
+        return {status: getattr(self, f'campaigns_{status}') or 0 for status in CAMPAIGN_STATUSES}
     
     def set_password(self, password):
         """Establece la contraseña hasheada"""
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = password_hasher.hash(password)
     
     def check_password(self, password):
         """Verifica la contraseña"""
-        return check_password_hash(self.password_hash, password)
-    
-    def to_dict(self):
-        """Convierte el objeto a diccionario"""
-        return {
-            'id': self.id,
-            'email': self.email,
-            'name': self.name,
-            'phone': self.phone,
-            'company': self.company,
-            'whatsapp_api_key': self.whatsapp_api_key,
-            'gmail_api_key': self.gmail_api_key,
-            'gemini_api_key': self.gemini_api_key,
-            'gemini_auto_reply_enabled': self.gemini_auto_reply_enabled,
-            'gemini_knowledge_base': self.gemini_knowledge_base,
-            'email_notifications': self.email_notifications,
-            'push_notifications': self.push_notifications,
-            'sms_notifications': self.sms_notifications,
-            'profile_visible': self.profile_visible,
-            'data_sharing': self.data_sharing,
-            'analytics': self.analytics,
-            'language': self.language,
-            'timezone': self.timezone,
-            'theme': self.theme,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'last_login': self.last_login.isoformat() if self.last_login else None
-        }
+        return password_hasher.verify(self.password_hash, password)
+    
+    def password_needs_rehash(self):
+        """Indica si el hash usa un método o factor de trabajo antiguo"""
+        return password_hasher.needs_rehash(self.password_hash)
 
-class Contact(db.Model):
+class Contact(SerializerMixin, db.Model):
     __tablename__ = 'contacts'
+    __table_args__ = (
+        # Listados por usuario ordenados por fecha y conteos por estado
+        db.Index('ix_contacts_user_created', 'user_id', 'created_at'),
+        db.Index('ix_contacts_user_status', 'user_id', 'status'),
+        # Un teléfono por usuario (comprobación de duplicados en alta, edición e importación)
+        db.Index('uq_contacts_user_phone', 'user_id', 'phone', unique=True),
+        # El mismo número escrito en otro formato también es un duplicado
+        db.Index('uq_contacts_user_phone_e164', 'user_id', 'phone_e164', unique=True),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -99,39 +217,103 @@ class Contact(db.Model):
     name = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), nullable=True)
     phone = db.Column(db.String(20), nullable=False)
+    phone_e164 = db.Column(db.String(20), nullable=True)  # +34600111222 (None si no es un número completo)
     status = db.Column(db.String(20), default='activo')  # activo, inactivo
     tags = db.Column(db.Text, nullable=True)  # JSON string de tags
-    notes = db.Column(db.Text, nullable=True)
+    notes = db.deferred(db.Column(db.Text, nullable=True))
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     last_message = db.Column(db.DateTime, nullable=True)
     
-    def to_dict(self):
-        """Convierte el objeto a diccionario"""
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'name': self.name,
-            'email': self.email,
-            'phone': self.phone,
-            'status': self.status,
-            'tags': self.tags,
-            'notes': self.notes,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'last_message': self.last_message.isoformat() if self.last_message else None
-        }
+    # Relaciones
+    tag_items = db.relationship('Tag', secondary=contact_tags, lazy=True)
+    
+    serializable_fields = (
+        'id',
+        'user_id',
+        'name',
+        'email',
+        'phone',
+        'phone_e164',
+        'status',
+        'tags',
+        'notes',
+        'created_at',
+        'updated_at',
+        'last_message'
+    )
+    
+    def set_phone(self, value, region):
+        """Guarda el teléfono tal cual y su forma E.164 con la región del usuario"""
+        self.phone = value.strip()
+        self.phone_e164 = normalize_phone(self.phone, region)
+    
+    @classmethod
+    def find_by_phone(cls, user_id, phone, region):
+        """Contacto del usuario con ese teléfono en cualquier formato (búsqueda por los índices únicos)"""
+        phone = phone.strip()
+        phone_e164 = normalize_phone(phone, region)
+        condition = cls.phone == phone
+        if phone_e164:
+            condition = db.or_(cls.phone_e164 == phone_e164, condition)
+        return cls.query.filter(cls.user_id == user_id, condition).first()
+    
+    def set_tags(self, value, tag_cache=None):
+        """Guarda las etiquetas en la columna JSON y en contact_tags"""
+        names = normalize_tags(value)
+        self.tags = json.dumps(names) if names else None
+        self.tag_items = Tag.resolve(self.user_id, names, cache=tag_cache)
+
+class Tag(db.Model):
+    __tablename__ = 'tags'
+    __table_args__ = (
+        db.Index('uq_tags_user_name', 'user_id', 'name', unique=True),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False)
+    name = db.Column(db.String(TAG_MAX_LENGTH), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @classmethod
+    def resolve(cls, user_id, names, cache=None):
+        """Etiquetas del usuario por nombre, creando las que falten (cache opcional para importaciones)"""
+        cache = {} if cache is None else cache
+        missing = [name for name in names if name not in cache]
+        if missing:
+            for tag in cls.query.filter(cls.user_id == user_id, cls.name.in_(missing)):
+                cache[tag.name] = tag
+            for name in missing:
+                if name not in cache:
+                    cache[name] = cls(user_id=user_id, name=name)
+                    db.session.add(cache[name])
+        return [cache[name] for name in names]
+    
+    @classmethod
+    def contact_ids(cls, user_id, names, match_all=False):
+        """Subconsulta de contactos con alguna (o todas, si match_all) de las etiquetas"""
+        query = db.select(contact_tags.c.contact_id)\
+            .join(cls, cls.id == contact_tags.c.tag_id)\
+            .where(cls.user_id == user_id, cls.name.in_(names))
+        if match_all:
+            query = query.group_by(contact_tags.c.contact_id)\
+                .having(db.func.count(contact_tags.c.tag_id) == len(names))
+        return query
 
-class Campaign(db.Model):
+class Campaign(SerializerMixin, db.Model):
     __tablename__ = 'campaigns'
+    __table_args__ = (
+        db.Index('ix_campaigns_user_created', 'user_id', 'created_at'),
+        db.Index('ix_campaigns_user_status', 'user_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     
     name = db.Column(db.String(200), nullable=False)
-    message = db.Column(db.Text, nullable=False)
+    message = db.deferred(db.Column(db.Text, nullable=False))
     status = db.Column(db.String(20), default='draft')  # draft, scheduled, active, completed, paused
     
     # Estadísticas
@@ -153,34 +335,36 @@ class Campaign(db.Model):
     sent_at = db.Column(db.DateTime, nullable=True)
     
     # Relaciones
-    contacts = db.relationship('Contact', secondary=campaign_contacts, lazy='subquery',
+    contacts = db.relationship('Contact', secondary=campaign_contacts, lazy=True,
                               backref=db.backref('campaigns', lazy=True))
     media_files = db.relationship('MediaFile', backref='campaign', lazy=True, cascade='all, delete-orphan')
     
-    def to_dict(self):
-        """Convierte el objeto a diccionario"""
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'name': self.name,
-            'message': self.message,
-            'status': self.status,
-            'sent_count': self.sent_count,
-            'opened_count': self.opened_count,
-            'clicked_count': self.clicked_count,
-            'total_recipients': self.total_recipients,
-            'scheduled_at': self.scheduled_at.isoformat() if self.scheduled_at else None,
-            'media_url': self.media_url,
-            'media_type': self.media_type,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'sent_at': self.sent_at.isoformat() if self.sent_at else None,
-            'contacts': [contact.to_dict() for contact in self.contacts],
-            'media_files': [media.to_dict() for media in self.media_files]
-        }
+    serializable_fields = (
+        'id',
+        'user_id',
+        'name',
+        'message',
+        'status',
+        'sent_count',
+        'opened_count',
+        'clicked_count',
+        'total_recipients',
+        'scheduled_at',
+        'media_url',
+        'media_type',
+        'created_at',
+        'updated_at',
+        'sent_at',
+        'contacts',
+        'media_files'
+    )
+    serializable_relations = ('contacts', 'media_files')
 
-class MediaFile(db.Model):
+class MediaFile(SerializerMixin, db.Model):
     __tablename__ = 'media_files'
+    __table_args__ = (
+        db.Index('ix_media_files_campaign', 'campaign_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     campaign_id = db.Column(db.Integer, db.ForeignKey('campaigns.id'), nullable=False)
@@ -194,20 +378,24 @@ class MediaFile(db.Model):
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'filename': self.filename,
-            'original_filename': self.original_filename,
-            'filepath': self.filepath,
-            'mimetype': self.mimetype,
-            'file_size': self.file_size,
-            'campaign_id': self.campaign_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    serializable_fields = (
+        'id',
+        'filename',
+        'original_filename',
+        'filepath',
+        'mimetype',
+        'file_size',
+        'campaign_id',
+        'created_at'
+    )
 
-class ImportedFile(db.Model):
+class ImportedFile(SerializerMixin, db.Model):
     __tablename__ = 'imported_files'
+    __table_args__ = (
+        db.Index('ix_imported_files_user_created', 'user_id', 'created_at'),
+        # Cola de trabajos del worker: pendientes y en curso por antigüedad
+        db.Index('ix_imported_files_status', 'status', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -216,30 +404,56 @@ class ImportedFile(db.Model):
     file_type = db.Column(db.String(50), nullable=False)  # excel, csv, google_sheets, google_drive
     file_url = db.Column(db.String(500), nullable=True)
     contacts_imported = db.Column(db.Integer, default=0)
-    status = db.Column(db.String(20), default='processing')  # processing, completed, failed
-    error_message = db.Column(db.Text, nullable=True)
+    status = db.Column(db.String(20), default='queued')  # queued, processing, completed, failed
+    error_message = db.deferred(db.Column(db.Text, nullable=True))
+    
+    # Progreso del trabajo en segundo plano (se guarda con cada lote confirmado)
+    rows_read = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rows_rejected = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    rows_total = db.Column(db.Integer, nullable=True)  # estimación mientras se lee el archivo
+    source_path = db.Column(db.String(500), nullable=True)  # copia local en el worker que lo procesa
+    options = db.Column(db.Text, nullable=True)  # JSON: {"sheet": "Hoja1"}
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime, nullable=True)
+    heartbeat_at = db.Column(db.DateTime, nullable=True)
     completed_at = db.Column(db.DateTime, nullable=True)
     
-    def to_dict(self):
-        """Convierte el objeto a diccionario"""
-        return {
-            'id': self.id,
-            'user_id': self.user_id,
-            'filename': self.filename,
-            'file_type': self.file_type,
-            'file_url': self.file_url,
-            'contacts_imported': self.contacts_imported,
-            'status': self.status,
-            'error_message': self.error_message,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'completed_at': self.completed_at.isoformat() if self.completed_at else None
-        }
+    serializable_fields = (
+        'id',
+        'user_id',
+        'filename',
+        'file_type',
+        'file_url',
+        'contacts_imported',
+        'status',
+        'error_message',
+        'rows_read',
+        'rows_rejected',
+        'rows_total',
+        'created_at',
+        'started_at',
+        'completed_at'
+    )
 
-class BotActivity(db.Model):
+class ImportChunk(db.Model):
+    """Archivo subido para una importación, en trozos: el web y el worker no comparten disco"""
+    __tablename__ = 'import_file_chunks'
+    
+    import_id = db.Column(db.Integer, db.ForeignKey('imported_files.id', ondelete='CASCADE'), primary_key=True)
+    seq = db.Column(db.Integer, primary_key=True)
+    data = db.Column(db.LargeBinary, nullable=False)
+
+class BotActivity(SerializerMixin, db.Model):
     __tablename__ = 'bot_activities'
+    __table_args__ = (
+        db.Index('ix_bot_activities_user_created', 'user_id', 'created_at'),
+        # Filtro por tipo con el mismo orden por fecha (historial y estadísticas)
+        db.Index('ix_bot_activities_user_type_created', 'user_id', 'activity_type', 'created_at'),
+        db.Index('ix_bot_activities_user_status', 'user_id', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -247,23 +461,110 @@ class BotActivity(db.Model):
     activity_type = db.Column(db.String(50), nullable=False)  # message_received, auto_reply_sent, etc.
     contact_phone = db.Column(db.String(20))
     contact_name = db.Column(db.String(100))
-    message_content = db.Column(db.Text)
-    response_content = db.Column(db.Text)
+    message_content = db.deferred(db.Column(db.Text), group='content')
+    response_content = db.deferred(db.Column(db.Text), group='content')
     status = db.Column(db.String(20), default='success')  # success, failed
     
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'activity_type': self.activity_type,
-            'contact_phone': self.contact_phone,
-            'contact_name': self.contact_name,
-            'message_content': self.message_content,
-            'response_content': self.response_content,
-            'status': self.status,
-            'user_id': self.user_id,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    serializable_fields = (
+        'id',
+        'activity_type',
+        'contact_phone',
+        'contact_name',
+        'message_content',
+        'response_content',
+        'status',
+        'user_id',
+        'created_at'
+    )
+
+
+class DailyUserStats(db.Model):
+    """Agregados diarios por usuario; el día es el de su zona horaria (src/utils/rollups.py)"""
+    __tablename__ = 'daily_user_stats'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+
+    # Contactos por created_at; campañas y mensajes por sent_at
+    contacts_new = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    campaigns_sent = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    campaigns_completed = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    messages_sent = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    messages_opened = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    messages_clicked = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+
+class DailyBotActivity(db.Model):
+    """Actividades del bot por usuario, día, tipo y estado"""
+    __tablename__ = 'daily_bot_activity'
+
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    activity_type = db.Column(db.String(50), primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    total = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+
+
+class RevokedToken(db.Model):
+    __tablename__ = 'revoked_tokens'
+    __table_args__ = (
+        # Purga de revocaciones caducadas
+        db.Index('ix_revoked_tokens_expires', 'expires_at'),
+    )
+    
+    jti = db.Column(db.String(64), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=True)
+    token_type = db.Column(db.String(20), nullable=False)  # access, refresh
+    
+    # Timestamps
+    expires_at = db.Column(db.DateTime, nullable=False)
+    revoked_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    @classmethod
+    def is_revoked(cls, jti):
+        """Verifica si el token fue revocado"""
+        return db.session.query(cls.jti).filter_by(jti=jti).first() is not None
+    
+    @classmethod
+    def purge_expired(cls):
+        """Elimina revocaciones de tokens que ya caducaron"""
+        return cls.query.filter(cls.expires_at < datetime.utcnow()).delete(synchronize_session=False)
+
+
+def touch_user_data(*user_ids, connection=None):
+    """Incrementa el contador de cambios de los usuarios (invalida sus ETags)"""
+    user_ids = {user_id for user_id in user_ids if user_id}
+    if not user_ids:
+        return
+    # updated_at se fija a sí mismo: su onupdate es para cambios del perfil, no de sus datos
+    statement = User.__table__.update()\
+        .where(User.__table__.c.id.in_(user_ids))\
+        .values(data_version=User.__table__.c.data_version + 1, updated_at=User.__table__.c.updated_at)
+    (connection or db.session).execute(statement)
 
+@db.event.listens_for(db.orm.Session, 'after_flush')
+def _track_user_data_changes(session, flush_context):
+    """Registra qué usuarios tienen datos modificados en este flush"""
+    user_ids = set()
+    campaign_ids = set()
+    
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, User):
+            if obj not in session.deleted:
+                user_ids.add(obj.id)
+        elif isinstance(obj, (Contact, Tag, Campaign, ImportedFile, BotActivity)):
+            user_ids.add(obj.user_id)
+        elif isinstance(obj, MediaFile):
+            campaign_ids.add(obj.campaign_id)
+    
+    connection = session.connection()
+    if campaign_ids:
+        rows = connection.execute(
+            db.select(Campaign.__table__.c.user_id).where(Campaign.__table__.c.id.in_(campaign_ids))
+        )
+        user_ids.update(row.user_id for row in rows)
+    
+    touch_user_data(*user_ids, connection=connection)
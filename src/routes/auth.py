@@ -1,6 +1,13 @@
 from flask import Blueprint, request, jsonify, session
-from src.models.user import db, User
+from src.models.user import db, User, RevokedToken
+from src.utils.auth import require_auth, require_user
+from src.utils.fields import requested_fields
+from src.utils.http_cache import user_etag, etag_matches, not_modified, with_etag
+from src.utils.passwords import PasswordHasherBusy
+from src.utils.tokens import (TokenError, create_token_pair, decode_token,
+                              refresh_token_matches_user, token_expiry)
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 import re
 
 auth_bp = Blueprint('auth', __name__)
@@ -62,6 +69,8 @@ def register():
             'user': user.to_dict()
         }), 201
         
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Servidor ocupado, inténtalo de nuevo en unos segundos'}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
@@ -85,6 +94,10 @@ def login():
         if not user or not user.check_password(password):
             return jsonify({'error': 'Credenciales inválidas'}), 401
         
+        # Actualizar hashes generados con un método o factor de trabajo antiguo
+        if user.password_needs_rehash():
+            user.set_password(password)
+        
         # Actualizar último login
         user.last_login = datetime.utcnow()
         db.session.commit()
@@ -95,10 +108,13 @@ def login():
         
         return jsonify({
             'message': 'Inicio de sesión exitoso',
-            'user': user.to_dict()
+            'user': user.to_dict(requested_fields())
         }), 200
         
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Servidor ocupado, inténtalo de nuevo en unos segundos'}), 503, {'Retry-After': '1'}
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
 
 @auth_bp.route('/logout', methods=['POST'])
@@ -114,18 +130,17 @@ def logout():
 def get_current_user():
     """Obtener información del usuario actual"""
     try:
-        user_id = session.get('user_id')
-        
-        if not user_id:
+        # Sesión por cookie o token Bearer
+        if not require_auth():
             return jsonify({'error': 'No hay sesión activa'}), 401
         
-        user = User.query.get(user_id)
+        fields = requested_fields()
+        user = require_user(fields)
         if not user:
-            session.clear()
             return jsonify({'error': 'Usuario no encontrado'}), 404
         
         return jsonify({
-            'user': user.to_dict()
+            'user': user.to_dict(fields)
         }), 200
         
     except Exception as e:
@@ -135,21 +150,142 @@ def get_current_user():
 def check_session():
     """Verificar si hay una sesión activa"""
     try:
-        user_id = session.get('user_id')
-        
-        if not user_id:
+        principal = require_auth()
+        if not principal:
             return jsonify({'authenticated': False}), 200
         
-        user = User.query.get(user_id)
+        etag = user_etag(principal.id, 'check-session')
+        if etag_matches(etag):
+            return not_modified(etag)
+        
+        fields = requested_fields()
+        user = require_user(fields)
         if not user:
-            session.clear()
             return jsonify({'authenticated': False}), 200
         
-        return jsonify({
+        return with_etag(jsonify({
             'authenticated': True,
-            'user': user.to_dict()
-        }), 200
+            'user': user.to_dict(fields)
+        }), etag), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+
+
+@auth_bp.route('/token', methods=['POST'])
+def issue_token():
+    """Iniciar sesión en modo token (access + refresh) sin cookie de sesión"""
+    try:
+        data = request.get_json()
+        
+        # Validar datos requeridos
+        if not data or not data.get('email') or not data.get('password'):
+            return jsonify({'error': 'Email y contraseña son requeridos'}), 400
+        
+        email = data['email'].lower().strip()
+        password = data['password']
+        
+        # Buscar usuario
+        user = User.query.filter_by(email=email).first()
+        
+        if not user or not user.check_password(password):
+            return jsonify({'error': 'Credenciales inválidas'}), 401
+        
+        # Actualizar hashes generados con un método o factor de trabajo antiguo
+        if user.password_needs_rehash():
+            user.set_password(password)
         
+        # Actualizar último login
+        user.last_login = datetime.utcnow()
+        db.session.commit()
+        
+        return jsonify(create_token_pair(user)), 200
+        
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Servidor ocupado, inténtalo de nuevo en unos segundos'}), 503, {'Retry-After': '1'}
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
 
+@auth_bp.route('/token/refresh', methods=['POST'])
+def refresh_token():
+    """Renovar el par de tokens a partir de un refresh token válido (rotación)"""
+    try:
+        data = request.get_json()
+        if not data or not data.get('refresh_token'):
+            return jsonify({'error': 'refresh_token requerido'}), 400
+        
+        try:
+            claims = decode_token(data['refresh_token'], 'refresh')
+        except TokenError:
+            return jsonify({'error': 'Token inválido o caducado'}), 401
+        
+        if RevokedToken.is_revoked(claims['jti']):
+            return jsonify({'error': 'Token revocado'}), 401
+        
+        user = db.session.get(User, int(claims['sub']))
+        if not user or not refresh_token_matches_user(claims, user):
+            return jsonify({'error': 'Token inválido o caducado'}), 401
+        
+        # Revocar el refresh token usado: cada refresh token sirve una sola vez
+        db.session.add(RevokedToken(
+            jti=claims['jti'],
+            user_id=user.id,
+            token_type='refresh',
+            expires_at=token_expiry(claims)
+        ))
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Otra petición rotó el mismo refresh token a la vez
+            db.session.rollback()
+            return jsonify({'error': 'Token revocado'}), 401
+        
+        return jsonify(create_token_pair(user)), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+
+@auth_bp.route('/token/revoke', methods=['POST'])
+def revoke_token():
+    """Revocar el refresh token (cerrar sesión en modo token)"""
+    try:
+        principal = require_auth()
+        if not principal:
+            return jsonify({'error': 'No autorizado'}), 401
+        
+        data = request.get_json(silent=True) or {}
+        revoked = []
+        
+        if data.get('refresh_token'):
+            try:
+                claims = decode_token(data['refresh_token'], 'refresh')
+            except TokenError:
+                return jsonify({'error': 'Token inválido o caducado'}), 400
+            if int(claims['sub']) != principal.id:
+                return jsonify({'error': 'Acceso prohibido'}), 403
+            revoked.append(claims)
+        
+        # Los access tokens no se registran: se verifican sin consultar la BD y
+        # dejan de valer al caducar (ACCESS_TOKEN_EXPIRES)
+        for claims in revoked:
+            if not RevokedToken.is_revoked(claims['jti']):
+                db.session.add(RevokedToken(
+                    jti=claims['jti'],
+                    user_id=principal.id,
+                    token_type='refresh',
+                    expires_at=token_expiry(claims)
+                ))
+        
+        RevokedToken.purge_expired()
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Token revocado exitosamente',
+            'revoked_count': len(revoked)
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
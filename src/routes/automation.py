@@ -1,38 +1,46 @@
 from flask import Blueprint, request, jsonify, session
-from src.models.user import db, User, BotActivity
+from src.models.user import db, User, BotActivity, touch_user_data
+from src.utils.auth import require_auth, require_user
+from src.utils.fields import requested_fields
+from src.utils.pagination import CursorError, paginate
+from src.utils.http_cache import user_etag, etag_matches, not_modified, with_etag
+from src.utils.replica import replica_reads
+from src.utils.counters import reset_bot_counters
+from src.utils.rollups import clear_bot_activity
+from src.utils.stats import StatsQuery, percentage
 from datetime import datetime, timedelta
 
 automation_bp = Blueprint('automation', __name__)
 
-def require_auth():
-    """Middleware para verificar autenticación"""
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    
-    user = User.query.get(user_id)
-    if not user:
-        session.clear()
-        return None
-    
-    return user
-
 @automation_bp.route('/status', methods=['GET'])
 def get_automation_status():
     """Obtener el estado del bot de automatización"""
     try:
-        user = require_auth()
-        if not user:
+        principal = require_auth()
+        if not principal:
             return jsonify({'error': 'No autorizado'}), 401
         
-        return jsonify({
+        etag = user_etag(principal.id, 'automation-status')
+        if etag_matches(etag):
+            return not_modified(etag)
+        
+        # Solo si están configuradas: las columnas diferidas no se leen enteras en cada consulta
+        status = db.session.query(
+            User.gemini_auto_reply_enabled,
+            (db.func.coalesce(db.func.length(User.gemini_api_key), 0) > 0).label('gemini_configured'),
+            (db.func.coalesce(db.func.length(User.gemini_knowledge_base), 0) > 0).label('knowledge_base_configured')
+        ).filter(User.id == principal.id).first()
+        if not status:
+            return jsonify({'error': 'No autorizado'}), 401
+        
+        return with_etag(jsonify({
             'automation': {
-                'enabled': user.gemini_auto_reply_enabled,
-                'gemini_configured': bool(user.gemini_api_key),
-                'knowledge_base_configured': bool(user.gemini_knowledge_base),
+                'enabled': status.gemini_auto_reply_enabled,
+                'gemini_configured': bool(status.gemini_configured),
+                'knowledge_base_configured': bool(status.knowledge_base_configured),
                 'last_activity': None  # Se actualizará con actividad real
             }
-        }), 200
+        }), etag), 200
         
     except Exception as e:
         return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
@@ -41,7 +49,7 @@ def get_automation_status():
 def toggle_automation():
     """Activar/desactivar respuestas automáticas"""
     try:
-        user = require_auth()
+        user = require_user()
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
@@ -84,7 +92,7 @@ def toggle_automation():
 def get_knowledge_base():
     """Obtener la base de conocimiento del agente"""
     try:
-        user = require_auth()
+        user = require_user()
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
@@ -100,7 +108,7 @@ def get_knowledge_base():
 def update_knowledge_base():
     """Actualizar la base de conocimiento del agente"""
     try:
-        user = require_auth()
+        user = require_user()
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
@@ -141,43 +149,32 @@ def get_bot_activity():
             return jsonify({'error': 'No autorizado'}), 401
         
         # Parámetros de consulta
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 100)
         activity_type = request.args.get('type', '').strip()
+        fields = requested_fields()
         
         # Construir consulta
-        query = BotActivity.query.filter_by(user_id=user.id)
+        query = BotActivity.query.filter_by(user_id=user.id).options(*BotActivity.load_options(fields))
         
         # Filtrar por tipo de actividad
         if activity_type:
             query = query.filter_by(activity_type=activity_type)
         
-        # Ordenar por fecha (más recientes primero)
-        query = query.order_by(BotActivity.created_at.desc())
-        
-        # Paginación
-        activities = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
+        # Paginación por cursor (keyset) o por página, de más recientes a más antiguos
+        try:
+            activities, pagination = paginate(query, BotActivity, user.id, scope='activities')
+        except CursorError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
-            'activities': [activity.to_dict() for activity in activities.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': activities.total,
-                'pages': activities.pages,
-                'has_next': activities.has_next,
-                'has_prev': activities.has_prev
-            }
+            'activities': [activity.to_dict(fields) for activity in activities],
+            'pagination': pagination
         }), 200
         
     except Exception as e:
         return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
 
 @automation_bp.route('/activity/stats', methods=['GET'])
+@replica_reads
 def get_activity_stats():
     """Obtener estadísticas de actividad del bot"""
     try:
@@ -185,54 +182,23 @@ def get_activity_stats():
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
-        # Estadísticas de los últimos 30 días
+        # Todas las métricas en una sola consulta sobre bot_activities
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        
-        total_activities = BotActivity.query.filter_by(user_id=user.id).count()
-        recent_activities = BotActivity.query.filter(
-            BotActivity.user_id == user.id,
-            BotActivity.created_at >= thirty_days_ago
-        ).count()
-        
-        # Actividades por tipo
-        message_received = BotActivity.query.filter_by(
-            user_id=user.id, 
-            activity_type='message_received'
-        ).count()
-        
-        auto_replies = BotActivity.query.filter_by(
-            user_id=user.id, 
-            activity_type='auto_reply_sent'
-        ).count()
-        
-        successful_activities = BotActivity.query.filter_by(
-            user_id=user.id, 
-            status='success'
-        ).count()
-        
-        failed_activities = BotActivity.query.filter_by(
-            user_id=user.id, 
-            status='failed'
-        ).count()
-        
-        # Actividades de hoy
-        today = datetime.utcnow().date()
-        today_activities = BotActivity.query.filter(
-            BotActivity.user_id == user.id,
-            db.func.date(BotActivity.created_at) == today
-        ).count()
+        today_start = datetime.combine(datetime.utcnow().date(), datetime.min.time())
+        
+        stats = StatsQuery(BotActivity, BotActivity.user_id == user.id)\
+            .count('total_activities')\
+            .count('recent_activities', BotActivity.created_at >= thirty_days_ago)\
+            .count('today_activities', BotActivity.created_at >= today_start)\
+            .count('message_received', BotActivity.activity_type == 'message_received')\
+            .count('auto_replies', BotActivity.activity_type == 'auto_reply_sent')\
+            .count('successful_activities', BotActivity.status == 'success')\
+            .count('failed_activities', BotActivity.status == 'failed')\
+            .run()
+        stats['success_rate'] = percentage(stats['successful_activities'], stats['total_activities'])
         
         return jsonify({
-            'stats': {
-                'total_activities': total_activities,
-                'recent_activities': recent_activities,
-                'today_activities': today_activities,
-                'message_received': message_received,
-                'auto_replies': auto_replies,
-                'successful_activities': successful_activities,
-                'failed_activities': failed_activities,
-                'success_rate': round((successful_activities / total_activities * 100) if total_activities > 0 else 0, 2)
-            }
+            'stats': stats
         }), 200
         
     except Exception as e:
@@ -242,7 +208,7 @@ def get_activity_stats():
 def test_auto_response():
     """Probar respuesta automática con un mensaje de ejemplo"""
     try:
-        user = require_auth()
+        user = require_user()
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
@@ -320,7 +286,7 @@ def whatsapp_webhook():
 def get_automation_settings():
     """Obtener configuración completa de automatización"""
     try:
-        user = require_auth()
+        user = require_user()
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
@@ -347,6 +313,9 @@ def clear_activity_history():
         
         # Eliminar todas las actividades del usuario
         deleted_count = BotActivity.query.filter_by(user_id=user.id).delete()
+        clear_bot_activity(user.id)
+        reset_bot_counters(user.id)
+        touch_user_data(user.id)
         db.session.commit()
         
         return jsonify({
@@ -1,5 +1,10 @@
 from flask import Blueprint, request, jsonify, session
 from src.models.user import db, User, Campaign, Contact, MediaFile, campaign_contacts
+from src.utils.auth import require_auth, require_user
+from src.utils.fields import requested_fields
+from src.utils.pagination import CursorError, paginate
+from src.utils.http_cache import user_etag, etag_matches, not_modified, with_etag
+from src.utils.stats import StatsQuery, percentage
 from datetime import datetime
 import json
 from werkzeug.utils import secure_filename
@@ -7,19 +12,6 @@ import os
 
 campaigns_bp = Blueprint('campaigns', __name__)
 
-def require_auth():
-    """Middleware para verificar autenticación"""
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    
-    user = User.query.get(user_id)
-    if not user:
-        session.clear()
-        return None
-    
-    return user
-
 @campaigns_bp.route('/', methods=['GET'])
 def get_campaigns():
     """Obtener lista de campañas del usuario"""
@@ -29,37 +21,25 @@ def get_campaigns():
             return jsonify({'error': 'No autorizado'}), 401
         
         # Parámetros de consulta
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 100)
         status = request.args.get('status', '').strip()
+        fields = requested_fields()
         
         # Construir consulta
-        query = Campaign.query.filter_by(user_id=user.id)
+        query = Campaign.query.filter_by(user_id=user.id).options(*Campaign.load_options(fields))
         
         # Filtrar por estado
         if status:
             query = query.filter_by(status=status)
         
-        # Ordenar por fecha de creación (más recientes primero)
-        query = query.order_by(Campaign.created_at.desc())
-        
-        # Paginación
-        campaigns = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
+        # Paginación por cursor (keyset) o por página, de más recientes a más antiguos
+        try:
+            campaigns, pagination = paginate(query, Campaign, user.id, scope='campaigns')
+        except CursorError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
-            'campaigns': [campaign.to_dict() for campaign in campaigns.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': campaigns.total,
-                'pages': campaigns.pages,
-                'has_next': campaigns.has_next,
-                'has_prev': campaigns.has_prev
-            }
+            'campaigns': [campaign.to_dict(fields) for campaign in campaigns],
+            'pagination': pagination
         }), 200
         
     except Exception as e:
@@ -122,13 +102,19 @@ def get_campaign(campaign_id):
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
-        campaign = Campaign.query.filter_by(id=campaign_id, user_id=user.id).first()
+        etag = user_etag(user.id, f'campaign-{campaign_id}')
+        if etag_matches(etag):
+            return not_modified(etag)
+        
+        fields = requested_fields()
+        campaign = Campaign.query.filter_by(id=campaign_id, user_id=user.id)\
+                                 .options(*Campaign.load_options(fields)).first()
         if not campaign:
             return jsonify({'error': 'Campaña no encontrada'}), 404
         
-        return jsonify({
-            'campaign': campaign.to_dict()
-        }), 200
+        return with_etag(jsonify({
+            'campaign': campaign.to_dict(fields)
+        }), etag), 200
         
     except Exception as e:
         return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
@@ -216,7 +202,7 @@ def delete_campaign(campaign_id):
 def send_campaign(campaign_id):
     """Enviar una campaña inmediatamente"""
     try:
-        user = require_auth()
+        user = require_user()
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
@@ -390,7 +376,7 @@ def delete_campaign_media(campaign_id, media_id):
 def generate_message_with_ai(campaign_id):
     """Generar mensaje de campaña usando IA (Gemini)"""
     try:
-        user = require_auth()
+        user = require_user()
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
@@ -438,27 +424,19 @@ def get_campaigns_stats():
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
-        total_campaigns = Campaign.query.filter_by(user_id=user.id).count()
-        draft_campaigns = Campaign.query.filter_by(user_id=user.id, status='draft').count()
-        active_campaigns = Campaign.query.filter_by(user_id=user.id, status='active').count()
-        completed_campaigns = Campaign.query.filter_by(user_id=user.id, status='completed').count()
-        
-        # Estadísticas de envío
-        total_sent = db.session.query(db.func.sum(Campaign.sent_count))\
-                              .filter_by(user_id=user.id).scalar() or 0
-        total_opened = db.session.query(db.func.sum(Campaign.opened_count))\
-                                .filter_by(user_id=user.id).scalar() or 0
+        # Recuentos por estado y totales de envío en una sola consulta
+        stats = StatsQuery(Campaign, Campaign.user_id == user.id)\
+            .count('total_campaigns')\
+            .count('draft_campaigns', Campaign.status == 'draft')\
+            .count('active_campaigns', Campaign.status == 'active')\
+            .count('completed_campaigns', Campaign.status == 'completed')\
+            .sum('total_sent', Campaign.sent_count)\
+            .sum('total_opened', Campaign.opened_count)\
+            .run()
+        stats['open_rate'] = percentage(stats['total_opened'], stats['total_sent'])
         
         return jsonify({
-            'stats': {
-                'total_campaigns': total_campaigns,
-                'draft_campaigns': draft_campaigns,
-                'active_campaigns': active_campaigns,
-                'completed_campaigns': completed_campaigns,
-                'total_sent': total_sent,
-                'total_opened': total_opened,
-                'open_rate': round((total_opened / total_sent * 100) if total_sent > 0 else 0, 2)
-            }
+            'stats': stats
         }), 200
         
     except Exception as e:
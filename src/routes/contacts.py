@@ -1,27 +1,26 @@
 from flask import Blueprint, request, jsonify, session
-from src.models.user import db, User, Contact, ImportedFile
+from src.models.user import db, User, Contact, ImportedFile, Tag, contact_tags, normalize_tags, touch_user_data
+from src.utils.auth import require_auth
+from src.utils.fields import requested_fields
+from src.utils.pagination import CursorError, paginate
+from src.utils.search import apply_contact_search
+from src.utils.counters import subtract_contact_counters
+from src.utils.import_jobs import drive_export_url, enqueue, job_progress, sheets_export_url
+from src.utils.importers import excel_sheet_names
+from src.utils.rollups import subtract_contacts
+from src.utils.stats import StatsQuery
+from src.utils.http_cache import user_etag, etag_matches, not_modified, with_etag
 from datetime import datetime
 import json
-import csv
-import io
-import openpyxl
+from sqlalchemy.exc import IntegrityError
 from werkzeug.utils import secure_filename
 import os
 
 contacts_bp = Blueprint('contacts', __name__)
 
-def require_auth():
-    """Middleware para verificar autenticación"""
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    
-    user = User.query.get(user_id)
-    if not user:
-        session.clear()
-        return None
-    
-    return user
+def phone_conflict(error):
+    """True si el IntegrityError viene del índice único (user_id, phone_e164)"""
+    return 'phone_e164' in str(error.orig)
 
 @contacts_bp.route('/', methods=['GET'])
 def get_contacts():
@@ -32,53 +31,37 @@ def get_contacts():
             return jsonify({'error': 'No autorizado'}), 401
         
         # Parámetros de consulta
-        page = request.args.get('page', 1, type=int)
-        per_page = min(request.args.get('per_page', 20, type=int), 100)
         search = request.args.get('search', '').strip()
         status = request.args.get('status', '').strip()
-        tags = request.args.get('tags', '').strip()
+        tag_names = normalize_tags(request.args.get('tags', ''))
+        match_all_tags = request.args.get('tags_mode', 'any').strip().lower() == 'all'
+        fields = requested_fields()
         
         # Construir consulta
-        query = Contact.query.filter_by(user_id=user.id)
+        query = Contact.query.filter_by(user_id=user.id).options(*Contact.load_options(fields))
         
-        # Filtrar por búsqueda
+        # Búsqueda con índice de texto (FTS5 / trigramas) y orden por relevancia
+        rank_order = None
         if search:
-            query = query.filter(
-                db.or_(
-                    Contact.name.ilike(f'%{search}%'),
-                    Contact.phone.ilike(f'%{search}%'),
-                    Contact.email.ilike(f'%{search}%')
-                )
-            )
+            query, rank_order = apply_contact_search(query, search, user.id)
         
         # Filtrar por estado
         if status:
             query = query.filter_by(status=status)
         
-        # Filtrar por etiquetas
-        if tags:
-            query = query.filter(Contact.tags.ilike(f'%{tags}%'))
+        # Filtrar por etiquetas (?tags=vip,cliente; tags_mode=all exige todas)
+        if tag_names:
+            query = query.filter(Contact.id.in_(Tag.contact_ids(user.id, tag_names, match_all=match_all_tags)))
         
-        # Ordenar por fecha de creación (más recientes primero)
-        query = query.order_by(Contact.created_at.desc())
-        
-        # Paginación
-        contacts = query.paginate(
-            page=page, 
-            per_page=per_page, 
-            error_out=False
-        )
+        # Paginación por cursor (keyset) o por página, de más recientes a más antiguos
+        try:
+            contacts, pagination = paginate(query, Contact, user.id, scope='contacts', rank_order=rank_order)
+        except CursorError as e:
+            return jsonify({'error': str(e)}), 400
         
         return jsonify({
-            'contacts': [contact.to_dict() for contact in contacts.items],
-            'pagination': {
-                'page': page,
-                'per_page': per_page,
-                'total': contacts.total,
-                'pages': contacts.pages,
-                'has_next': contacts.has_next,
-                'has_prev': contacts.has_prev
-            }
+            'contacts': [contact.to_dict(fields) for contact in contacts],
+            'pagination': pagination
         }), 200
         
     except Exception as e:
@@ -100,11 +83,9 @@ def create_contact():
         if not data.get('name') or not data.get('phone'):
             return jsonify({'error': 'Nombre y teléfono son requeridos'}), 400
         
-        # Verificar si ya existe un contacto con el mismo teléfono
-        existing_contact = Contact.query.filter_by(
-            user_id=user.id, 
-            phone=data['phone'].strip()
-        ).first()
+        # Verificar si ya existe un contacto con el mismo teléfono (en cualquier formato)
+        region = User.phone_region(user.id)
+        existing_contact = Contact.find_by_phone(user.id, data['phone'], region)
         
         if existing_contact:
             return jsonify({'error': 'Ya existe un contacto con este teléfono'}), 409
@@ -113,15 +94,22 @@ def create_contact():
         contact = Contact(
             user_id=user.id,
             name=data['name'].strip(),
-            phone=data['phone'].strip(),
             email=data.get('email', '').strip() or None,
-            tags=json.dumps(data.get('tags', [])) if data.get('tags') else None,
             notes=data.get('notes', '').strip() or None,
             status=data.get('status', 'activo')
         )
+        contact.set_phone(data['phone'], region)
+        contact.set_tags(data.get('tags'))
         
         db.session.add(contact)
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            if not phone_conflict(e):
+                raise
+            # Otra petición creó el mismo teléfono entre la búsqueda y el INSERT
+            db.session.rollback()
+            return jsonify({'error': 'Ya existe un contacto con este teléfono'}), 409
         
         return jsonify({
             'message': 'Contacto creado exitosamente',
@@ -140,12 +128,14 @@ def get_contact(contact_id):
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
-        contact = Contact.query.filter_by(id=contact_id, user_id=user.id).first()
+        fields = requested_fields()
+        contact = Contact.query.filter_by(id=contact_id, user_id=user.id)\
+                               .options(*Contact.load_options(fields)).first()
         if not contact:
             return jsonify({'error': 'Contacto no encontrado'}), 404
         
         return jsonify({
-            'contact': contact.to_dict()
+            'contact': contact.to_dict(fields)
         }), 200
         
     except Exception as e:
@@ -172,26 +162,31 @@ def update_contact(contact_id):
             contact.name = data['name'].strip()
         if 'phone' in data:
             # Verificar si el nuevo teléfono ya existe en otro contacto
+            region = User.phone_region(user.id)
             if data['phone'].strip() != contact.phone:
-                existing_contact = Contact.query.filter_by(
-                    user_id=user.id, 
-                    phone=data['phone'].strip()
-                ).first()
-                if existing_contact:
+                existing_contact = Contact.find_by_phone(user.id, data['phone'], region)
+                if existing_contact and existing_contact.id != contact.id:
                     return jsonify({'error': 'Ya existe un contacto con este teléfono'}), 409
-            contact.phone = data['phone'].strip()
+            contact.set_phone(data['phone'], region)
         
         if 'email' in data:
             contact.email = data['email'].strip() or None
         if 'tags' in data:
-            contact.tags = json.dumps(data['tags']) if data['tags'] else None
+            contact.set_tags(data['tags'])
         if 'notes' in data:
             contact.notes = data['notes'].strip() or None
         if 'status' in data:
             contact.status = data['status']
         
         contact.updated_at = datetime.utcnow()
-        db.session.commit()
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            if not phone_conflict(e):
+                raise
+            # Otra petición guardó el mismo teléfono entre la búsqueda y el UPDATE
+            db.session.rollback()
+            return jsonify({'error': 'Ya existe un contacto con este teléfono'}), 409
         
         return jsonify({
             'message': 'Contacto actualizado exitosamente',
@@ -241,12 +236,17 @@ def bulk_delete_contacts():
         if not isinstance(contact_ids, list):
             return jsonify({'error': 'contact_ids debe ser una lista'}), 400
         
-        # Eliminar contactos
+        # Eliminar contactos (y sus etiquetas: el borrado masivo no pasa por el ORM)
+        owned_ids = db.select(Contact.id).where(Contact.id.in_(contact_ids), Contact.user_id == user.id)
+        db.session.execute(contact_tags.delete().where(contact_tags.c.contact_id.in_(owned_ids)))
+        subtract_contacts(user.id, owned_ids)
+        subtract_contact_counters(user.id, owned_ids)
         deleted_count = Contact.query.filter(
             Contact.id.in_(contact_ids),
             Contact.user_id == user.id
         ).delete(synchronize_session=False)
         
+        touch_user_data(user.id)
         db.session.commit()
         
         return jsonify({
@@ -260,7 +260,7 @@ def bulk_delete_contacts():
 
 @contacts_bp.route('/import/csv', methods=['POST'])
 def import_csv():
-    """Importar contactos desde archivo CSV"""
+    """Importar contactos desde archivo CSV (en segundo plano)"""
     try:
         user = require_auth()
         if not user:
@@ -276,68 +276,14 @@ def import_csv():
         if not file.filename.lower().endswith('.csv'):
             return jsonify({'error': 'Solo se permiten archivos CSV'}), 400
         
-        # Leer archivo CSV
-        stream = io.StringIO(file.stream.read().decode("UTF8"), newline=None)
-        csv_input = csv.DictReader(stream)
-        
-        imported_count = 0
-        errors = []
-        
-        for row_num, row in enumerate(csv_input, start=2):
-            try:
-                name = row.get('name', '').strip()
-                phone = row.get('phone', '').strip()
-                email = row.get('email', '').strip()
-                tags = row.get('tags', '').strip()
-                
-                if not name or not phone:
-                    errors.append(f'Fila {row_num}: Nombre y teléfono son requeridos')
-                    continue
-                
-                # Verificar si ya existe
-                existing_contact = Contact.query.filter_by(
-                    user_id=user.id, 
-                    phone=phone
-                ).first()
-                
-                if existing_contact:
-                    errors.append(f'Fila {row_num}: Ya existe contacto con teléfono {phone}')
-                    continue
-                
-                # Crear contacto
-                contact = Contact(
-                    user_id=user.id,
-                    name=name,
-                    phone=phone,
-                    email=email or None,
-                    tags=json.dumps(tags.split(',')) if tags else None
-                )
-                
-                db.session.add(contact)
-                imported_count += 1
-                
-            except Exception as e:
-                errors.append(f'Fila {row_num}: {str(e)}')
-        
-        # Registrar importación
-        imported_file = ImportedFile(
-            user_id=user.id,
-            filename=secure_filename(file.filename),
-            file_type='csv',
-            contacts_imported=imported_count,
-            status='completed' if imported_count > 0 else 'failed',
-            error_message='; '.join(errors) if errors else None,
-            completed_at=datetime.utcnow()
-        )
-        
-        db.session.add(imported_file)
-        db.session.commit()
+        # El worker lee el archivo en streaming y confirma cada lote por separado
+        job = enqueue(user.id, secure_filename(file.filename), 'csv', upload=file.stream)
         
         return jsonify({
-            'message': f'Importación completada: {imported_count} contactos importados',
-            'imported_count': imported_count,
-            'errors': errors
-        }), 200
+            'message': 'Importación de CSV iniciada',
+            'import_id': job.id,
+            'status': job.status
+        }), 202
         
     except Exception as e:
         db.session.rollback()
@@ -345,7 +291,7 @@ def import_csv():
 
 @contacts_bp.route('/import/excel', methods=['POST'])
 def import_excel():
-    """Importar contactos desde archivo Excel"""
+    """Importar contactos desde archivo Excel (en segundo plano)"""
     try:
         user = require_auth()
         if not user:
@@ -361,73 +307,24 @@ def import_excel():
         if not file.filename.lower().endswith(('.xlsx', '.xls')):
             return jsonify({'error': 'Solo se permiten archivos Excel (.xlsx, .xls)'}), 400
         
-        # Leer archivo Excel
-        workbook = openpyxl.load_workbook(file)
-        sheet = workbook.active
-        
-        imported_count = 0
-        errors = []
-        
-        # Obtener headers de la primera fila
-        headers = [cell.value for cell in sheet[1]]
-        
-        for row_num, row in enumerate(sheet.iter_rows(min_row=2, values_only=True), start=2):
-            try:
-                row_dict = dict(zip(headers, row))
-                
-                name = str(row_dict.get('name', '') or row_dict.get('nombre', '')).strip()
-                phone = str(row_dict.get('phone', '') or row_dict.get('telefono', '')).strip()
-                email = str(row_dict.get('email', '') or row_dict.get('correo', '')).strip()
-                tags = str(row_dict.get('tags', '') or row_dict.get('etiquetas', '')).strip()
-                
-                if not name or not phone:
-                    errors.append(f'Fila {row_num}: Nombre y teléfono son requeridos')
-                    continue
-                
-                # Verificar si ya existe
-                existing_contact = Contact.query.filter_by(
-                    user_id=user.id, 
-                    phone=phone
-                ).first()
-                
-                if existing_contact:
-                    errors.append(f'Fila {row_num}: Ya existe contacto con teléfono {phone}')
-                    continue
-                
-                # Crear contacto
-                contact = Contact(
-                    user_id=user.id,
-                    name=name,
-                    phone=phone,
-                    email=email or None,
-                    tags=json.dumps(tags.split(',')) if tags else None
-                )
-                
-                db.session.add(contact)
-                imported_count += 1
-                
-            except Exception as e:
-                errors.append(f'Fila {row_num}: {str(e)}')
-        
-        # Registrar importación
-        imported_file = ImportedFile(
-            user_id=user.id,
-            filename=secure_filename(file.filename),
-            file_type='excel',
-            contacts_imported=imported_count,
-            status='completed' if imported_count > 0 else 'failed',
-            error_message='; '.join(errors) if errors else None,
-            completed_at=datetime.utcnow()
-        )
+        # Hoja a importar (por defecto la activa); se comprueba antes de encolar
+        sheet = request.form.get('sheet', '').strip() or None
+        try:
+            sheet_names = excel_sheet_names(file.stream)
+        except Exception:
+            return jsonify({'error': 'El archivo no es un Excel (.xlsx) válido'}), 400
+        if sheet and sheet not in sheet_names:
+            return jsonify({'error': f"La hoja '{sheet}' no existe", 'sheets': sheet_names}), 400
         
-        db.session.add(imported_file)
-        db.session.commit()
+        file.stream.seek(0)
+        job = enqueue(user.id, secure_filename(file.filename), 'excel', upload=file.stream,
+                      options={'sheet': sheet} if sheet else None)
         
         return jsonify({
-            'message': f'Importación completada: {imported_count} contactos importados',
-            'imported_count': imported_count,
-            'errors': errors
-        }), 200
+            'message': 'Importación de Excel iniciada',
+            'import_id': job.id,
+            'status': job.status
+        }), 202
         
     except Exception as e:
         db.session.rollback()
@@ -435,7 +332,7 @@ def import_excel():
 
 @contacts_bp.route('/import/sheets', methods=['POST'])
 def import_google_sheets():
-    """Importar contactos desde Google Sheets"""
+    """Importar contactos desde Google Sheets (hoja compartida con enlace)"""
     try:
         user = require_auth()
         if not user:
@@ -445,25 +342,16 @@ def import_google_sheets():
         if not data or not data.get('sheet_url'):
             return jsonify({'error': 'URL de Google Sheets requerida'}), 400
         
-        # Registrar intento de importación
-        imported_file = ImportedFile(
-            user_id=user.id,
-            filename='Google Sheets Import',
-            file_type='google_sheets',
-            file_url=data['sheet_url'],
-            status='processing'
-        )
-        
-        db.session.add(imported_file)
-        db.session.commit()
+        if not sheets_export_url(data['sheet_url']):
+            return jsonify({'error': 'URL de Google Sheets no válida'}), 400
         
-        # TODO: Implementar integración real con Google Sheets API
-        # Por ahora, simular la importación
+        # El worker descarga la hoja exportada como CSV
+        job = enqueue(user.id, 'Google Sheets Import', 'google_sheets', file_url=data['sheet_url'])
         
         return jsonify({
             'message': 'Importación de Google Sheets iniciada',
-            'import_id': imported_file.id,
-            'status': 'processing'
+            'import_id': job.id,
+            'status': job.status
         }), 202
         
     except Exception as e:
@@ -472,7 +360,7 @@ def import_google_sheets():
 
 @contacts_bp.route('/import/drive', methods=['POST'])
 def import_google_drive():
-    """Importar contactos desde Google Drive"""
+    """Importar contactos desde Google Drive (archivo CSV o Excel compartido con enlace)"""
     try:
         user = require_auth()
         if not user:
@@ -482,31 +370,47 @@ def import_google_drive():
         if not data or not data.get('file_id'):
             return jsonify({'error': 'ID de archivo de Google Drive requerido'}), 400
         
-        # Registrar intento de importación
-        imported_file = ImportedFile(
-            user_id=user.id,
-            filename='Google Drive Import',
-            file_type='google_drive',
-            file_url=f"https://drive.google.com/file/d/{data['file_id']}",
-            status='processing'
-        )
-        
-        db.session.add(imported_file)
-        db.session.commit()
+        if not drive_export_url(data['file_id']):
+            return jsonify({'error': 'ID de archivo de Google Drive no válido'}), 400
         
-        # TODO: Implementar integración real con Google Drive API
-        # Por ahora, simular la importación
+        # La hoja solo se aplica si el archivo resulta ser un Excel
+        sheet = str(data.get('sheet') or '').strip() or None
+        job = enqueue(user.id, 'Google Drive Import', 'google_drive',
+                      file_url=f"https://drive.google.com/file/d/{data['file_id']}",
+                      options={'sheet': sheet} if sheet else None)
         
         return jsonify({
             'message': 'Importación de Google Drive iniciada',
-            'import_id': imported_file.id,
-            'status': 'processing'
+            'import_id': job.id,
+            'status': job.status
         }), 202
         
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
 
+@contacts_bp.route('/import/<int:import_id>', methods=['GET'])
+def get_import_status(import_id):
+    """Obtener estado y progreso de una importación"""
+    try:
+        user = require_auth()
+        if not user:
+            return jsonify({'error': 'No autorizado'}), 401
+        
+        job = ImportedFile.query.filter_by(id=import_id, user_id=user.id)\
+                                .options(*ImportedFile.load_options())\
+                                .first()
+        if not job:
+            return jsonify({'error': 'Importación no encontrada'}), 404
+        
+        return jsonify({
+            'import': job.to_dict(),
+            'progress': job_progress(job)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+
 @contacts_bp.route('/import/history', methods=['GET'])
 def get_import_history():
     """Obtener historial de importaciones"""
@@ -516,6 +420,7 @@ def get_import_history():
             return jsonify({'error': 'No autorizado'}), 401
         
         imports = ImportedFile.query.filter_by(user_id=user.id)\
+                                   .options(*ImportedFile.load_options())\
                                    .order_by(ImportedFile.created_at.desc())\
                                    .limit(20).all()
         
@@ -526,6 +431,34 @@ def get_import_history():
     except Exception as e:
         return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
 
+@contacts_bp.route('/tags', methods=['GET'])
+def get_tag_facets():
+    """Obtener las etiquetas del usuario con el número de contactos de cada una"""
+    try:
+        user = require_auth()
+        if not user:
+            return jsonify({'error': 'No autorizado'}), 401
+        
+        etag = user_etag(user.id, 'contact-tags')
+        if etag_matches(etag):
+            return not_modified(etag)
+        
+        # Una sola consulta agrupada sobre contact_tags
+        contact_count = db.func.count(contact_tags.c.contact_id)
+        rows = db.session.query(Tag.name, contact_count)\
+            .join(contact_tags, contact_tags.c.tag_id == Tag.id)\
+            .filter(Tag.user_id == user.id)\
+            .group_by(Tag.id, Tag.name)\
+            .order_by(contact_count.desc(), Tag.name)\
+            .all()
+        
+        return with_etag(jsonify({
+            'tags': [{'name': name, 'count': count} for name, count in rows]
+        }), etag), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
+
 @contacts_bp.route('/stats', methods=['GET'])
 def get_contacts_stats():
     """Obtener estadísticas de contactos"""
@@ -534,25 +467,19 @@ def get_contacts_stats():
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
-        total_contacts = Contact.query.filter_by(user_id=user.id).count()
-        active_contacts = Contact.query.filter_by(user_id=user.id, status='activo').count()
-        inactive_contacts = Contact.query.filter_by(user_id=user.id, status='inactivo').count()
-        
         # Contactos agregados en los últimos 30 días
         from datetime import timedelta
         thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        recent_contacts = Contact.query.filter(
-            Contact.user_id == user.id,
-            Contact.created_at >= thirty_days_ago
-        ).count()
+        
+        stats = StatsQuery(Contact, Contact.user_id == user.id)\
+            .count('total_contacts')\
+            .count('active_contacts', Contact.status == 'activo')\
+            .count('inactive_contacts', Contact.status == 'inactivo')\
+            .count('recent_contacts', Contact.created_at >= thirty_days_ago)\
+            .run()
         
         return jsonify({
-            'stats': {
-                'total_contacts': total_contacts,
-                'active_contacts': active_contacts,
-                'inactive_contacts': inactive_contacts,
-                'recent_contacts': recent_contacts
-            }
+            'stats': stats
         }), 200
         
     except Exception as e:
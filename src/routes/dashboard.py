@@ -1,111 +1,100 @@
 from flask import Blueprint, request, jsonify, session
-from src.models.user import db, User, Contact, Campaign, BotActivity
-from datetime import datetime, timedelta
+from src.models.user import db, User, Contact, Campaign, BotActivity, DailyBotActivity, DailyUserStats
+from src.utils.auth import require_auth, require_user
+from src.utils.http_cache import user_etag, etag_matches, not_modified, with_etag
+from src.utils.replica import route_reads_to_replica
+from src.utils.rollups import local_today, window_start
+from src.utils.stats import StatsQuery, percentage
+from src.utils.timeseries import GRANULARITIES, time_series
 from sqlalchemy import func
 
 dashboard_bp = Blueprint('dashboard', __name__)
-
-def require_auth():
-    """Middleware para verificar autenticación"""
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    
-    user = User.query.get(user_id)
-    if not user:
-        session.clear()
-        return None
-    
-    return user
+# Solo lectura: las consultas de agregación van a la réplica si está configurada
+dashboard_bp.before_request(route_reads_to_replica)
 
 @dashboard_bp.route('/stats', methods=['GET'])
 def get_dashboard_stats():
     """Obtener estadísticas principales para el dashboard"""
     try:
-        user = require_auth()
+        principal = require_auth()
+        if not principal:
+            return jsonify({'error': 'No autorizado'}), 401
+        
+        # Responder 304 antes de lanzar las consultas de agregación
+        # (la fecha entra en la clave porque las ventanas de 7/30 días avanzan solas)
+        today = local_today(principal.id)
+        etag = user_etag(principal.id, f'dashboard-stats-{today}')
+        if etag_matches(etag):
+            return not_modified(etag)
+        
+        user = require_user()
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
-        # Estadísticas básicas
-        total_contacts = Contact.query.filter_by(user_id=user.id).count()
-        total_campaigns = Campaign.query.filter_by(user_id=user.id).count()
-        active_campaigns = Campaign.query.filter_by(user_id=user.id, status='active').count()
-        
-        # Mensajes enviados (suma de sent_count de todas las campañas)
-        total_messages_sent = db.session.query(func.sum(Campaign.sent_count))\
-                                       .filter_by(user_id=user.id).scalar() or 0
-        
-        # Actividad del bot en los últimos 30 días
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        bot_activities = BotActivity.query.filter(
-            BotActivity.user_id == user.id,
-            BotActivity.created_at >= thirty_days_ago
-        ).count()
-        
-        # Contactos agregados en los últimos 7 días
-        seven_days_ago = datetime.utcnow() - timedelta(days=7)
-        new_contacts = Contact.query.filter(
-            Contact.user_id == user.id,
-            Contact.created_at >= seven_days_ago
-        ).count()
-        
-        # Campañas completadas en los últimos 30 días
-        completed_campaigns = Campaign.query.filter(
-            Campaign.user_id == user.id,
-            Campaign.status == 'completed',
-            Campaign.sent_at >= thirty_days_ago
-        ).count()
+        # Totales desde los contadores del usuario (ya cargado); ventanas desde los agregados diarios
+        daily = StatsQuery(DailyUserStats, DailyUserStats.user_id == user.id)\
+            .sum('new_contacts', DailyUserStats.contacts_new, DailyUserStats.day >= window_start(today, 7))\
+            .sum('completed_campaigns', DailyUserStats.campaigns_completed, DailyUserStats.day >= window_start(today, 30))\
+            .run()
+        bot_activities = StatsQuery(
+            DailyBotActivity, DailyBotActivity.user_id == user.id, DailyBotActivity.day >= window_start(today, 30)
+        ).sum('total', DailyBotActivity.total).run()['total']
         
-        return jsonify({
+        return with_etag(jsonify({
             'stats': {
-                'total_contacts': total_contacts,
-                'total_campaigns': total_campaigns,
-                'active_campaigns': active_campaigns,
-                'total_messages_sent': total_messages_sent,
+                'total_contacts': user.contacts_total,
+                'total_campaigns': user.campaigns_total,
+                'active_campaigns': user.campaigns_active,
+                'total_messages_sent': user.messages_sent_total,
                 'bot_activities': bot_activities,
-                'new_contacts': new_contacts,
-                'completed_campaigns': completed_campaigns,
+                'new_contacts': daily['new_contacts'],
+                'completed_campaigns': daily['completed_campaigns'],
                 'automation_enabled': user.gemini_auto_reply_enabled
             }
-        }), 200
+        }), etag), 200
         
     except Exception as e:
         return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
 
+def _chart_range(default_granularity):
+    """Granularidad y número de periodos pedidos para un gráfico (None si no son válidos)"""
+    granularity = request.args.get('granularity', default_granularity)
+    if granularity not in GRANULARITIES:
+        return None, None
+    return granularity, request.args.get('periods', type=int)
+
 @dashboard_bp.route('/charts/contacts', methods=['GET'])
 def get_contacts_chart_data():
-    """Obtener datos para gráfico de contactos por mes"""
+    """Obtener datos para gráfico de contactos por periodo (mes por defecto)"""
     try:
         user = require_auth()
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
-        # Obtener contactos de los últimos 12 meses agrupados por mes
-        twelve_months_ago = datetime.utcnow() - timedelta(days=365)
-        
-        contacts_by_month = db.session.query(
-            func.strftime('%Y-%m', Contact.created_at).label('month'),
-            func.count(Contact.id).label('count')
-        ).filter(
-            Contact.user_id == user.id,
-            Contact.created_at >= twelve_months_ago
-        ).group_by(
-            func.strftime('%Y-%m', Contact.created_at)
-        ).order_by('month').all()
-        
-        # Formatear datos para el gráfico
-        chart_data = []
-        for month, count in contacts_by_month:
-            try:
-                month_date = datetime.strptime(month, '%Y-%m')
-                chart_data.append({
-                    'month': month_date.strftime('%b %Y'),
-                    'contacts': count
-                })
-            except:
-                continue
+        granularity, periods = _chart_range('month')
+        if not granularity:
+            return jsonify({'error': f"granularity debe ser uno de: {', '.join(GRANULARITIES)}"}), 400
+        
+        # Contactos por periodo en la zona horaria del usuario, con los periodos vacíos a 0
+        if granularity == 'hour':
+            points = time_series(
+                Contact.created_at, func.count(Contact.id), [Contact.user_id == user.id],
+                user.id, granularity, periods
+            )
+        else:
+            points = time_series(
+                DailyUserStats.day, func.sum(DailyUserStats.contacts_new), [DailyUserStats.user_id == user.id],
+                user.id, granularity, periods, local=True
+            )
+        
+        chart_data = [{
+            'month': bucket.strftime('%b %Y'),
+            'bucket': bucket.isoformat(),
+            'contacts': count
+        } for bucket, count in points]
         
         return jsonify({
+            'granularity': granularity,
             'chart_data': chart_data
         }), 200
         
@@ -151,36 +140,36 @@ def get_campaigns_chart_data():
 
 @dashboard_bp.route('/charts/messages', methods=['GET'])
 def get_messages_chart_data():
-    """Obtener datos para gráfico de mensajes enviados por día"""
+    """Obtener datos para gráfico de mensajes enviados por periodo (día por defecto)"""
     try:
         user = require_auth()
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
-        # Obtener mensajes de los últimos 30 días
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
-        
-        messages_by_day = db.session.query(
-            func.date(Campaign.sent_at).label('date'),
-            func.sum(Campaign.sent_count).label('messages')
-        ).filter(
-            Campaign.user_id == user.id,
-            Campaign.sent_at >= thirty_days_ago,
-            Campaign.sent_count > 0
-        ).group_by(
-            func.date(Campaign.sent_at)
-        ).order_by('date').all()
-        
-        # Formatear datos para el gráfico
-        chart_data = []
-        for date, messages in messages_by_day:
-            if date:
-                chart_data.append({
-                    'date': date.strftime('%Y-%m-%d'),
-                    'messages': messages or 0
-                })
+        granularity, periods = _chart_range('day')
+        if not granularity:
+            return jsonify({'error': f"granularity debe ser uno de: {', '.join(GRANULARITIES)}"}), 400
+        
+        if granularity == 'hour':
+            points = time_series(
+                Campaign.sent_at, func.sum(Campaign.sent_count),
+                [Campaign.user_id == user.id, Campaign.sent_count > 0],
+                user.id, granularity, periods
+            )
+        else:
+            points = time_series(
+                DailyUserStats.day, func.sum(DailyUserStats.messages_sent), [DailyUserStats.user_id == user.id],
+                user.id, granularity, periods, local=True
+            )
+        
+        chart_data = [{
+            'date': bucket.strftime('%Y-%m-%d'),
+            'bucket': bucket.isoformat(),
+            'messages': messages or 0
+        } for bucket, messages in points]
         
         return jsonify({
+            'granularity': granularity,
             'chart_data': chart_data
         }), 200
         
@@ -197,16 +186,19 @@ def get_recent_activity():
         
         # Actividad reciente del bot (últimas 10)
         recent_bot_activities = BotActivity.query.filter_by(user_id=user.id)\
+                                                 .options(*BotActivity.load_options())\
                                                  .order_by(BotActivity.created_at.desc())\
                                                  .limit(10).all()
         
         # Contactos recientes (últimos 5)
         recent_contacts = Contact.query.filter_by(user_id=user.id)\
+                                      .options(*Contact.load_options())\
                                       .order_by(Contact.created_at.desc())\
                                       .limit(5).all()
         
         # Campañas recientes (últimas 5)
         recent_campaigns = Campaign.query.filter_by(user_id=user.id)\
+                                        .options(*Campaign.load_options())\
                                         .order_by(Campaign.created_at.desc())\
                                         .limit(5).all()
         
@@ -229,48 +221,36 @@ def get_performance_metrics():
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
-        # Métricas de los últimos 30 días
-        thirty_days_ago = datetime.utcnow() - timedelta(days=30)
+        # Métricas de los últimos 30 días (y los 30 anteriores) desde los agregados diarios
+        today = local_today(user.id)
+        this_month = DailyUserStats.day >= window_start(today, 30)
+        daily = StatsQuery(
+            DailyUserStats, DailyUserStats.user_id == user.id, DailyUserStats.day >= window_start(today, 60)
+        ).sum('total_sent', DailyUserStats.messages_sent, this_month)\
+            .sum('total_opened', DailyUserStats.messages_opened, this_month)\
+            .sum('contacts_this_month', DailyUserStats.contacts_new, this_month)\
+            .sum('contacts_last_month', DailyUserStats.contacts_new, ~this_month)\
+            .run()
+        bot = StatsQuery(
+            DailyBotActivity, DailyBotActivity.user_id == user.id, DailyBotActivity.day >= window_start(today, 30)
+        ).sum('total', DailyBotActivity.total)\
+            .sum('successful', DailyBotActivity.total, DailyBotActivity.status == 'success')\
+            .run()
         
         # Tasa de apertura promedio
-        campaigns_with_stats = Campaign.query.filter(
-            Campaign.user_id == user.id,
-            Campaign.sent_count > 0,
-            Campaign.sent_at >= thirty_days_ago
-        ).all()
-        
-        total_sent = sum(c.sent_count for c in campaigns_with_stats)
-        total_opened = sum(c.opened_count for c in campaigns_with_stats)
-        open_rate = round((total_opened / total_sent * 100) if total_sent > 0 else 0, 2)
+        total_sent = daily['total_sent']
+        total_opened = daily['total_opened']
+        open_rate = percentage(total_opened, total_sent)
         
         # Actividad del bot
-        successful_bot_activities = BotActivity.query.filter(
-            BotActivity.user_id == user.id,
-            BotActivity.status == 'success',
-            BotActivity.created_at >= thirty_days_ago
-        ).count()
-        
-        total_bot_activities = BotActivity.query.filter(
-            BotActivity.user_id == user.id,
-            BotActivity.created_at >= thirty_days_ago
-        ).count()
-        
-        bot_success_rate = round((successful_bot_activities / total_bot_activities * 100) if total_bot_activities > 0 else 0, 2)
+        total_bot_activities = bot['total']
+        bot_success_rate = percentage(bot['successful'], total_bot_activities)
         
         # Crecimiento de contactos
-        contacts_this_month = Contact.query.filter(
-            Contact.user_id == user.id,
-            Contact.created_at >= thirty_days_ago
-        ).count()
+        contacts_this_month = daily['contacts_this_month']
+        contacts_last_month = daily['contacts_last_month']
         
-        sixty_days_ago = datetime.utcnow() - timedelta(days=60)
-        contacts_last_month = Contact.query.filter(
-            Contact.user_id == user.id,
-            Contact.created_at >= sixty_days_ago,
-            Contact.created_at < thirty_days_ago
-        ).count()
-        
-        contact_growth = round(((contacts_this_month - contacts_last_month) / contacts_last_month * 100) if contacts_last_month > 0 else 0, 2)
+        contact_growth = percentage(contacts_this_month - contacts_last_month, contacts_last_month)
         
         return jsonify({
             'performance': {
@@ -291,7 +271,7 @@ def get_performance_metrics():
 def get_quick_actions():
     """Obtener acciones rápidas sugeridas para el usuario"""
     try:
-        user = require_auth()
+        user = require_user()
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
@@ -316,9 +296,8 @@ def get_quick_actions():
                 'priority': 'medium'
             })
         
-        # Verificar si hay contactos
-        total_contacts = Contact.query.filter_by(user_id=user.id).count()
-        if total_contacts == 0:
+        # Verificar si hay contactos (contadores del usuario, sin consultas)
+        if user.contacts_total == 0:
             suggestions.append({
                 'type': 'action',
                 'title': 'Agregar Contactos',
@@ -328,7 +307,7 @@ def get_quick_actions():
             })
         
         # Verificar campañas en borrador
-        draft_campaigns = Campaign.query.filter_by(user_id=user.id, status='draft').count()
+        draft_campaigns = user.campaigns_draft
         if draft_campaigns > 0:
             suggestions.append({
                 'type': 'action',
@@ -1,33 +1,35 @@
 from flask import Blueprint, request, jsonify, session
 from src.models.user import db, User
+from src.utils.auth import require_auth, require_user, invalidate_auth_cache
+from src.utils.passwords import PasswordHasherBusy
+from src.utils.phones import is_supported_region
+from src.utils.fields import requested_fields
+from src.utils.http_cache import user_etag, etag_matches, not_modified, with_etag
 from datetime import datetime
 
 profile_bp = Blueprint('profile', __name__)
 
-def require_auth():
-    """Middleware para verificar autenticación"""
-    user_id = session.get('user_id')
-    if not user_id:
-        return None
-    
-    user = User.query.get(user_id)
-    if not user:
-        session.clear()
-        return None
-    
-    return user
-
 @profile_bp.route('/', methods=['GET'])
 def get_profile():
     """Obtener perfil completo del usuario"""
     try:
-        user = require_auth()
+        principal = require_auth()
+        if not principal:
+            return jsonify({'error': 'No autorizado'}), 401
+        
+        # Responder 304 antes de cargar el usuario completo
+        etag = user_etag(principal.id, 'profile')
+        if etag_matches(etag):
+            return not_modified(etag)
+        
+        fields = requested_fields()
+        user = require_user(fields)
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
-        return jsonify({
-            'user': user.to_dict()
-        }), 200
+        return with_etag(jsonify({
+            'user': user.to_dict(fields)
+        }), etag), 200
         
     except Exception as e:
         return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
@@ -36,7 +38,7 @@ def get_profile():
 def update_profile():
     """Actualizar perfil del usuario"""
     try:
-        user = require_auth()
+        user = require_user()
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
@@ -87,6 +89,12 @@ def update_profile():
             user.language = data['language']
         if 'timezone' in data:
             user.timezone = data['timezone']
+        if 'default_region' in data:
+            # Solo afecta a los teléfonos que se guarden a partir de ahora
+            region = str(data['default_region'] or '').strip().upper()
+            if not is_supported_region(region):
+                return jsonify({'error': 'Región no válida (código de país ISO, por ejemplo ES)'}), 400
+            user.default_region = region
         if 'theme' in data:
             user.theme = data['theme']
         
@@ -94,6 +102,7 @@ def update_profile():
         user.updated_at = datetime.utcnow()
         
         db.session.commit()
+        invalidate_auth_cache(user.id)
         
         return jsonify({
             'message': 'Perfil actualizado exitosamente',
@@ -108,7 +117,7 @@ def update_profile():
 def change_password():
     """Cambiar contraseña del usuario"""
     try:
-        user = require_auth()
+        user = require_user()
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
@@ -132,11 +141,14 @@ def change_password():
         user.updated_at = datetime.utcnow()
         
         db.session.commit()
+        invalidate_auth_cache(user.id)
         
         return jsonify({
             'message': 'Contraseña actualizada exitosamente'
         }), 200
         
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Servidor ocupado, inténtalo de nuevo en unos segundos'}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
@@ -145,7 +157,7 @@ def change_password():
 def get_api_keys():
     """Obtener estado de las API keys (sin mostrar las keys completas)"""
     try:
-        user = require_auth()
+        user = require_user()
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
@@ -174,7 +186,7 @@ def get_api_keys():
 def delete_account():
     """Eliminar cuenta del usuario"""
     try:
-        user = require_auth()
+        user = require_user()
         if not user:
             return jsonify({'error': 'No autorizado'}), 401
         
@@ -187,8 +199,10 @@ def delete_account():
             return jsonify({'error': 'Contraseña incorrecta'}), 400
         
         # Eliminar usuario (las relaciones se eliminan en cascada)
+        user_id = user.id
         db.session.delete(user)
         db.session.commit()
+        invalidate_auth_cache(user_id)
         
         # Limpiar sesión
         session.clear()
@@ -197,6 +211,8 @@ def delete_account():
             'message': 'Cuenta eliminada exitosamente'
         }), 200
         
+    except PasswordHasherBusy:
+        return jsonify({'error': 'Servidor ocupado, inténtalo de nuevo en unos segundos'}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': f'Error interno del servidor: {str(e)}'}), 500
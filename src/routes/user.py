@@ -196,11 +196,11 @@ def create_contact():
             user_id=session['user_id'],
             name=data['name'],
             email=data.get('email'),
-            phone=data['phone'],
             status=data.get('status', 'activo'),
             tags=json.dumps(data.get('tags', [])),
             notes=data.get('notes')
         )
+        contact.set_phone(data['phone'], User.phone_region(session['user_id']))
         
         db.session.add(contact)
         db.session.commit()
@@ -232,7 +232,7 @@ def update_contact(contact_id):
         if 'email' in data:
             contact.email = data['email']
         if 'phone' in data:
-            contact.phone = data['phone']
+            contact.set_phone(data['phone'], User.phone_region(session['user_id']))
         if 'status' in data:
             contact.status = data['status']
         if 'tags' in data:
@@ -0,0 +1,162 @@
+import os
+import threading
+import time
+
+from flask import g, request, session
+from src.models.user import db, User
+from src.utils.tokens import TokenError, decode_token
+
+# Tiempo de vida (segundos) del principal cacheado en cada worker
+AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', 30))
+AUTH_CACHE_MAX_SIZE = int(os.environ.get('AUTH_CACHE_MAX_SIZE', 10000))
+
+
+class AuthPrincipal:
+    """Identidad mínima del usuario autenticado (sin API keys ni base de conocimiento)"""
+
+    __slots__ = ('id', 'email', 'name')
+
+    def __init__(self, id, email, name):
+        self.id = id
+        self.email = email
+        self.name = name
+
+    def __repr__(self):
+        return f'<AuthPrincipal {self.id} {self.email}>'
+
+
+class PrincipalCache:
+    """Cache TTL por worker de principales autenticados"""
+
+    def __init__(self, ttl, max_size):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, user_id):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry and entry[1] > now:
+                self.hits += 1
+                return entry[0]
+            if entry:
+                del self._entries[user_id]
+            self.misses += 1
+            return None
+
+    def set(self, user_id, principal):
+        with self._lock:
+            if len(self._entries) >= self.max_size:
+                # Descartar la entrada más antigua (orden de inserción)
+                self._entries.pop(next(iter(self._entries)))
+            self._entries[user_id] = (principal, time.monotonic() + self.ttl)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+principal_cache = PrincipalCache(AUTH_CACHE_TTL, AUTH_CACHE_MAX_SIZE)
+
+
+def _load_principal(user_id):
+    """Cargar solo las columnas necesarias para autorizar la petición"""
+    row = db.session.query(User.id, User.email, User.name).filter(User.id == user_id).first()
+    if not row:
+        return None
+    return AuthPrincipal(row.id, row.email, row.name)
+
+
+def _bearer_token():
+    """Extraer el token de la cabecera Authorization: Bearer <token>"""
+    header = request.headers.get('Authorization', '')
+    if header[:7].lower() != 'bearer ':
+        return None
+    return header[7:].strip() or None
+
+
+def _principal_from_token(token):
+    """Construir el principal a partir de los claims firmados (sin consultar la BD)"""
+    try:
+        claims = decode_token(token, 'access')
+    except TokenError:
+        return None
+    g.token_claims = claims
+    return AuthPrincipal(int(claims['sub']), claims.get('email'), claims.get('name'))
+
+
+def require_auth():
+    """Verificar autenticación y devolver el principal cacheado (o None)"""
+    token = _bearer_token()
+    if token:
+        return _principal_from_token(token)
+
+    user_id = session.get('user_id')
+    if not user_id:
+        return None
+
+    principal = principal_cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    principal = _load_principal(user_id)
+    if not principal:
+        session.clear()
+        return None
+
+    principal_cache.set(user_id, principal)
+    return principal
+
+
+def require_user(fields=False):
+    """Verificar autenticación y devolver el usuario completo (o None).
+
+    Con fields (conjunto de campos, o None para todos) se cargan en la misma
+    consulta las columnas diferidas que se van a serializar.
+    """
+    principal = require_auth()
+    if not principal:
+        return None
+
+    options = User.load_options(fields) if fields is not False else None
+    user = db.session.get(User, principal.id, options=options)
+    if not user:
+        invalidate_auth_cache(principal.id)
+        if 'user_id' in session:
+            session.clear()
+        return None
+
+    return user
+
+
+def invalidate_auth_cache(user_id):
+    """Descartar el principal cacheado tras cambios de perfil, contraseña o cuenta"""
+    principal_cache.invalidate(user_id)
+
+
+def auth_cache_stats():
+    """Métricas del cache de autenticación de este worker"""
+    return principal_cache.stats()
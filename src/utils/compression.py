@@ -0,0 +1,228 @@
+import gzip
+import threading
+import zlib
+from collections import OrderedDict
+
+from flask import request
+
+# Codificadores opcionales: se anuncian solo si el paquete está instalado
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json',
+    'application/javascript',
+    'application/xml',
+    'image/svg+xml',
+}
+
+
+def is_compressible_mimetype(mimetype):
+    mimetype = mimetype or ''
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES
+
+
+class _GzipStream:
+    def __init__(self, level):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, chunk):
+        return self._compressor.compress(chunk) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self):
+        return self._compressor.flush(zlib.Z_FINISH)
+
+
+class _BrotliStream:
+    def __init__(self, quality):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, chunk):
+        return self._compressor.process(chunk) + self._compressor.flush()
+
+    def finish(self):
+        return self._compressor.finish()
+
+
+class _ZstdStream:
+    def __init__(self, level):
+        self._compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, chunk):
+        return self._compressor.compress(chunk) + \
+            self._compressor.flush(zstandard.COMPRESSOBJ_FLUSH_BLOCK)
+
+    def finish(self):
+        return self._compressor.flush()
+
+
+class CompressedCache:
+    """LRU acotado por bytes para variantes comprimidas de archivos estáticos"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._entries.get(key)
+            if data is not None:
+                self._entries.move_to_end(key)
+            return data
+
+    def set(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._size -= len(self._entries.pop(key))
+            self._entries[key] = data
+            self._size += len(data)
+            while self._size > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+
+class Compressor:
+    """Compresión de respuestas negociada por Accept-Encoding (br, zstd, gzip)"""
+
+    def __init__(self, min_size, gzip_level, brotli_quality, zstd_level, static_cache_bytes):
+        self.min_size = min_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.zstd_level = zstd_level
+        self.static_cache = CompressedCache(static_cache_bytes)
+
+        # Orden de preferencia del servidor ante pesos iguales del cliente
+        self.encodings = []
+        if brotli is not None:
+            self.encodings.append('br')
+        if zstandard is not None:
+            self.encodings.append('zstd')
+        self.encodings.append('gzip')
+
+    def _negotiate(self):
+        return request.accept_encodings.best_match(self.encodings)
+
+    def _compress(self, data, encoding, static=False):
+        if encoding == 'br':
+            # Los estáticos se comprimen una vez y se cachean: compensa la calidad máxima
+            return brotli.compress(data, quality=11 if static else self.brotli_quality)
+        if encoding == 'zstd':
+            return zstandard.ZstdCompressor(level=19 if static else self.zstd_level).compress(data)
+        return gzip.compress(data, compresslevel=9 if static else self.gzip_level, mtime=0)
+
+    def compress_static(self, data, encoding):
+        """Variante con el nivel máximo, para contenido que se comprime una vez y se guarda"""
+        return self._compress(data, encoding, static=True)
+
+    def _stream(self, encoding):
+        if encoding == 'br':
+            return _BrotliStream(self.brotli_quality)
+        if encoding == 'zstd':
+            return _ZstdStream(self.zstd_level)
+        return _GzipStream(self.gzip_level)
+
+    def _is_compressible(self, response):
+        if response.status_code != 200 or 'Content-Encoding' in response.headers:
+            return False
+        if request.method == 'HEAD':
+            return False
+        return is_compressible_mimetype(response.mimetype)
+
+    def _compress_streamed(self, response, encoding):
+        stream = self._stream(encoding)
+        body = response.response
+
+        def generate():
+            try:
+                for chunk in body:
+                    if isinstance(chunk, str):
+                        chunk = chunk.encode('utf-8')
+                    compressed = stream.compress(chunk)
+                    if compressed:
+                        yield compressed
+                yield stream.finish()
+            finally:
+                if hasattr(body, 'close'):
+                    body.close()
+
+        response.response = generate()
+        response.headers.pop('Content-Length', None)
+        return response
+
+    def _compress_file(self, response, encoding):
+        # Respuestas de send_from_directory: se cachean por ETag (incluye mtime y tamaño)
+        etag, weak = response.get_etag()
+        key = (etag, encoding) if etag else None
+        data = self.static_cache.get(key) if key else None
+        original = response.response
+
+        if data is None:
+            response.direct_passthrough = False
+            raw = response.get_data()
+            if len(raw) < self.min_size:
+                return response, False
+            data = self._compress(raw, encoding, static=True)
+            if key:
+                self.static_cache.set(key, data)
+
+        # Cerrar el archivo original también cuando la variante sale del cache
+        if hasattr(original, 'close'):
+            original.close()
+        response.direct_passthrough = False
+        response.set_data(data)
+        if etag and not weak:
+            # La representación comprimida ya no es idéntica byte a byte
+            response.set_etag(etag, weak=True)
+        return response, True
+
+    def after_request(self, response):
+        response.vary.add('Accept-Encoding')
+        if not self._is_compressible(response):
+            return response
+
+        encoding = self._negotiate()
+        if not encoding:
+            return response
+
+        if response.is_streamed and not response.direct_passthrough:
+            response = self._compress_streamed(response, encoding)
+        elif response.direct_passthrough:
+            response, compressed = self._compress_file(response, encoding)
+            if not compressed:
+                return response
+        else:
+            data = response.get_data()
+            if len(data) < self.min_size:
+                return response
+            response.set_data(self._compress(data, encoding))
+
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+def init_compression(app):
+    """Registrar la compresión de respuestas en la aplicación"""
+    if not app.config.get('COMPRESSION_ENABLED', True):
+        return None
+
+    compressor = Compressor(
+        min_size=app.config.get('COMPRESSION_MIN_SIZE', 1024),
+        gzip_level=app.config.get('COMPRESSION_GZIP_LEVEL', 6),
+        brotli_quality=app.config.get('COMPRESSION_BROTLI_QUALITY', 5),
+        zstd_level=app.config.get('COMPRESSION_ZSTD_LEVEL', 3),
+        static_cache_bytes=app.config.get('COMPRESSION_STATIC_CACHE_BYTES', 32 * 1024 * 1024)
+    )
+    app.after_request(compressor.after_request)
+    app.extensions['compressor'] = compressor
+    return compressor
@@ -0,0 +1,220 @@
+"""Contadores desnormalizados en users (contactos, campañas por estado, mensajes, bot).
+
+Cada flush del ORM suma o resta la aportación de los contactos, campañas y
+actividades insertados, modificados o borrados con UPDATE users SET c = c + n,
+atómico aunque haya peticiones concurrentes. Los borrados masivos llaman a
+subtract_contact_counters() y reset_bot_counters(). Para detectar y corregir desvíos:
+
+    python -m src.utils.counters verify [user_id]
+    python -m src.utils.counters repair [user_id]
+"""
+import sys
+from collections import defaultdict
+
+from sqlalchemy import case, event, func, inspect
+from src.models.user import db, User, Contact, Campaign, BotActivity, CAMPAIGN_STATUSES
+from src.utils.rollups import keep_previous_values, previous_values
+
+COUNTERS = (
+    'contacts_total', 'contacts_active',
+    'campaigns_total', *[f'campaigns_{status}' for status in CAMPAIGN_STATUSES],
+    'messages_sent_total', 'bot_activity_total', 'bot_activity_failed'
+)
+# Atributos de los que dependen los contadores de cada modelo
+TRACKED = {
+    Contact: ('user_id', 'status'),
+    Campaign: ('user_id', 'status', 'sent_count'),
+    BotActivity: ('user_id', 'status')
+}
+
+keep_previous_values(TRACKED)
+
+
+def contribution(model, values):
+    """Lo que aporta una fila con esos valores a los contadores de su usuario"""
+    if model is Contact:
+        return {'contacts_total': 1, 'contacts_active': 1 if values['status'] == 'activo' else 0}
+    if model is Campaign:
+        counters = {'campaigns_total': 1, 'messages_sent_total': values['sent_count'] or 0}
+        if values['status'] in CAMPAIGN_STATUSES:
+            counters[f"campaigns_{values['status']}"] = 1
+        return counters
+    return {'bot_activity_total': 1, 'bot_activity_failed': 1 if values['status'] == 'failed' else 0}
+
+
+def apply_deltas(connection, deltas):
+    """deltas: {user_id: {contador: incremento}}"""
+    table = User.__table__
+    for user_id, counters in deltas.items():
+        changes = {name: table.c[name] + amount for name, amount in counters.items() if amount}
+        if changes:
+            # updated_at se fija a sí mismo para que el onupdate no lo cambie
+            connection.execute(table.update().where(table.c.id == user_id)
+                               .values({**changes, 'updated_at': table.c.updated_at}))
+
+
+@event.listens_for(db.orm.Session, 'before_flush')
+def _load_deleted_counter_values(session, flush_context, instances):
+    """Cargar lo que aportaban las filas que se van a borrar mientras aún existen"""
+    for obj in session.deleted:
+        for attr in TRACKED.get(type(obj), ()):
+            getattr(obj, attr)
+
+
+@event.listens_for(db.orm.Session, 'after_flush')
+def _maintain_counters(session, flush_context):
+    """Trasladar a los contadores de users las altas, cambios y bajas de este flush"""
+    deltas = defaultdict(lambda: defaultdict(int))
+    recount, dropped = set(), set()
+
+    def add(model, values, sign):
+        for name, amount in contribution(model, values).items():
+            deltas[values['user_id']][name] += sign * amount
+
+    for obj in session.new:
+        attrs = TRACKED.get(type(obj))
+        if attrs:
+            add(type(obj), {attr: getattr(obj, attr) for attr in attrs}, 1)
+
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            dropped.add(obj.id)
+            continue
+        attrs = TRACKED.get(type(obj))
+        if attrs:
+            previous = previous_values(obj, attrs)
+            if previous is not None:
+                add(type(obj), previous, -1)
+
+    for obj in session.dirty:
+        attrs = TRACKED.get(type(obj))
+        if not attrs:
+            continue
+        state = inspect(obj)
+        if not any(state.attrs[attr].history.has_changes() for attr in attrs):
+            continue
+        previous = previous_values(obj, attrs)
+        if previous is None:
+            recount.add(obj.user_id)
+            continue
+        add(type(obj), previous, -1)
+        add(type(obj), {attr: getattr(obj, attr) for attr in attrs}, 1)
+
+    for user_id in dropped | recount:
+        deltas.pop(user_id, None)
+    if not deltas and not recount - dropped:
+        return
+
+    connection = session.connection()
+    apply_deltas(connection, deltas)
+    if recount - dropped:
+        repair(connection, recount - dropped)
+
+
+def actual_counts(connection, user_ids=None):
+    """Contadores recalculados desde contacts, campaigns y bot_activities: {user_id: {...}}"""
+    counts = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+
+    def scoped(query, column):
+        return query.where(column.in_(user_ids)) if user_ids is not None else query
+
+    contacts = Contact.__table__
+    rows = connection.execute(scoped(
+        db.select(contacts.c.user_id, func.count(),
+                  func.sum(case((contacts.c.status == 'activo', 1), else_=0)))
+        .group_by(contacts.c.user_id), contacts.c.user_id
+    ))
+    for user_id, total, active in rows:
+        counts[user_id].update(contacts_total=total, contacts_active=active or 0)
+
+    campaigns = Campaign.__table__
+    rows = connection.execute(scoped(
+        db.select(campaigns.c.user_id, campaigns.c.status, func.count(), func.sum(campaigns.c.sent_count))
+        .group_by(campaigns.c.user_id, campaigns.c.status), campaigns.c.user_id
+    ))
+    for user_id, status, total, sent in rows:
+        counts[user_id]['campaigns_total'] += total
+        counts[user_id]['messages_sent_total'] += sent or 0
+        if status in CAMPAIGN_STATUSES:
+            counts[user_id][f'campaigns_{status}'] += total
+
+    activities = BotActivity.__table__
+    rows = connection.execute(scoped(
+        db.select(activities.c.user_id, func.count(),
+                  func.sum(case((activities.c.status == 'failed', 1), else_=0)))
+        .group_by(activities.c.user_id), activities.c.user_id
+    ))
+    for user_id, total, failed in rows:
+        counts[user_id].update(bot_activity_total=total, bot_activity_failed=failed or 0)
+    return counts
+
+
+def drift(connection, user_ids=None):
+    """[(user_id, {contador: (guardado, real)})] de los usuarios con contadores desviados"""
+    table = User.__table__
+    query = db.select(table.c.id, *[table.c[name] for name in COUNTERS]).order_by(table.c.id)
+    if user_ids is not None:
+        query = query.where(table.c.id.in_(user_ids))
+    counts = actual_counts(connection, user_ids)
+
+    drifted = []
+    for row in connection.execute(query):
+        actual = counts.get(row.id) or dict.fromkeys(COUNTERS, 0)
+        wrong = {name: (row._mapping[name], actual[name]) for name in COUNTERS if row._mapping[name] != actual[name]}
+        if wrong:
+            drifted.append((row.id, wrong))
+    return drifted
+
+
+def repair(connection, user_ids=None):
+    """Sobrescribir los contadores desviados con los valores reales; devuelve los corregidos"""
+    table = User.__table__
+    drifted = drift(connection, user_ids)
+    for user_id, wrong in drifted:
+        connection.execute(
+            table.update().where(table.c.id == user_id)
+            .values({**{name: actual for name, (_, actual) in wrong.items()}, 'updated_at': table.c.updated_at})
+        )
+    return drifted
+
+
+def subtract_contact_counters(user_id, contact_ids):
+    """Restar contactos que se van a borrar en bloque (llamar antes del DELETE)"""
+    contacts = Contact.__table__
+    total, active = db.session.execute(
+        db.select(func.count(), func.sum(case((contacts.c.status == 'activo', 1), else_=0)))
+        .where(contacts.c.id.in_(contact_ids), contacts.c.user_id == user_id)
+    ).one()
+    apply_deltas(db.session.connection(), {user_id: {'contacts_total': -total, 'contacts_active': -(active or 0)}})
+
+
+def reset_bot_counters(user_id):
+    """Poner a cero los contadores del bot tras borrar todo el historial del usuario"""
+    db.session.execute(
+        User.__table__.update().where(User.__table__.c.id == user_id)
+        .values(bot_activity_total=0, bot_activity_failed=0, updated_at=User.__table__.c.updated_at)
+    )
+
+
+def main(argv):
+    from src.main import app
+
+    command = argv[1] if len(argv) > 1 else 'verify'
+    if command not in ('verify', 'repair'):
+        print(f'Comando desconocido: {command} (usa verify o repair)')
+        return 1
+    user_ids = [int(argv[2])] if len(argv) > 2 else None
+
+    with app.app_context():
+        with db.engine.begin() as connection:
+            drifted = repair(connection, user_ids) if command == 'repair' else drift(connection, user_ids)
+        for user_id, wrong in drifted:
+            details = ', '.join(f'{name} {stored} -> {actual}' for name, (stored, actual) in wrong.items())
+            print(f"{'🔧' if command == 'repair' else '❌'} usuario {user_id}: {details}")
+
+    print(f"{'✅' if not drifted else '⚠️'} {len(drifted)} usuarios con contadores desviados")
+    return 1 if drifted and command == 'verify' else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
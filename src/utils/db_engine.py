@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import QueuePool
+from src.models.user import db
+
+
+class PoolStats:
+    """Esperas para obtener conexión del pool (por proceso)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.waited = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, elapsed, timed_out=False):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += elapsed
+            self.max_wait = max(self.max_wait, elapsed)
+            # Menos de 1 ms es una conexión libre, no una espera real
+            if elapsed >= 0.001:
+                self.waited += 1
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'waited': self.waited,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait / self.checkouts * 1000, 3) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 3)
+            }
+
+
+def timed_pool_class(stats):
+    """QueuePool que mide cuánto espera cada checkout (se conserva al recrear el pool)"""
+
+    class TimedQueuePool(QueuePool):
+        pool_stats = stats
+
+        def _do_get(self):
+            started = time.perf_counter()
+            try:
+                connection = super()._do_get()
+            except Exception:
+                self.pool_stats.record(time.perf_counter() - started, timed_out=True)
+                raise
+            self.pool_stats.record(time.perf_counter() - started)
+            return connection
+
+    return TimedQueuePool
+
+
+def _env_int(name, default):
+    return int(os.environ.get(name, default))
+
+
+def engine_options(database_uri):
+    """Opciones de create_engine según el dialecto (perfil SQLite o PostgreSQL)"""
+    url = make_url(database_uri)
+    stats = PoolStats()
+
+    if url.get_backend_name() == 'sqlite':
+        options = {'connect_args': {'timeout': _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000}}
+        # Las bases en memoria usan un pool propio de Flask-SQLAlchemy
+        if url.database and url.database != ':memory:':
+            options['poolclass'] = timed_pool_class(stats)
+        return options
+
+    options = {
+        'pool_pre_ping': True,
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 300),
+        'pool_size': _env_int('DB_POOL_SIZE', 5),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 10),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 30),
+        'poolclass': timed_pool_class(stats)
+    }
+    if url.get_backend_name() == 'postgresql':
+        statement_timeout = _env_int('DB_STATEMENT_TIMEOUT_MS', 30000)
+        options['connect_args'] = {'options': f'-c statement_timeout={statement_timeout}'}
+    return options
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    try:
+        # WAL: lectores y escritor concurrentes; NORMAL es seguro con WAL y evita fsync por commit
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute(f"PRAGMA busy_timeout={_env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)}")
+        cursor.execute(f"PRAGMA mmap_size={_env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)}")
+        cursor.execute('PRAGMA temp_store=MEMORY')
+    finally:
+        cursor.close()
+
+
+def init_engine_profile(app):
+    """Registrar los PRAGMA de SQLite en los engines de la aplicación"""
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name == 'sqlite' and not event.contains(engine, 'connect', _sqlite_pragmas):
+                event.listen(engine, 'connect', _sqlite_pragmas)
+
+
+def pool_report(engine):
+    """Estado del pool y tiempos de espera para /health/db"""
+    pool = engine.pool
+    report = {'class': type(pool).__name__, 'status': pool.status()}
+    if isinstance(pool, QueuePool):
+        report.update({
+            'size': pool.size(),
+            'checked_out': pool.checkedout(),
+            'checked_in': pool.checkedin(),
+            'overflow': max(pool.overflow(), 0)
+        })
+    stats = getattr(pool, 'pool_stats', None)
+    if stats is not None:
+        report['wait'] = stats.snapshot()
+    return report
+
+
+def ping(engine):
+    """Latencia de un SELECT 1 en milisegundos"""
+    started = time.perf_counter()
+    with engine.connect() as connection:
+        connection.execute(text('SELECT 1'))
+    return round((time.perf_counter() - started) * 1000, 2)
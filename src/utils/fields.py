@@ -0,0 +1,9 @@
+from flask import request
+
+
+def requested_fields(param='fields'):
+    """Leer ?fields=a,b,c y devolver el conjunto de campos pedidos (None = todos)"""
+    raw = request.args.get(param, '').strip()
+    if not raw:
+        return None
+    return {name.strip() for name in raw.split(',') if name.strip()}
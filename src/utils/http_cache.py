@@ -0,0 +1,45 @@
+import hashlib
+
+from flask import make_response, request
+from src.models.user import db, User
+from src.utils.replica import primary_reads, stop_replica_reads
+
+
+def user_etag(user_id, scope):
+    """ETag débil a partir del contador de cambios del usuario (una consulta de una fila).
+
+    El contador se lee siempre del primario: con la réplica atrasada, un 304
+    confirmaría datos viejos. Si la réplica aún no tiene el último cambio, el
+    resto de la petición también lee del primario.
+    """
+    query = db.session.query(User.data_version, User.updated_at).filter(User.id == user_id)
+    with primary_reads() as replica:
+        row = query.first()
+    if not row:
+        return None
+    if replica and tuple(query.first() or ()) != tuple(row):
+        stop_replica_reads()
+
+    updated_at = row.updated_at.isoformat() if row.updated_at else ''
+    # La query string forma parte de la clave: ?fields= o filtros cambian el cuerpo
+    raw = f'{scope}:{user_id}:{row.data_version}:{updated_at}:{request.query_string.decode()}'
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()[:20]
+
+
+def etag_matches(etag):
+    """Comprueba If-None-Match (comparación débil)"""
+    return etag is not None and request.if_none_match.contains_weak(etag)
+
+
+def not_modified(etag):
+    """Respuesta 304 sin cuerpo"""
+    response = make_response('', 304)
+    return with_etag(response, etag)
+
+
+def with_etag(response, etag):
+    """Añadir el ETag y obligar a revalidar en cada uso"""
+    if etag is not None:
+        response.set_etag(etag, weak=True)
+        response.headers['Cache-Control'] = 'private, no-cache'
+    return response
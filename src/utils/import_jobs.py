@@ -0,0 +1,321 @@
+"""Importaciones de contactos en segundo plano.
+
+Las rutas de importación guardan el archivo subido en la base de datos
+(import_file_chunks, en trozos de IMPORT_CHUNK_SIZE: el web y el worker no
+comparten disco en Heroku ni en Render), crean el ImportedFile en estado
+'queued' y responden 202 con su id. El worker (python -m src.worker) reclama
+los trabajos con un UPDATE condicional sobre imported_files, copia el archivo a
+IMPORT_UPLOAD_DIR (o lo descarga de Google), lo procesa por lotes y guarda el
+progreso en la misma transacción que cada lote: un trabajo interrumpido
+(despliegue, worker caído) se retoma desde la última fila confirmada.
+GET /api/contacts/import/<id> informa de filas leídas, importadas y
+rechazadas, ritmo y tiempo restante.
+"""
+import json
+import os
+import re
+import time
+import urllib.request
+import uuid
+from contextlib import closing
+from datetime import datetime, timedelta
+
+from src.models.user import db, ImportChunk, ImportedFile
+from src.utils.importers import (
+    ImportReport, ImportSourceError, contact_records, csv_rows, excel_rows, import_contacts
+)
+
+# Copias locales de trabajo del worker (se borran al terminar cada importación)
+IMPORT_UPLOAD_DIR = os.environ.get(
+    'IMPORT_UPLOAD_DIR', os.path.join(os.path.dirname(__file__), '..', 'uploads', 'imports')
+)
+IMPORT_CHUNK_SIZE = 1024 * 1024
+# Un trabajo 'processing' sin latido en este tiempo se da por abandonado
+IMPORT_JOB_STALE_SECONDS = int(os.environ.get('IMPORT_JOB_STALE_SECONDS', 600))
+IMPORT_JOB_MAX_ATTEMPTS = int(os.environ.get('IMPORT_JOB_MAX_ATTEMPTS', 3))
+IMPORT_DOWNLOAD_MAX_BYTES = int(os.environ.get('IMPORT_DOWNLOAD_MAX_BYTES', 100 * 1024 * 1024))
+# Latidos mientras se descarga o se copia el archivo, muy por debajo del plazo de abandono
+HEARTBEAT_INTERVAL = min(30, max(IMPORT_JOB_STALE_SECONDS // 4, 1))
+DOWNLOAD_TIMEOUT = 30
+
+SHEETS_URL = re.compile(r'^https://docs\.google\.com/spreadsheets/d/([\w-]+)')
+SHEETS_GID = re.compile(r'[#&?]gid=(\d+)')
+DRIVE_FILE_ID = re.compile(r'^[\w-]+$')
+XLSX_MAGIC = b'PK\x03\x04'
+GOOGLE_TYPES = ('google_sheets', 'google_drive')
+
+
+def enqueue(user_id, filename, file_type, upload=None, file_url=None, options=None):
+    """Crear el trabajo pendiente (confirma la sesión).
+
+    upload: archivo subido (se guarda en import_file_chunks en la misma transacción);
+    options: {'sheet': nombre de la hoja}.
+    """
+    job = ImportedFile(
+        user_id=user_id,
+        filename=filename,
+        file_type=file_type,
+        file_url=file_url,
+        options=json.dumps(options) if options else None,
+        status='queued'
+    )
+    db.session.add(job)
+    db.session.flush()
+    if upload is not None:
+        table = ImportChunk.__table__
+        seq = 0
+        while chunk := upload.read(IMPORT_CHUNK_SIZE):
+            db.session.execute(table.insert().values(import_id=job.id, seq=seq, data=chunk))
+            seq += 1
+    db.session.commit()
+    return job
+
+
+def _upload_extension(job):
+    if job.file_type == 'csv':
+        return '.csv'
+    return os.path.splitext(job.filename)[1].lower() or '.xlsx'
+
+
+def heartbeat(job, interval=HEARTBEAT_INTERVAL):
+    """Función que renueva heartbeat_at del trabajo (confirma la sesión; como mucho una vez cada interval segundos)"""
+    last = None
+
+    def beat(force=False):
+        nonlocal last
+        now = time.monotonic()
+        if force or last is None or now - last >= interval:
+            last = now
+            job.heartbeat_at = datetime.utcnow()
+            db.session.commit()
+    return beat
+
+
+def restore_upload(job, beat=None):
+    """Copiar a IMPORT_UPLOAD_DIR el archivo subido guardado en la base de datos; devuelve su ruta"""
+    table = ImportChunk.__table__
+    # Un trozo por consulta: entre trozos se puede confirmar el latido
+    query = db.select(table.c.data).where(table.c.import_id == job.id, table.c.seq == db.bindparam('seq'))
+    os.makedirs(IMPORT_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(IMPORT_UPLOAD_DIR, f'{job.user_id}_{uuid.uuid4().hex}{_upload_extension(job)}')
+    seq = 0
+    with open(path, 'wb') as target:
+        while (chunk := db.session.execute(query, {'seq': seq}).scalar()) is not None:
+            target.write(chunk)
+            seq += 1
+            if beat:
+                beat()
+    if not seq:
+        _remove(path)
+        raise ImportSourceError('El archivo subido ya no está disponible; vuelve a importarlo')
+    return path
+
+
+def local_source(job, beat=None):
+    """Archivo del trabajo en este worker: la copia de un intento anterior, el subido o la descarga de Google"""
+    if job.source_path and os.path.exists(job.source_path):
+        return job.source_path
+    if job.file_type in GOOGLE_TYPES:
+        return download(job, beat)
+    return restore_upload(job, beat)
+
+
+def sheets_export_url(sheet_url):
+    """URL de exportación CSV de una hoja de Google Sheets (None si la URL no es de Sheets)"""
+    match = SHEETS_URL.match(sheet_url or '')
+    if not match:
+        return None
+    url = f'https://docs.google.com/spreadsheets/d/{match.group(1)}/export?format=csv'
+    gid = SHEETS_GID.search(sheet_url)
+    return f'{url}&gid={gid.group(1)}' if gid else url
+
+
+def drive_export_url(file_id):
+    """URL de descarga directa de un archivo de Google Drive (None si el id no es válido)"""
+    if not DRIVE_FILE_ID.match(file_id or ''):
+        return None
+    return f'https://drive.google.com/uc?export=download&id={file_id}'
+
+
+def _export_url(job):
+    if job.file_type == 'google_sheets':
+        return sheets_export_url(job.file_url)
+    return drive_export_url(job.file_url.rsplit('/', 1)[-1])
+
+
+def download(job, beat=None):
+    """Descargar a IMPORT_UPLOAD_DIR el archivo de una importación de Google; devuelve su ruta.
+
+    El archivo tiene que estar compartido con cualquiera que tenga el enlace.
+    """
+    url = _export_url(job)
+    if not url:
+        raise ImportSourceError('URL de origen no válida')
+    os.makedirs(IMPORT_UPLOAD_DIR, exist_ok=True)
+    path = os.path.join(IMPORT_UPLOAD_DIR, f'{job.user_id}_{uuid.uuid4().hex}.download')
+    try:
+        with urllib.request.urlopen(url, timeout=DOWNLOAD_TIMEOUT) as response, open(path, 'wb') as target:
+            if 'text/html' in response.headers.get('Content-Type', ''):
+                # Google responde con la página de acceso cuando el archivo no es público
+                raise ImportSourceError('El archivo no es público o no existe')
+            copied = 0
+            while chunk := response.read(64 * 1024):
+                copied += len(chunk)
+                if copied > IMPORT_DOWNLOAD_MAX_BYTES:
+                    raise ImportSourceError('El archivo supera el tamaño máximo de importación')
+                target.write(chunk)
+                if beat:
+                    beat()
+    except Exception as e:
+        _remove(path)
+        if isinstance(e, ImportSourceError):
+            raise
+        raise ImportSourceError(f'No se pudo descargar el archivo: {e}') from e
+
+    # Drive puede devolver tanto CSV como Excel: se distingue por la firma ZIP del .xlsx
+    with open(path, 'rb') as downloaded:
+        extension = '.xlsx' if downloaded.read(4) == XLSX_MAGIC else '.csv'
+    final_path = path[:-len('.download')] + extension
+    os.replace(path, final_path)
+    return final_path
+
+
+def _remove(path):
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def _discard_upload(job):
+    table = ImportChunk.__table__
+    db.session.execute(table.delete().where(table.c.import_id == job.id))
+
+
+def _rows(job, raw, report):
+    if job.source_path.lower().endswith(('.xlsx', '.xls')):
+        options = json.loads(job.options) if job.options else {}
+        return excel_rows(raw, sheet=options.get('sheet'), report=report)
+    return csv_rows(raw)
+
+
+def recover_stale(now=None):
+    """Devolver a la cola los trabajos sin latido reciente (o fallarlos tras varios intentos)"""
+    now = now or datetime.utcnow()
+    table = ImportedFile.__table__
+    stale = (table.c.status == 'processing') & (table.c.heartbeat_at < now - timedelta(seconds=IMPORT_JOB_STALE_SECONDS))
+    db.session.execute(
+        table.update().where(stale, table.c.attempts >= IMPORT_JOB_MAX_ATTEMPTS)
+        .values(status='failed', error_message='Importación abandonada tras varios intentos', completed_at=now)
+    )
+    db.session.execute(table.update().where(stale).values(status='queued'))
+    db.session.commit()
+
+
+def claim_next():
+    """Reclamar el trabajo pendiente más antiguo; devuelve su id o None.
+
+    El UPDATE ... WHERE status = 'queued' solo afecta a una fila en un worker
+    aunque varios lean el mismo candidato a la vez.
+    """
+    table = ImportedFile.__table__
+    candidates = db.session.execute(
+        db.select(table.c.id).where(table.c.status == 'queued').order_by(table.c.id).limit(5)
+    ).scalars().all()
+    now = datetime.utcnow()
+    for job_id in candidates:
+        result = db.session.execute(
+            table.update().where(table.c.id == job_id, table.c.status == 'queued')
+            .values(status='processing', attempts=table.c.attempts + 1, heartbeat_at=now,
+                    started_at=db.func.coalesce(table.c.started_at, now))
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            return job_id
+    return None
+
+
+def run_job(job_id, stop=None):
+    """Procesar un trabajo reclamado; con stop (threading.Event) activado se detiene tras el lote en curso"""
+    job = db.session.get(ImportedFile, job_id)
+    if job is None:
+        return False
+    try:
+        # Otro worker (u otro disco) puede haber hecho el intento anterior. Con latidos
+        # durante la copia o la descarga para que recover_stale no lo dé por abandonado
+        beat = heartbeat(job)
+        beat(force=True)
+        source_path = local_source(job, beat)
+        job.source_path = source_path
+        beat(force=True)
+
+        # Se retoma tras la última fila confirmada de un intento anterior
+        report = ImportReport(read=job.rows_read, imported=job.contacts_imported or 0, rejected=job.rows_rejected)
+        size = os.path.getsize(job.source_path)
+        # El lector se cierra antes que el archivo aunque el trabajo se detenga a medias
+        with open(job.source_path, 'rb') as raw, closing(_rows(job, raw, report)) as rows:
+
+            def progress(report):
+                job.rows_read = report.read
+                job.contacts_imported = report.imported
+                job.rows_rejected = report.rejected
+                # Excel conoce el total; en CSV se estima por la proporción de bytes leídos
+                position = raw.tell()
+                job.rows_total = report.total if report.total is not None else \
+                    max(report.read, round(report.read * size / position)) if position else None
+                job.heartbeat_at = datetime.utcnow()
+                return not (stop is not None and stop.is_set())
+
+            records = contact_records(rows, report, skip=job.rows_read)
+            completed = import_contacts(job.user_id, records, report, progress=progress)
+
+        if not completed:
+            # Otro worker lo retoma desde el último lote confirmado
+            job.status = 'queued'
+            db.session.commit()
+            return False
+
+        job.rows_read = job.rows_total = report.read
+        job.contacts_imported = report.imported
+        job.rows_rejected = report.rejected
+        job.status = 'completed' if report.imported > 0 else 'failed'
+        job.error_message = report.error_summary()
+        job.completed_at = datetime.utcnow()
+        _discard_upload(job)
+        db.session.commit()
+        _remove(job.source_path)
+        return True
+
+    except Exception as e:
+        db.session.rollback()
+        job.status = 'failed'
+        job.error_message = str(e)
+        job.completed_at = datetime.utcnow()
+        _discard_upload(job)
+        db.session.commit()
+        _remove(job.source_path)
+        raise
+
+
+def job_progress(job, now=None):
+    """Progreso de un trabajo: filas, porcentaje, filas por segundo y segundos restantes"""
+    now = now or datetime.utcnow()
+    end = job.completed_at or now
+    elapsed = (end - job.started_at).total_seconds() if job.started_at else 0
+    rate = job.rows_read / elapsed if elapsed > 0 and job.rows_read else None
+
+    percent, eta = None, None
+    if job.status == 'completed':
+        percent, eta = 100.0, 0
+    elif job.rows_total:
+        percent = round(min(job.rows_read / job.rows_total, 1) * 100, 1)
+        if rate and job.status == 'processing':
+            eta = round(max(job.rows_total - job.rows_read, 0) / rate)
+
+    return {
+        'rows_read': job.rows_read,
+        'rows_imported': job.contacts_imported or 0,
+        'rows_rejected': job.rows_rejected,
+        'rows_total': job.rows_total,
+        'percent': percent,
+        'rows_per_second': round(rate, 1) if rate else None,
+        'eta_seconds': eta
+    }
@@ -0,0 +1,393 @@
+"""Importación de contactos en streaming.
+
+El archivo se lee por bloques: se detecta la codificación y el separador con una
+muestra del principio, las filas pasan por una cadena de generadores
+(lectura -> validación -> lotes) y cada lote se confirma por separado, así que
+la memoria no crece con el tamaño del archivo.
+
+Cada lote se escribe con operaciones de conjunto: los teléfonos (normalizados a
+E.164) repetidos dentro del archivo se descartan con un set, los que ya existen
+se buscan con consultas IN por bloques sobre los índices únicos y los contactos
+(y sus etiquetas) se insertan con un INSERT de varias filas ... ON CONFLICT DO
+NOTHING.
+"""
+import codecs
+import csv
+import io
+import json
+import os
+import re
+import shutil
+import tempfile
+import unicodedata
+from datetime import datetime
+from itertools import islice
+
+import openpyxl
+from sqlalchemy.dialects import postgresql, sqlite
+from src.models.user import db, Contact, Tag, User, contact_tags, normalize_tags, touch_user_data
+from src.utils.counters import apply_deltas, contribution
+from src.utils.phones import normalize_phone
+from src.utils.rollups import RollupDelta, apply_delta, user_zones
+
+IMPORT_BATCH_SIZE = 1000
+# Teléfonos por consulta IN al buscar los que ya existen
+LOOKUP_CHUNK_SIZE = 500
+# Muestra para detectar codificación y separador
+SNIFF_BYTES = 64 * 1024
+CSV_DELIMITERS = ',;\t|'
+# El informe guarda solo los primeros errores; el resto solo se cuenta
+MAX_REPORTED_ERRORS = 100
+
+# Cabeceras reconocidas para cada campo del contacto (se comparan normalizadas:
+# minúsculas, sin tildes y con los separadores como espacios). Se pueden ampliar
+# con IMPORT_HEADER_ALIASES='{"phone": ["movil empresa"], ...}'.
+HEADER_ALIASES = {
+    'name': ('name', 'nombre', 'nombre completo', 'full name', 'contacto', 'contact'),
+    'phone': ('phone', 'telefono', 'tel', 'movil', 'celular', 'mobile', 'whatsapp', 'phone number'),
+    'email': ('email', 'correo', 'correo electronico', 'e mail', 'mail'),
+    'tags': ('tags', 'etiquetas', 'labels', 'grupos')
+}
+REQUIRED_FIELDS = ('name', 'phone')
+
+
+class ImportSourceError(Exception):
+    """El archivo de origen no se puede descargar o leer"""
+
+
+class ImportReport:
+    """Progreso y resultado de una importación"""
+
+    def __init__(self, read=0, imported=0, rejected=0):
+        self.read = read
+        self.imported = imported
+        self.rejected = rejected
+        # Filas de datos del archivo, si el lector las conoce de antemano
+        self.total = None
+        self.errors = []
+
+    def reject(self, row_num, message):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f'Fila {row_num}: {message}')
+
+    def error_summary(self):
+        """Texto para ImportedFile.error_message"""
+        if not self.errors:
+            return None
+        summary = '; '.join(self.errors)
+        if self.rejected > len(self.errors):
+            summary += f'; ... y {self.rejected - len(self.errors)} filas rechazadas más'
+        return summary
+
+
+def sniff_encoding(sample):
+    """Codificación probable del archivo: UTF-8 (con o sin BOM), UTF-16 o Windows-1252"""
+    if sample.startswith(codecs.BOM_UTF8):
+        return 'utf-8-sig'
+    if sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+        return 'utf-16'
+    try:
+        # final=False: la muestra puede cortar un carácter multibyte por la mitad
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+        return 'utf-8'
+    except UnicodeDecodeError:
+        # Exportaciones de Excel en español: Windows-1252 (superconjunto de Latin-1)
+        return 'cp1252'
+
+
+def _seekable(raw):
+    """El archivo subido se relee desde el principio tras la muestra; si no admite seek se copia a disco"""
+    if raw.seekable():
+        return raw
+    spooled = tempfile.SpooledTemporaryFile(max_size=SNIFF_BYTES * 16)
+    shutil.copyfileobj(raw, spooled)
+    spooled.seek(0)
+    return spooled
+
+
+def open_text(raw):
+    """Envolver un archivo binario en un lector de texto incremental: (texto, codificación, muestra)"""
+    raw = _seekable(raw)
+    start = raw.tell()
+    sample = raw.read(SNIFF_BYTES)
+    raw.seek(start)
+
+    encoding = sniff_encoding(sample)
+    # errors='replace': un byte inválido lejos de la muestra no aborta la importación
+    text = io.TextIOWrapper(raw, encoding=encoding, errors='replace', newline='')
+    sample_text = codecs.getincrementaldecoder(encoding)(errors='replace').decode(sample, final=False)
+    return text, encoding, sample_text
+
+
+def sniff_dialect(sample_text):
+    """Separador del CSV (',' si no se puede deducir)"""
+    try:
+        return csv.Sniffer().sniff(sample_text, delimiters=CSV_DELIMITERS)
+    except csv.Error:
+        return csv.excel
+
+
+def csv_rows(raw):
+    """Filas del CSV como listas de valores, empezando por la cabecera: (número de fila, valores)"""
+    text, _, sample_text = open_text(raw)
+    try:
+        reader = csv.reader(text, sniff_dialect(sample_text))
+        for row_num, values in enumerate(reader, start=1):
+            if values:
+                yield row_num, values
+    finally:
+        # El archivo es del llamador: al liberar el lector de texto no se cierra
+        text.detach()
+
+
+def excel_sheet_names(raw):
+    """Hojas del libro (solo lee el índice del archivo)"""
+    workbook = openpyxl.load_workbook(raw, read_only=True)
+    try:
+        return workbook.sheetnames
+    finally:
+        workbook.close()
+
+
+def excel_rows(raw, sheet=None, report=None):
+    """Filas de una hoja (la activa si no se indica) en modo streaming, empezando por la cabecera.
+
+    read_only no construye las celdas de todo el libro en memoria; data_only
+    devuelve el valor calculado de las fórmulas.
+    """
+    workbook = openpyxl.load_workbook(raw, read_only=True, data_only=True)
+    try:
+        if sheet is not None and sheet not in workbook.sheetnames:
+            raise ImportSourceError(f"La hoja '{sheet}' no existe (hojas: {', '.join(workbook.sheetnames)})")
+        worksheet = workbook[sheet] if sheet is not None else workbook.active
+        # Las dimensiones vienen de los metadatos del archivo y pueden faltar
+        if report is not None and worksheet.max_row:
+            report.total = max(worksheet.max_row - 1, 0)
+        for row_num, values in enumerate(worksheet.iter_rows(values_only=True), start=1):
+            if any(value is not None for value in values):
+                yield row_num, values
+    finally:
+        workbook.close()
+
+
+def normalize_header(value):
+    """'Teléfono móvil' -> 'telefono movil'"""
+    text = unicodedata.normalize('NFKD', str(value or ''))
+    text = ''.join(char for char in text if not unicodedata.combining(char)).lower()
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text).split())
+
+
+def load_header_aliases(extra=None):
+    """Tabla de alias normalizada {alias: campo}, con los de IMPORT_HEADER_ALIASES añadidos"""
+    aliases = {field: list(names) for field, names in HEADER_ALIASES.items()}
+    if extra is None:
+        extra = json.loads(os.environ.get('IMPORT_HEADER_ALIASES') or '{}')
+    for field, names in extra.items():
+        if field in aliases:
+            aliases[field].extend([names] if isinstance(names, str) else names)
+    return {normalize_header(name): field for field, names in aliases.items() for name in names}
+
+
+HEADER_FIELDS = load_header_aliases()
+
+
+def resolve_columns(header):
+    """Posición de cada campo en la cabecera (la primera columna que coincide)"""
+    positions = {}
+    for index, column in enumerate(header):
+        field = HEADER_FIELDS.get(normalize_header(column))
+        if field and field not in positions:
+            positions[field] = index
+    missing = [field for field in REQUIRED_FIELDS if field not in positions]
+    if missing:
+        raise ImportSourceError(f"Faltan columnas obligatorias: {', '.join(missing)} "
+                                f"(cabecera: {', '.join(str(column or '') for column in header)})")
+    return positions
+
+
+def _cell(values, index):
+    if index is None or index >= len(values) or values[index] is None:
+        return ''
+    value = values[index]
+    # Excel guarda los teléfonos escritos como número como float: 600111222.0
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value).strip()
+
+
+def contact_records(rows, report, skip=0):
+    """Validar filas y convertirlas en datos de contacto; las inválidas quedan en el informe.
+
+    La primera fila es la cabecera; skip descarta las primeras filas de datos
+    (ya procesadas en un intento anterior).
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return
+    positions = resolve_columns(first[1])
+    name_at, phone_at = positions['name'], positions['phone']
+    email_at, tags_at = positions.get('email'), positions.get('tags')
+    columns = Contact.__table__.c
+
+    for row_num, values in islice(rows, skip, None):
+        report.read += 1
+        name = _cell(values, name_at)
+        phone = _cell(values, phone_at)
+        email = _cell(values, email_at) or None
+        if not name or not phone:
+            report.reject(row_num, 'Nombre y teléfono son requeridos')
+            continue
+        # Una fila demasiado larga haría fallar el INSERT de todo el lote
+        if len(name) > columns.name.type.length or len(phone) > columns.phone.type.length \
+                or (email and len(email) > columns.email.type.length):
+            report.reject(row_num, 'Nombre, teléfono o email demasiado largos')
+            continue
+        yield row_num, {
+            'name': name,
+            'phone': phone,
+            'email': email,
+            'tags': _cell(values, tags_at)
+        }
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def existing_phones(connection, user_id, column, phones):
+    """Teléfonos de la lista que el usuario ya tiene en esa columna (consultas IN por bloques)"""
+    table = Contact.__table__
+    found = set()
+    for start in range(0, len(phones), LOOKUP_CHUNK_SIZE):
+        chunk = phones[start:start + LOOKUP_CHUNK_SIZE]
+        found.update(connection.execute(
+            db.select(column).where(table.c.user_id == user_id, column.in_(chunk))
+        ).scalars())
+    return found
+
+
+def insert_contacts(connection, user_id, rows):
+    """INSERT de varias filas que ignora los teléfonos ya existentes: {teléfono: id} de las insertadas"""
+    table = Contact.__table__
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(table)
+        # executemany con RETURNING: SQLAlchemy lo envía como INSERT de varias filas ("insertmanyvalues")
+        statement = insert.on_conflict_do_nothing().returning(table.c.phone, table.c.id)
+        return dict(connection.execute(statement, rows).all())
+
+    connection.execute(table.insert(), rows)
+    return dict(connection.execute(
+        db.select(table.c.phone, table.c.id)
+        .where(table.c.user_id == user_id, table.c.phone.in_([row['phone'] for row in rows]))
+    ).all())
+
+
+def tag_ids(connection, user_id, names, cache):
+    """Ids de las etiquetas del usuario por nombre, creando las que falten (cache: {nombre: id})"""
+    missing = [name for name in names if name not in cache]
+    if not missing:
+        return cache
+    table = Tag.__table__
+    lookup = db.select(table.c.name, table.c.id).where(table.c.user_id == user_id, table.c.name.in_(missing))
+    cache.update(connection.execute(lookup).all())
+    new = [name for name in missing if name not in cache]
+    if new:
+        now = datetime.utcnow()
+        connection.execute(table.insert(), [{'user_id': user_id, 'name': name, 'created_at': now} for name in new])
+        cache.update(connection.execute(lookup).all())
+    return cache
+
+
+def write_batch(connection, user_id, batch, report, seen, tag_cache, region=None):
+    """Escribir un lote de (fila, datos) descartando repetidos del archivo y teléfonos existentes.
+
+    Los teléfonos se comparan en formato E.164 con la región del usuario (o tal
+    cual si no se pueden normalizar).
+    """
+    pending = {}
+    for row_num, record in batch:
+        record['phone_e164'] = normalize_phone(record['phone'], region)
+        key = record['phone_e164'] or record['phone']
+        if key in seen:
+            report.reject(row_num, f"Teléfono {record['phone']} repetido en el archivo")
+            continue
+        seen.add(key)
+        pending[record['phone']] = (row_num, record)
+
+    table = Contact.__table__
+    taken_e164 = existing_phones(connection, user_id, table.c.phone_e164,
+                                 [record['phone_e164'] for _, record in pending.values() if record['phone_e164']])
+    taken = existing_phones(connection, user_id, table.c.phone, list(pending))
+    for phone, (_, record) in list(pending.items()):
+        if phone in taken or record['phone_e164'] in taken_e164:
+            row_num, _ = pending.pop(phone)
+            report.reject(row_num, f'Ya existe contacto con teléfono {phone}')
+    if not pending:
+        return
+
+    now = datetime.utcnow()
+    rows, tags = [], {}
+    for phone, (_, record) in pending.items():
+        names = normalize_tags(record['tags'])
+        tags[phone] = names
+        rows.append({
+            'user_id': user_id,
+            'name': record['name'],
+            'phone': phone,
+            'phone_e164': record['phone_e164'],
+            'email': record['email'],
+            'status': 'activo',
+            'tags': json.dumps(names) if names else None,
+            'created_at': now,
+            'updated_at': now
+        })
+    inserted = insert_contacts(connection, user_id, rows)
+
+    # Creado por otra petición entre la comprobación y el INSERT
+    for phone in pending.keys() - inserted.keys():
+        report.reject(pending[phone][0], f'Ya existe contacto con teléfono {phone}')
+    if not inserted:
+        return
+    report.imported += len(inserted)
+
+    names = sorted({name for phone in inserted for name in tags[phone]})
+    if names:
+        tag_ids(connection, user_id, names, tag_cache)
+        connection.execute(contact_tags.insert(), [
+            {'contact_id': contact_id, 'tag_id': tag_cache[name]}
+            for phone, contact_id in inserted.items() for name in tags[phone]
+        ])
+
+    # Los INSERT de Core no pasan por los listeners del ORM: contadores, agregados y ETag a mano
+    counters = contribution(Contact, {'user_id': user_id, 'status': 'activo'})
+    apply_deltas(connection, {user_id: {name: amount * len(inserted) for name, amount in counters.items()}})
+    delta = RollupDelta(user_zones(connection, [user_id]))
+    delta.add(Contact, {'user_id': user_id, 'created_at': now}, len(inserted))
+    apply_delta(connection, delta)
+    touch_user_data(user_id, connection=connection)
+
+
+def import_contacts(user_id, records, report, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """Crear los contactos confirmando cada lote (lo importado se conserva si algo falla después).
+
+    progress(report) se llama antes de confirmar cada lote, en la misma transacción;
+    si devuelve False la importación se detiene tras ese lote. Devuelve True si se
+    procesaron todas las filas.
+    """
+    seen, tag_cache = set(), {}
+    region = User.phone_region(user_id)
+    for batch in batched(records, batch_size):
+        write_batch(db.session.connection(), user_id, batch, report, seen, tag_cache, region)
+        keep_going = progress(report) if progress else True
+        db.session.commit()
+        if keep_going is False:
+            return False
+    return True
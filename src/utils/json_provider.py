@@ -0,0 +1,69 @@
+import dataclasses
+import decimal
+import json
+import uuid
+from datetime import date, datetime, time
+
+from flask.json.provider import DefaultJSONProvider
+from sqlalchemy.engine import Row
+
+# orjson es opcional: si no está instalado se usa el encoder estándar con el mismo formato
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def default(obj):
+    """Tipos que el encoder no conoce: mismo formato con orjson y con json estándar"""
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, decimal.Decimal):
+        # SUM() en PostgreSQL devuelve Decimal; en la API son números
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
+    if isinstance(obj, Row):
+        return obj._asdict()
+    if isinstance(obj, uuid.UUID):
+        return str(obj)
+    if dataclasses.is_dataclass(obj) and not isinstance(obj, type):
+        return dataclasses.asdict(obj)
+    if hasattr(obj, '__html__'):
+        return str(obj.__html__())
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """Proveedor JSON de Flask respaldado por orjson (datetime, Decimal y Row nativos)"""
+
+    def _orjson_options(self):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps_bytes(self, obj):
+        """Serializar directamente a bytes (evita decodificar y volver a codificar)"""
+        if orjson is not None:
+            return orjson.dumps(obj, default=default, option=self._orjson_options())
+        return json.dumps(obj, default=default, ensure_ascii=self.ensure_ascii,
+                          sort_keys=self.sort_keys).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return self.dumps_bytes(obj).decode('utf-8')
+        kwargs.setdefault('default', default)
+        kwargs.setdefault('ensure_ascii', self.ensure_ascii)
+        kwargs.setdefault('sort_keys', self.sort_keys)
+        return json.dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.loads(s)
+        return json.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        if self.compact is False or (self.compact is None and self._app.debug):
+            # En modo debug se mantiene la salida indentada del proveedor estándar
+            return super().response(obj)
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
@@ -0,0 +1,127 @@
+import base64
+import binascii
+import json
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from flask import request
+from src.models.user import db, User
+
+# Parámetros que no cambian el conjunto filtrado (no forman parte de la clave del total)
+PAGINATION_PARAMS = {'cursor', 'page', 'per_page', 'fields', 'include_total'}
+
+
+class CursorError(ValueError):
+    """Cursor de paginación mal formado o manipulado"""
+
+
+def encode_cursor(item):
+    """Cursor opaco con la posición (created_at, id) del último elemento"""
+    created_at = item.created_at.isoformat() if item.created_at else None
+    payload = json.dumps([created_at, item.id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii').rstrip('=')
+
+
+def decode_cursor(raw):
+    try:
+        payload = base64.urlsafe_b64decode(raw + '=' * (-len(raw) % 4))
+        created_at, item_id = json.loads(payload)
+        return (datetime.fromisoformat(created_at) if created_at else None), int(item_id)
+    except (ValueError, TypeError, binascii.Error) as e:
+        raise CursorError('Cursor de paginación inválido') from e
+
+
+class CountCache:
+    """Totales por usuario y filtros; la clave incluye data_version, así que nunca queda obsoleto"""
+
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            total = self._entries.get(key)
+            if total is not None:
+                self._entries.move_to_end(key)
+            return total
+
+    def set(self, key, total):
+        with self._lock:
+            self._entries[key] = total
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+
+count_cache = CountCache()
+
+
+def cached_total(query, user_id, scope):
+    """COUNT(*) del listado filtrado, reutilizado mientras los datos del usuario no cambien"""
+    version = db.session.query(User.data_version).filter(User.id == user_id).scalar()
+    filters = tuple(sorted(
+        (key, value) for key, value in request.args.items(multi=True) if key not in PAGINATION_PARAMS
+    ))
+    key = (scope, user_id, version, filters)
+    total = count_cache.get(key)
+    if total is None:
+        total = query.order_by(None).count()
+        count_cache.set(key, total)
+    return total
+
+
+def paginate(query, model, user_id, scope, rank_order=None):
+    """Paginar un listado ordenado por (created_at, id) descendente.
+
+    Con ?cursor= (vacío para la primera página) usa keyset: coste constante sea
+    cual sea la profundidad. Sin cursor mantiene ?page= con OFFSET y COUNT para
+    clientes antiguos. Ambos modos devuelven next_cursor. rank_order (relevancia
+    de una búsqueda) solo se aplica en modo página: el cursor exige orden por fecha.
+    """
+    per_page = max(1, min(request.args.get('per_page', 20, type=int), 100))
+    include_total = request.args.get('include_total', '').lower() in ('1', 'true', 'yes')
+    chronological = (model.created_at.desc(), model.id.desc())
+
+    if 'cursor' not in request.args:
+        page = request.args.get('page', 1, type=int)
+        ordering = chronological if rank_order is None else (rank_order, *chronological)
+        result = query.order_by(*ordering).paginate(page=page, per_page=per_page, error_out=False)
+        items = result.items
+        return items, {
+            'page': page,
+            'per_page': per_page,
+            'total': result.total,
+            'pages': result.pages,
+            'has_next': result.has_next,
+            'has_prev': result.has_prev,
+            'next_cursor': encode_cursor(items[-1]) if result.has_next and items and rank_order is None else None
+        }
+
+    query = query.order_by(*chronological)
+    cursor = request.args.get('cursor', '').strip()
+    keyset_query = query
+    if cursor:
+        after_created_at, after_id = decode_cursor(cursor)
+        if after_created_at is None:
+            keyset_query = query.filter(model.created_at.is_(None), model.id < after_id)
+        else:
+            keyset_query = query.filter(db.or_(
+                model.created_at < after_created_at,
+                db.and_(model.created_at == after_created_at, model.id < after_id)
+            ))
+
+    # Una fila de más indica si hay página siguiente sin contar
+    items = keyset_query.limit(per_page + 1).all()
+    has_next = len(items) > per_page
+    items = items[:per_page]
+
+    pagination = {
+        'per_page': per_page,
+        'has_next': has_next,
+        'next_cursor': encode_cursor(items[-1]) if has_next else None
+    }
+    if include_total:
+        pagination['total'] = cached_total(query, user_id, scope)
+    return items, pagination
@@ -0,0 +1,73 @@
+import os
+import threading
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Método de werkzeug con su factor de trabajo, p. ej. 'scrypt:32768:8:1' o 'pbkdf2:sha256:600000'
+PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', PASSWORD_HASH_WORKERS * 4))
+PASSWORD_HASH_WAIT = float(os.environ.get('PASSWORD_HASH_WAIT', 5))
+
+
+class PasswordHasherBusy(Exception):
+    """El pool de hashing está saturado: la petición debe reintentarse más tarde"""
+
+
+class PasswordHasher:
+    """Servicio de hashing de contraseñas con concurrencia acotada y método configurable.
+
+    El hash se calcula en el hilo de la petición (hashlib libera el GIL durante
+    scrypt/pbkdf2, así que varios hilos aprovechan varios núcleos). Como mucho
+    max_workers hashes a la vez y max_pending peticiones esperando turno: el
+    resto recibe PasswordHasherBusy para que una ráfaga de logins no acapare
+    todos los workers.
+    """
+
+    def __init__(self, method, max_workers, max_pending, wait_timeout):
+        self.method = method
+        self.max_workers = max_workers
+        self.wait_timeout = wait_timeout
+        self._admitted = threading.BoundedSemaphore(max_workers + max_pending)
+        self._running = threading.BoundedSemaphore(max_workers)
+        self._method_prefix = None
+
+    def _run(self, fn, *args):
+        # Sin esperar: con la cola llena se rechaza en el acto
+        if not self._admitted.acquire(blocking=False):
+            raise PasswordHasherBusy()
+        try:
+            if not self._running.acquire(timeout=self.wait_timeout):
+                raise PasswordHasherBusy()
+            try:
+                return fn(*args)
+            finally:
+                self._running.release()
+        finally:
+            self._admitted.release()
+
+    def hash(self, password):
+        """Generar el hash con el método configurado"""
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, password_hash, password):
+        """Verificar la contraseña contra el hash almacenado"""
+        return self._run(check_password_hash, password_hash, password)
+
+    def current_prefix(self):
+        """Prefijo completo del método actual (werkzeug completa los parámetros por defecto)"""
+        if self._method_prefix is None:
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return self._method_prefix
+
+    def needs_rehash(self, password_hash):
+        """Indica si el hash se generó con otro método o factor de trabajo"""
+        return password_hash.split('$', 1)[0] != self.current_prefix()
+
+
+password_hasher = PasswordHasher(
+    PASSWORD_HASH_METHOD,
+    PASSWORD_HASH_WORKERS,
+    PASSWORD_HASH_QUEUE,
+    PASSWORD_HASH_WAIT
+)
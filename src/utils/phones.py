@@ -0,0 +1,173 @@
+"""Teléfonos en formato E.164 (+34600111222) para detectar duplicados y buscar contactos.
+
+"+34 600 111 222", "600111222" y "0034600111222" son el mismo número: cada
+contacto guarda además del texto original su forma canónica en phone_e164, con
+un índice único (user_id, phone_e164). Los números sin prefijo internacional se
+interpretan con la región por defecto del usuario (users.default_region).
+
+Con el paquete phonenumbers instalado se usa su parser; si no, una tabla de
+prefijos de las regiones habituales. Para rellenar los contactos existentes:
+
+    python -m src.utils.phones backfill [user_id]
+"""
+import re
+import sys
+
+import sqlalchemy as sa
+
+# Parser completo opcional (libphonenumber)
+try:
+    import phonenumbers
+except ImportError:
+    phonenumbers = None
+
+DEFAULT_REGION = 'ES'
+# Región -> (prefijo internacional, prefijo nacional, dígitos del número nacional si son fijos)
+REGIONS = {
+    'ES': ('34', '', 9),
+    'PT': ('351', '', 9),
+    'FR': ('33', '0', 9),
+    'IT': ('39', '', None),
+    'DE': ('49', '0', None),
+    'GB': ('44', '0', 10),
+    'IE': ('353', '0', None),
+    'NL': ('31', '0', 9),
+    'BE': ('32', '0', None),
+    'CH': ('41', '0', 9),
+    'US': ('1', '1', 10),
+    'CA': ('1', '1', 10),
+    'MX': ('52', '', 10),
+    'AR': ('54', '0', None),
+    'CO': ('57', '', 10),
+    'CL': ('56', '', 9),
+    'PE': ('51', '0', 9),
+    'VE': ('58', '0', 10),
+    'EC': ('593', '0', 9),
+    'UY': ('598', '0', 8),
+    'BR': ('55', '0', None),
+}
+# E.164 admite como máximo 15 dígitos; menos de 8 no es un número completo
+E164_MIN_DIGITS = 8
+E164_MAX_DIGITS = 15
+
+# Solo las columnas que usa el backfill
+contacts = sa.table('contacts', sa.column('id'), sa.column('user_id'), sa.column('phone'), sa.column('phone_e164'))
+users = sa.table('users', sa.column('id'), sa.column('default_region'))
+
+
+def is_supported_region(region):
+    if phonenumbers is not None:
+        return region in phonenumbers.SUPPORTED_REGIONS
+    return region in REGIONS
+
+
+def _fallback_e164(value, region):
+    digits = re.sub(r'\D', '', value)
+    if value.startswith('+'):
+        number = digits
+    elif digits.startswith('00'):
+        number = digits[2:]
+    else:
+        if region not in REGIONS:
+            return None
+        code, trunk, length = REGIONS[region]
+        national = digits[len(trunk):] if trunk and digits.startswith(trunk) else digits
+        # Número internacional escrito sin '+' ni '00': 34600111222
+        if length and len(national) == len(code) + length and national.startswith(code):
+            national = national[len(code):]
+        number = code + national
+    if not E164_MIN_DIGITS <= len(number) <= E164_MAX_DIGITS:
+        return None
+    return f'+{number}'
+
+
+def normalize_phone(value, region=None):
+    """Forma E.164 del teléfono (None si no se puede interpretar como número completo)"""
+    value = (value or '').strip()
+    if not value:
+        return None
+    region = (region or DEFAULT_REGION).upper()
+    if phonenumbers is None:
+        return _fallback_e164(value, region)
+    try:
+        number = phonenumbers.parse(value, region)
+    except phonenumbers.NumberParseException:
+        return None
+    if not phonenumbers.is_possible_number(number):
+        return None
+    return phonenumbers.format_number(number, phonenumbers.PhoneNumberFormat.E164)
+
+
+def backfill_user(connection, user_id, region):
+    """Rellenar phone_e164 en los contactos del usuario que no lo tienen.
+
+    Si dos contactos normalizan al mismo número, el más antiguo se queda con él y
+    el resto sigue sin phone_e164 (se devuelven para revisarlos a mano).
+    Devuelve (rellenados, [(id, teléfono, e164) duplicados]).
+    """
+    taken = set(connection.execute(
+        sa.select(contacts.c.phone_e164).where(contacts.c.user_id == user_id, contacts.c.phone_e164.isnot(None))
+    ).scalars())
+    rows = connection.execute(
+        sa.select(contacts.c.id, contacts.c.phone)
+        .where(contacts.c.user_id == user_id, contacts.c.phone_e164.is_(None))
+        .order_by(contacts.c.id)
+    )
+
+    updates, duplicates = [], []
+    for contact_id, phone in rows:
+        phone_e164 = normalize_phone(phone, region)
+        if phone_e164 is None:
+            continue
+        if phone_e164 in taken:
+            duplicates.append((contact_id, phone, phone_e164))
+            continue
+        taken.add(phone_e164)
+        updates.append({'contact_id': contact_id, 'e164': phone_e164})
+
+    if updates:
+        connection.execute(
+            contacts.update().where(contacts.c.id == sa.bindparam('contact_id'))
+            .values(phone_e164=sa.bindparam('e164')),
+            updates
+        )
+    return len(updates), duplicates
+
+
+def user_regions(connection, user_ids=None):
+    query = sa.select(users.c.id, users.c.default_region).order_by(users.c.id)
+    if user_ids is not None:
+        query = query.where(users.c.id.in_(user_ids))
+    return connection.execute(query).all()
+
+
+def main(argv):
+    from src.main import app
+    from src.models.user import db
+
+    command = argv[1] if len(argv) > 1 else 'backfill'
+    if command != 'backfill':
+        print(f'Comando desconocido: {command} (usa backfill)')
+        return 1
+    user_ids = [int(argv[2])] if len(argv) > 2 else None
+
+    filled, duplicated = 0, 0
+    with app.app_context():
+        with db.engine.connect() as connection:
+            with connection.begin():
+                regions = user_regions(connection, user_ids)
+            # Una transacción por usuario
+            for user_id, region in regions:
+                with connection.begin():
+                    count, duplicates = backfill_user(connection, user_id, region)
+                filled += count
+                duplicated += len(duplicates)
+                for contact_id, phone, phone_e164 in duplicates:
+                    print(f'⚠️ usuario {user_id}: contacto {contact_id} ({phone}) repite {phone_e164}')
+
+    print(f'✅ {filled} teléfonos normalizados, {duplicated} contactos duplicados sin normalizar')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
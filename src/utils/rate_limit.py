@@ -0,0 +1,251 @@
+import math
+import os
+import sqlite3
+import threading
+import time
+
+from flask import jsonify, request, g
+from src.utils.auth import require_auth
+
+
+class RateLimitPolicy:
+    """Política de token bucket: `limit` peticiones cada `period` segundos, ráfaga `burst`"""
+
+    def __init__(self, name, limit, period, burst=None, scope='ip'):
+        self.name = name
+        self.limit = limit
+        self.period = period
+        self.burst = burst or limit
+        self.scope = scope  # ip, user
+
+    @property
+    def rate(self):
+        return self.limit / self.period
+
+
+# Endpoints costosos: hashing de contraseñas, parseo de archivos completos o envíos masivos
+DEFAULT_POLICIES = {
+    'auth.login': [RateLimitPolicy('login', 10, 60, scope='ip')],
+    'auth.issue_token': [RateLimitPolicy('login', 10, 60, scope='ip')],
+    'auth.register': [RateLimitPolicy('register', 5, 60, scope='ip')],
+    'contacts.import_csv': [RateLimitPolicy('import', 5, 60, burst=3, scope='user')],
+    'contacts.import_excel': [RateLimitPolicy('import', 5, 60, burst=3, scope='user')],
+    'contacts.import_google_sheets': [RateLimitPolicy('import', 5, 60, burst=3, scope='user')],
+    'contacts.import_google_drive': [RateLimitPolicy('import', 5, 60, burst=3, scope='user')],
+    'campaigns.send_campaign': [RateLimitPolicy('campaign_send', 10, 60, scope='user')],
+    'automation.whatsapp_webhook': [RateLimitPolicy('webhook', 120, 60, burst=60, scope='ip')],
+}
+
+
+class MemoryBackend:
+    """Buckets en memoria del worker (límites por proceso).
+
+    Un bucket lleno equivale a no tenerlo, así que se descartan los que ya se han
+    rellenado (barrido cada SWEEP_INTERVAL segundos) y, por encima de max_keys,
+    los usados hace más tiempo.
+    """
+
+    SWEEP_INTERVAL = 60
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        # key -> (tokens, actualizado, lleno a partir de); en orden de último uso
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._swept = time.time()
+
+    def _sweep(self, now):
+        full = [key for key, (_, _, full_at) in self._buckets.items() if full_at <= now]
+        for key in full:
+            del self._buckets[key]
+        self._swept = now
+
+    def consume(self, key, rate, capacity, cost=1):
+        now = time.time()
+        with self._lock:
+            tokens, updated, _ = self._buckets.pop(key, (capacity, now, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+
+            if now - self._swept >= self.SWEEP_INTERVAL:
+                self._sweep(now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.pop(next(iter(self._buckets)))
+        return allowed, tokens
+
+class SQLiteBackend:
+    """Buckets compartidos entre workers del mismo host mediante un archivo SQLite.
+
+    Como en MemoryBackend, cada fila guarda cuándo vuelve a estar llena y cada
+    proceso borra las ya rellenadas cada SWEEP_INTERVAL segundos.
+    """
+
+    SWEEP_INTERVAL = 60
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        self._swept = time.time()
+        conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute(
+                'CREATE TABLE IF NOT EXISTS rate_limit_buckets ('
+                'key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL, '
+                'full_at REAL NOT NULL DEFAULT 0)'
+            )
+            # Archivos creados antes de la limpieza: sus filas se borran en el primer barrido
+            columns = {row[1] for row in conn.execute('PRAGMA table_info(rate_limit_buckets)')}
+            if 'full_at' not in columns:
+                conn.execute('ALTER TABLE rate_limit_buckets ADD COLUMN full_at REAL NOT NULL DEFAULT 0')
+            conn.execute('CREATE INDEX IF NOT EXISTS ix_rate_limit_buckets_full_at ON rate_limit_buckets (full_at)')
+        finally:
+            conn.close()
+
+    def _connect(self):
+        # Una conexión por hilo y por proceso: no se comparten a través de fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def consume(self, key, rate, capacity, cost=1):
+        now = time.time()
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?', (key,)
+            ).fetchone()
+            tokens, updated = row if row else (capacity, now)
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            conn.execute(
+                'INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated, full_at) VALUES (?, ?, ?, ?)',
+                (key, tokens, now, now + (capacity - tokens) / rate)
+            )
+            if now - self._swept >= self.SWEEP_INTERVAL:
+                self._swept = now
+                conn.execute('DELETE FROM rate_limit_buckets WHERE full_at <= ?', (now,))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, tokens
+
+
+class RedisBackend:
+    """Buckets compartidos entre nodos vía Redis (o cualquier servidor compatible con su protocolo)"""
+
+    SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local cost = tonumber(ARGV[4])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(bucket[1]) or capacity
+local updated = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + (now - updated) * rate)
+local allowed = 0
+if tokens >= cost then
+  tokens = tokens - cost
+  allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+return {allowed, tostring(tokens)}
+"""
+
+    def __init__(self, url):
+        import redis  # Dependencia opcional: solo se necesita con este backend
+        self._client = redis.Redis.from_url(url)
+        self._script = self._client.register_script(self.SCRIPT)
+
+    def consume(self, key, rate, capacity, cost=1):
+        allowed, tokens = self._script(
+            keys=[f'ratelimit:{key}'],
+            args=[capacity, rate, time.time(), cost]
+        )
+        return bool(allowed), float(tokens)
+
+
+def create_backend(url):
+    """Crear el backend a partir de RATE_LIMIT_BACKEND (memory, sqlite:///ruta, redis://...)"""
+    if not url or url == 'memory':
+        return MemoryBackend()
+    if url.startswith('sqlite:///'):
+        return SQLiteBackend(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBackend(url)
+    raise ValueError(f'Backend de rate limiting no soportado: {url}')
+
+
+class RateLimiter:
+    """Middleware de rate limiting con políticas por endpoint"""
+
+    def __init__(self, backend, policies):
+        self.backend = backend
+        self.policies = policies
+
+    def _identity(self, scope):
+        if scope == 'user':
+            principal = require_auth()
+            if principal:
+                return f'user:{principal.id}'
+        return f'ip:{request.remote_addr or "unknown"}'
+
+    def check(self):
+        policies = self.policies.get(request.endpoint)
+        if not policies or request.method == 'OPTIONS':
+            return None
+
+        for policy in policies:
+            key = f'{policy.name}:{self._identity(policy.scope)}'
+            allowed, remaining = self.backend.consume(key, policy.rate, policy.burst)
+            g.rate_limit = (policy, remaining)
+
+            if not allowed:
+                retry_after = max(1, math.ceil((1 - remaining) / policy.rate))
+                response = jsonify({
+                    'error': 'Demasiadas solicitudes, inténtalo de nuevo más tarde',
+                    'retry_after': retry_after
+                })
+                response.status_code = 429
+                response.headers['Retry-After'] = str(retry_after)
+                self._set_headers(response, policy, remaining)
+                return response
+
+        return None
+
+    def _set_headers(self, response, policy, remaining):
+        response.headers['X-RateLimit-Limit'] = str(policy.limit)
+        response.headers['X-RateLimit-Remaining'] = str(max(0, int(remaining)))
+        response.headers['X-RateLimit-Policy'] = f'{policy.limit};w={policy.period};burst={policy.burst}'
+
+    def add_headers(self, response):
+        state = g.pop('rate_limit', None)
+        if state and response.status_code != 429:
+            self._set_headers(response, *state)
+        return response
+
+
+def init_rate_limiter(app):
+    """Registrar el rate limiter en la aplicación"""
+    if not app.config.get('RATE_LIMIT_ENABLED', True):
+        return None
+
+    limiter = RateLimiter(
+        create_backend(app.config.get('RATE_LIMIT_BACKEND', 'memory')),
+        app.config.get('RATE_LIMIT_POLICIES', DEFAULT_POLICIES)
+    )
+    app.before_request(limiter.check)
+    app.after_request(limiter.add_headers)
+    app.extensions['rate_limiter'] = limiter
+    return limiter
@@ -0,0 +1,129 @@
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import current_app, g, has_request_context, request, session
+from flask_sqlalchemy.session import Session
+
+REPLICA_BIND = 'replica'
+WRITE_METHODS = {'POST', 'PUT', 'PATCH', 'DELETE'}
+
+
+def _replica_requested():
+    return has_request_context() and g.get('db_use_replica', False)
+
+
+class RoutingSession(Session):
+    """Sesión que envía las lecturas de las vistas marcadas a la réplica (si está configurada)"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        # Los flush y las sentencias INSERT/UPDATE/DELETE siempre van al primario
+        if bind is None and not self._flushing and not getattr(clause, 'is_dml', False) \
+                and _replica_requested():
+            engine = self._db.engines.get(REPLICA_BIND)
+            if engine is not None:
+                return engine
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+class WriteTracker:
+    """Recuerda las escrituras recientes de cada usuario para leer después del primario.
+
+    La marca de tiempo viaja en la cookie de sesión (vale entre workers y nodos); para
+    clientes con token se guarda además en memoria del worker.
+    """
+
+    def __init__(self, sticky_seconds, max_size=10000):
+        self.sticky_seconds = sticky_seconds
+        self.max_size = max_size
+        self._recent = {}
+        self._lock = threading.Lock()
+
+    def _user_id(self):
+        claims = g.get('token_claims')
+        if claims:
+            return int(claims['sub'])
+        return session.get('user_id')
+
+    def after_request(self, response):
+        if request.method not in WRITE_METHODS or response.status_code >= 400:
+            return response
+
+        user_id = self._user_id()
+        if not user_id:
+            return response
+
+        now = time.time()
+        if 'user_id' in session:
+            session['db_write_at'] = now
+        with self._lock:
+            if len(self._recent) >= self.max_size:
+                cutoff = now - self.sticky_seconds
+                self._recent = {key: at for key, at in self._recent.items() if at > cutoff}
+            self._recent[user_id] = now
+        return response
+
+    def wrote_recently(self, user_id):
+        cutoff = time.time() - self.sticky_seconds
+        if session.get('db_write_at', 0) > cutoff:
+            return True
+        return self._recent.get(user_id, 0) > cutoff
+
+
+def route_reads_to_replica():
+    """Marcar la petición para leer de la réplica (GET/HEAD y sin escrituras recientes del usuario)"""
+    tracker = current_app.extensions.get('db_replica')
+    if tracker is None or request.method not in ('GET', 'HEAD'):
+        return None
+
+    # Importación diferida: auth importa los modelos, que importan este módulo
+    from src.utils.auth import require_auth
+
+    principal = require_auth()
+    if principal is not None and tracker.wrote_recently(principal.id):
+        return None
+    g.db_use_replica = True
+    return None
+
+
+@contextmanager
+def primary_reads():
+    """Leer del primario dentro del bloque aunque la petición use la réplica.
+
+    Devuelve si la petición estaba leyendo de la réplica.
+    """
+    replica = _replica_requested()
+    if replica:
+        g.db_use_replica = False
+    try:
+        yield replica
+    finally:
+        if replica:
+            g.db_use_replica = True
+
+
+def stop_replica_reads():
+    """Leer del primario el resto de la petición (la réplica va con retraso)"""
+    if has_request_context():
+        g.db_use_replica = False
+
+
+def replica_reads(view):
+    """Decorador para vistas sueltas de solo lectura"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        route_reads_to_replica()
+        return view(*args, **kwargs)
+    return wrapper
+
+
+def init_replica(app):
+    """Activar el enrutado a la réplica si DATABASE_REPLICA_URL está configurada"""
+    if REPLICA_BIND not in app.config.get('SQLALCHEMY_BINDS', {}):
+        return None
+
+    tracker = WriteTracker(app.config.get('REPLICA_STICKY_SECONDS', 10))
+    app.after_request(tracker.after_request)
+    app.extensions['db_replica'] = tracker
+    return tracker
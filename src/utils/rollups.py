@@ -0,0 +1,335 @@
+"""Agregados diarios del dashboard (daily_user_stats y daily_bot_activity).
+
+Se mantienen de forma incremental en cada flush del ORM: cada contacto, campaña
+enviada o actividad del bot suma su aportación al día que le corresponde en la
+zona horaria del usuario, y la resta al borrarse o cambiar. Los borrados masivos
+(que no pasan por el ORM) usan subtract_contacts() y clear_bot_activity().
+
+    python -m src.utils.rollups rebuild [user_id]   # recalcula desde las tablas de hechos
+    python -m src.utils.rollups verify [user_id]    # informa de las diferencias
+"""
+import sys
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from src.models.user import db, User, Contact, Campaign, BotActivity, DailyUserStats, DailyBotActivity
+from src.utils.timeseries import user_zone, zone_for
+
+USER_COUNTERS = (
+    'contacts_new', 'campaigns_sent', 'campaigns_completed',
+    'messages_sent', 'messages_opened', 'messages_clicked'
+)
+# Atributos de los que depende la aportación de cada modelo
+TRACKED = {
+    Contact: ('user_id', 'created_at'),
+    Campaign: ('user_id', 'sent_at', 'status', 'sent_count', 'opened_count', 'clicked_count'),
+    BotActivity: ('user_id', 'created_at', 'activity_type', 'status')
+}
+STREAM_BATCH = 5000
+
+
+def local_day(moment, zone):
+    """Día local de un instante guardado en UTC sin zona"""
+    return moment.replace(tzinfo=timezone.utc).astimezone(zone).date()
+
+
+def local_today(user_id):
+    return datetime.now(user_zone(user_id)).date()
+
+
+class RollupDelta:
+    """Cambios pendientes por (usuario, día) antes de escribirlos en las tablas"""
+
+    def __init__(self, zones):
+        self.zones = zones
+        self.user_rows = defaultdict(lambda: dict.fromkeys(USER_COUNTERS, 0))
+        self.bot_rows = defaultdict(int)
+
+    def add(self, model, values, sign=1):
+        """Sumar (o restar con sign=-1) la aportación de una fila con esos valores"""
+        zone = self.zones[values['user_id']]
+        if model is Contact:
+            if values['created_at'] is not None:
+                row = self.user_rows[(values['user_id'], local_day(values['created_at'], zone))]
+                row['contacts_new'] += sign
+        elif model is Campaign:
+            # Las campañas cuentan el día en que se enviaron
+            if values['sent_at'] is not None:
+                row = self.user_rows[(values['user_id'], local_day(values['sent_at'], zone))]
+                row['campaigns_sent'] += sign
+                row['campaigns_completed'] += sign if values['status'] == 'completed' else 0
+                row['messages_sent'] += sign * (values['sent_count'] or 0)
+                row['messages_opened'] += sign * (values['opened_count'] or 0)
+                row['messages_clicked'] += sign * (values['clicked_count'] or 0)
+        elif model is BotActivity:
+            if values['created_at'] is not None:
+                key = (values['user_id'], local_day(values['created_at'], zone),
+                       values['activity_type'], values['status'] or '')
+                self.bot_rows[key] += sign
+
+    def user_records(self):
+        return [
+            {'user_id': user_id, 'day': day, **counters}
+            for (user_id, day), counters in self.user_rows.items() if any(counters.values())
+        ]
+
+    def bot_records(self):
+        return [
+            {'user_id': user_id, 'day': day, 'activity_type': activity_type, 'status': status, 'total': total}
+            for (user_id, day, activity_type, status), total in self.bot_rows.items() if total
+        ]
+
+
+def user_zones(connection, user_ids):
+    rows = connection.execute(
+        db.select(User.__table__.c.id, User.__table__.c.timezone).where(User.__table__.c.id.in_(user_ids))
+    )
+    zones = defaultdict(lambda: timezone.utc)
+    zones.update({row.id: zone_for(row.timezone) for row in rows})
+    return zones
+
+
+def _increment(connection, table, keys, records):
+    """UPSERT que suma los contadores a las filas existentes"""
+    if not records:
+        return
+    counters = [column.name for column in table.c if column.name not in keys]
+    dialect = connection.dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        insert = (sqlite.insert if dialect == 'sqlite' else postgresql.insert)(table)
+        statement = insert.on_conflict_do_update(
+            index_elements=keys,
+            set_={name: table.c[name] + insert.excluded[name] for name in counters}
+        )
+        connection.execute(statement, records)
+        return
+
+    for record in records:
+        match = [table.c[key] == record[key] for key in keys]
+        result = connection.execute(
+            table.update().where(*match).values({name: table.c[name] + record[name] for name in counters})
+        )
+        if result.rowcount == 0:
+            connection.execute(table.insert().values(record))
+
+
+def apply_delta(connection, delta):
+    _increment(connection, DailyUserStats.__table__, ['user_id', 'day'], delta.user_records())
+    _increment(connection, DailyBotActivity.__table__,
+               ['user_id', 'day', 'activity_type', 'status'], delta.bot_records())
+
+
+def expected_delta(connection, user_id, zone):
+    """Agregados de un usuario recalculados desde contacts, campaigns y bot_activities"""
+    delta = RollupDelta({user_id: zone})
+    streaming = connection.execution_options(yield_per=STREAM_BATCH)
+    for model, attrs in TRACKED.items():
+        table = model.__table__
+        rows = streaming.execute(
+            db.select(*[table.c[attr] for attr in attrs]).where(table.c.user_id == user_id)
+        )
+        for row in rows:
+            delta.add(model, row._mapping)
+    return delta
+
+
+def delete_rows(connection, user_ids):
+    for table in (DailyUserStats.__table__, DailyBotActivity.__table__):
+        connection.execute(table.delete().where(table.c.user_id.in_(user_ids)))
+
+
+def rebuild_user(connection, user_id, zone=None):
+    """Reemplazar los agregados de un usuario por los recalculados"""
+    zone = zone or user_zones(connection, [user_id])[user_id]
+    delta = expected_delta(connection, user_id, zone)
+    delete_rows(connection, [user_id])
+    apply_delta(connection, delta)
+
+
+def verify_user(connection, user_id, zone=None):
+    """Diferencias [(tabla, clave, guardado, esperado)] entre los agregados y los hechos"""
+    zone = zone or user_zones(connection, [user_id])[user_id]
+    delta = expected_delta(connection, user_id, zone)
+    differences = []
+
+    user_table = DailyUserStats.__table__
+    stored = {
+        row.day: {name: row._mapping[name] for name in USER_COUNTERS}
+        for row in connection.execute(user_table.select().where(user_table.c.user_id == user_id))
+    }
+    expected = {record['day']: {name: record[name] for name in USER_COUNTERS} for record in delta.user_records()}
+    for day in sorted(set(stored) | set(expected)):
+        empty = dict.fromkeys(USER_COUNTERS, 0)
+        if stored.get(day, empty) != expected.get(day, empty):
+            differences.append(('daily_user_stats', day, stored.get(day, empty), expected.get(day, empty)))
+
+    bot_table = DailyBotActivity.__table__
+    stored = {
+        (row.day, row.activity_type, row.status): row.total
+        for row in connection.execute(bot_table.select().where(bot_table.c.user_id == user_id))
+    }
+    expected = {(record['day'], record['activity_type'], record['status']): record['total']
+                for record in delta.bot_records()}
+    for key in sorted(set(stored) | set(expected)):
+        if stored.get(key, 0) != expected.get(key, 0):
+            differences.append(('daily_bot_activity', key, stored.get(key, 0), expected.get(key, 0)))
+    return differences
+
+
+def _keep_previous(target, value, oldvalue, initiator):
+    """Sin efecto: solo fuerza a cargar el valor anterior para poder restarlo"""
+
+
+def keep_previous_values(tracked):
+    """Cargar el valor anterior de estos atributos al asignarlos aunque estén expirados"""
+    for model, attrs in tracked.items():
+        for attr in attrs:
+            if not event.contains(getattr(model, attr), 'set', _keep_previous):
+                event.listen(getattr(model, attr), 'set', _keep_previous, active_history=True)
+
+
+keep_previous_values(TRACKED)
+
+
+def previous_values(obj, attrs):
+    """Valores antes del flush (None si alguno no está cargado)"""
+    state = inspect(obj)
+    values = {}
+    for attr in attrs:
+        history = state.attrs[attr].history
+        if history.deleted:
+            values[attr] = history.deleted[0]
+        elif history.unchanged:
+            values[attr] = history.unchanged[0]
+        elif attr in state.committed_state or attr in state.dict:
+            values[attr] = state.committed_state.get(attr, state.dict.get(attr))
+        else:
+            return None
+    return values
+
+
+@event.listens_for(db.orm.Session, 'before_flush')
+def _load_deleted_rollup_values(session, flush_context, instances):
+    """Cargar lo que aportaban las filas que se van a borrar mientras aún existen"""
+    for obj in session.deleted:
+        for attr in TRACKED.get(type(obj), ()):
+            getattr(obj, attr)
+
+
+@event.listens_for(db.orm.Session, 'after_flush')
+def _maintain_rollups(session, flush_context):
+    """Trasladar a los agregados diarios las altas, cambios y bajas de este flush"""
+    changes = []
+    rebuild, dropped = set(), set()
+
+    for obj in session.new:
+        attrs = TRACKED.get(type(obj))
+        if attrs:
+            changes.append((type(obj), {attr: getattr(obj, attr) for attr in attrs}, 1))
+
+    for obj in session.deleted:
+        if isinstance(obj, User):
+            dropped.add(obj.id)
+            continue
+        attrs = TRACKED.get(type(obj))
+        if attrs:
+            previous = previous_values(obj, attrs)
+            if previous is not None:
+                changes.append((type(obj), previous, -1))
+
+    for obj in session.dirty:
+        state = inspect(obj)
+        if isinstance(obj, User):
+            # Con otra zona horaria cambian los días de todo el histórico
+            if state.attrs.timezone.history.has_changes():
+                rebuild.add(obj.id)
+            continue
+        attrs = TRACKED.get(type(obj))
+        if not attrs or not any(state.attrs[attr].history.has_changes() for attr in attrs):
+            continue
+        previous = previous_values(obj, attrs)
+        if previous is None:
+            rebuild.add(obj.user_id)
+            continue
+        changes.append((type(obj), previous, -1))
+        changes.append((type(obj), {attr: getattr(obj, attr) for attr in attrs}, 1))
+
+    changes = [change for change in changes if change[1]['user_id'] not in rebuild | dropped]
+    if not (changes or rebuild or dropped):
+        return
+
+    connection = session.connection()
+    if changes:
+        delta = RollupDelta(user_zones(connection, {values['user_id'] for _, values, _ in changes}))
+        for model, values, sign in changes:
+            delta.add(model, values, sign)
+        apply_delta(connection, delta)
+    for user_id in rebuild - dropped:
+        rebuild_user(connection, user_id)
+    if dropped:
+        delete_rows(connection, dropped)
+
+
+def subtract_contacts(user_id, contact_ids):
+    """Restar contactos que se van a borrar en bloque (llamar antes del DELETE)"""
+    connection = db.session.connection()
+    table = Contact.__table__
+    rows = connection.execute(
+        db.select(table.c.user_id, table.c.created_at)
+        .where(table.c.id.in_(contact_ids), table.c.user_id == user_id)
+    )
+    delta = RollupDelta(user_zones(connection, [user_id]))
+    for row in rows:
+        delta.add(Contact, row._mapping, -1)
+    apply_delta(connection, delta)
+
+
+def clear_bot_activity(user_id):
+    """Vaciar los agregados del bot tras borrar todo el historial del usuario"""
+    db.session.execute(DailyBotActivity.__table__.delete().where(DailyBotActivity.user_id == user_id))
+
+
+def window_start(today, days):
+    """Primer día de una ventana de `days` días que termina hoy"""
+    return today - timedelta(days=days - 1)
+
+
+def main(argv):
+    from src.main import app
+
+    command = argv[1] if len(argv) > 1 else 'verify'
+    if command not in ('rebuild', 'verify'):
+        print(f'Comando desconocido: {command} (usa rebuild o verify)')
+        return 1
+
+    with app.app_context():
+        users = db.select(User.__table__.c.id, User.__table__.c.timezone).order_by(User.__table__.c.id)
+        if len(argv) > 2:
+            users = users.where(User.__table__.c.id == int(argv[2]))
+
+        drifted = 0
+        with db.engine.connect() as connection:
+            with connection.begin():
+                users = connection.execute(users).all()
+            # Una transacción por usuario: el rebuild no bloquea la tabla entera
+            for user in users:
+                with connection.begin():
+                    if command == 'rebuild':
+                        rebuild_user(connection, user.id, zone_for(user.timezone))
+                        continue
+                    differences = verify_user(connection, user.id, zone_for(user.timezone))
+                for table, key, stored, expected in differences:
+                    print(f'❌ usuario {user.id} {table} {key}: guardado {stored}, esperado {expected}')
+                drifted += bool(differences)
+
+        if command == 'rebuild':
+            print('✅ Agregados diarios reconstruidos')
+            return 0
+        print(f"{'❌' if drifted else '✅'} {drifted} usuarios con diferencias")
+        return 1 if drifted else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,113 @@
+import re
+import threading
+import unicodedata
+
+import sqlalchemy as sa
+from src.models.user import db, Contact
+
+# Términos que parecen un teléfono: se buscan por dígitos en cualquier posición
+PHONE_TERM = re.compile(r'^[\d\s()+.-]+$')
+WORD = re.compile(r'\w+', re.UNICODE)
+# Los índices de trigramas necesitan al menos 3 caracteres
+MIN_TRIGRAM_LENGTH = 3
+
+contacts_fts = sa.table('contacts_fts', sa.column('rowid'), sa.column('rank'))
+contacts_phone_fts = sa.table('contacts_phone_fts', sa.column('rowid'), sa.column('rank'))
+
+_backends = {}
+_backends_lock = threading.Lock()
+
+
+def phone_digits(value):
+    return re.sub(r'\D', '', value or '')
+
+
+def strip_accents(value):
+    """Quitar tildes y diéresis (equivalente a unaccent para texto en español)"""
+    decomposed = unicodedata.normalize('NFKD', value)
+    return ''.join(char for char in decomposed if not unicodedata.combining(char))
+
+
+def search_backend():
+    """fts5, trigram o like según lo que haya creado la migración 0004 (se detecta una vez)"""
+    engine = db.engine
+    key = str(engine.url)
+    backend = _backends.get(key)
+    if backend is None:
+        with _backends_lock, engine.connect() as connection:
+            backend = 'like'
+            if connection.dialect.name == 'sqlite':
+                if sa.inspect(connection).has_table('contacts_fts'):
+                    backend = 'fts5'
+            elif connection.dialect.name == 'postgresql':
+                found = connection.execute(
+                    sa.text("SELECT to_regproc('nexus_contact_search_text') IS NOT NULL")
+                ).scalar()
+                if found:
+                    backend = 'trigram'
+            _backends[key] = backend
+    return backend
+
+
+def _fts_query(words, user_id):
+    # Cada palabra como prefijo; la coincidencia exacta suma relevancia en bm25
+    # (los \w no contienen comillas ni operadores de FTS5)
+    terms = ' AND '.join(f'("{word}" OR "{word}"*)' for word in words)
+    return f'owner : "u{user_id}" AND {{name email}} : ({terms})'
+
+
+def _phone_query(digits, user_id):
+    # owner 'u<id>u': con trigramas es una subcadena exacta solo para este usuario
+    return f'owner : "u{user_id}u" AND phone : "{digits}"'
+
+
+def _like_search(query, term, digits):
+    pattern = f'%{term}%'
+    conditions = [Contact.name.ilike(pattern), Contact.phone.ilike(pattern), Contact.email.ilike(pattern)]
+    if digits and digits != term:
+        conditions.append(Contact.phone.ilike(f'%{digits}%'))
+    return query.filter(db.or_(*conditions)), None
+
+
+def apply_contact_search(query, term, user_id):
+    """Filtrar la consulta de contactos por el término de búsqueda.
+
+    Devuelve (query, rank_order): rank_order es la expresión ORDER BY de relevancia
+    (None si el backend no ordena por relevancia).
+    """
+    backend = search_backend()
+    digits = phone_digits(term) if PHONE_TERM.match(term) else ''
+    words = [word.lower() for word in WORD.findall(term)]
+
+    if backend == 'fts5':
+        if digits:
+            if len(digits) < MIN_TRIGRAM_LENGTH:
+                return query.filter(Contact.phone.contains(digits)), None
+            matches = sa.select(contacts_phone_fts.c.rowid, contacts_phone_fts.c.rank)\
+                .where(sa.text('contacts_phone_fts MATCH :phone_query').bindparams(phone_query=_phone_query(digits, user_id)))\
+                .subquery()
+        elif words:
+            matches = sa.select(contacts_fts.c.rowid, contacts_fts.c.rank)\
+                .where(sa.text('contacts_fts MATCH :search_query').bindparams(search_query=_fts_query(words, user_id)))\
+                .subquery()
+        else:
+            return _like_search(query, term, digits)
+        # rank de FTS5 es bm25: menor = más relevante
+        return query.join(matches, matches.c.rowid == Contact.id), matches.c.rank.asc()
+
+    if backend == 'trigram':
+        if digits:
+            if len(digits) < MIN_TRIGRAM_LENGTH:
+                return query.filter(Contact.phone.contains(digits)), None
+            haystack = sa.func.nexus_phone_digits(Contact.phone)
+            return query.filter(haystack.contains(digits)), sa.func.similarity(haystack, digits).desc()
+        if not words:
+            return _like_search(query, term, digits)
+        # Misma expresión que el índice ix_contacts_search_trgm
+        haystack = sa.func.nexus_contact_search_text(Contact.name, Contact.email)
+        words = [strip_accents(word) for word in words]
+        for word in words:
+            query = query.filter(haystack.contains(word, autoescape=True))
+        return query, sa.func.word_similarity(' '.join(words), haystack).desc()
+
+    return _like_search(query, term, digits)
@@ -0,0 +1,146 @@
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+
+from flask import current_app, request, send_file
+from src.utils.compression import is_compressible_mimetype
+
+# Variantes precomprimidas generadas por el build del frontend (app.js.br, app.js.gz)
+PRECOMPRESSED_SUFFIXES = {'.br': 'br', '.gz': 'gzip', '.zst': 'zstd'}
+# Preferencia del servidor ante pesos iguales del cliente
+ENCODING_PREFERENCE = ('br', 'zstd', 'gzip')
+# Assets con hash de contenido en el nombre (Vite: assets/index-4f3a9c1b.js)
+HASHED_ASSET = re.compile(r'(^|/)assets/|[.-][0-9a-fA-F]{8,}\.\w+$')
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, no-cache'
+
+
+class StaticAsset:
+    """Archivo del frontend con su hash y variantes comprimidas en memoria"""
+
+    __slots__ = ('path', 'filepath', 'mimetype', 'size', 'etag', 'immutable', 'data', 'variants')
+
+    def __init__(self, path, filepath, mimetype, size, etag, immutable, data):
+        self.path = path
+        self.filepath = filepath
+        self.mimetype = mimetype
+        self.size = size
+        self.etag = etag
+        self.immutable = immutable
+        # None si el archivo supera el límite en memoria (se sirve desde disco)
+        self.data = data
+        self.variants = {}
+
+
+class StaticManifest:
+    """Mapa ruta URL -> archivo construido una vez al arrancar (sin stat por petición)"""
+
+    def __init__(self, root, max_file_size, compressor=None):
+        self.root = root
+        self.max_file_size = max_file_size
+        self.compressor = compressor
+        self.assets = {}
+        self._lock = threading.Lock()
+        self._build()
+        self.index = self.assets.get('index.html')
+
+    def _build(self):
+        siblings = []
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                filepath = os.path.join(directory, filename)
+                path = os.path.relpath(filepath, self.root).replace(os.sep, '/')
+                base, suffix = os.path.splitext(path)
+                if suffix in PRECOMPRESSED_SUFFIXES:
+                    siblings.append((base, PRECOMPRESSED_SUFFIXES[suffix], path, filepath))
+                self.assets[path] = self._load(path, filepath)
+
+        # Las variantes .br/.gz se asocian al original y dejan de servirse por su cuenta
+        for base, encoding, path, filepath in siblings:
+            original = self.assets.get(base)
+            if original is None or original.data is None:
+                continue
+            with open(filepath, 'rb') as f:
+                original.variants[encoding] = f.read()
+            del self.assets[path]
+
+    def _load(self, path, filepath):
+        size = os.path.getsize(filepath)
+        digest = hashlib.sha256()
+        data = None
+        with open(filepath, 'rb') as f:
+            if size <= self.max_file_size:
+                data = f.read()
+                digest.update(data)
+            else:
+                for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(chunk)
+
+        mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        immutable = path != 'index.html' and bool(HASHED_ASSET.search(path))
+        return StaticAsset(path, filepath, mimetype, size, digest.hexdigest()[:20], immutable, data)
+
+    def resolve(self, path):
+        """Asset para la ruta pedida o index.html (fallback de la SPA)"""
+        return self.assets.get(path) or self.index
+
+    def _negotiate(self, asset):
+        available = set(asset.variants)
+        compressor = self.compressor
+        if compressor is not None and asset.size >= compressor.min_size \
+                and is_compressible_mimetype(asset.mimetype):
+            available.update(compressor.encodings)
+        if not available:
+            return None
+        return request.accept_encodings.best_match(
+            [encoding for encoding in ENCODING_PREFERENCE if encoding in available]
+        )
+
+    def _variant(self, asset, encoding):
+        data = asset.variants.get(encoding)
+        if data is None:
+            # Sin variante del build: se comprime una vez y queda en memoria
+            with self._lock:
+                data = asset.variants.get(encoding)
+                if data is None:
+                    data = self.compressor.compress_static(asset.data, encoding)
+                    asset.variants[encoding] = data
+        return data
+
+    def send(self, asset):
+        """Respuesta con ETag, Cache-Control y la mejor variante comprimida"""
+        if asset.data is None:
+            # Archivos grandes: streaming desde disco con el ETag del manifiesto
+            response = send_file(asset.filepath, mimetype=asset.mimetype, etag=asset.etag,
+                                 conditional=True, max_age=None)
+        else:
+            encoding = self._negotiate(asset)
+            if encoding:
+                response = current_app.response_class(self._variant(asset, encoding), mimetype=asset.mimetype)
+                response.headers['Content-Encoding'] = encoding
+                # Cada representación tiene su propio ETag fuerte
+                response.set_etag(f'{asset.etag}-{encoding}')
+            else:
+                response = current_app.response_class(asset.data, mimetype=asset.mimetype)
+                response.set_etag(asset.etag)
+            response.vary.add('Accept-Encoding')
+            response.make_conditional(request)
+
+        response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL if asset.immutable else REVALIDATE_CACHE_CONTROL
+        return response
+
+
+def init_static_manifest(app):
+    """Construir el manifiesto de la carpeta estática (si existe)"""
+    if app.static_folder is None or not os.path.isdir(app.static_folder):
+        return None
+
+    manifest = StaticManifest(
+        app.static_folder,
+        max_file_size=app.config.get('STATIC_MANIFEST_MAX_FILE_SIZE', 4 * 1024 * 1024),
+        compressor=app.extensions.get('compressor')
+    )
+    app.extensions['static_manifest'] = manifest
+    return manifest
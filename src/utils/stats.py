@@ -0,0 +1,60 @@
+from sqlalchemy import and_, case, func
+from src.models.user import db
+
+
+class StatsQuery:
+    """Varias métricas de una misma tabla en una sola consulta.
+
+    Cada métrica es un agregado condicional: COUNT(*) FILTER (WHERE ...) en
+    PostgreSQL y SUM(CASE WHEN ... END) en el resto. Uso:
+
+        stats = StatsQuery(Contact, Contact.user_id == user.id)\\
+            .count('total')\\
+            .count('active', Contact.status == 'activo')\\
+            .run()
+    """
+
+    def __init__(self, model, *filters):
+        self.model = model
+        self.filters = filters
+        self.metrics = []
+
+    def count(self, name, *conditions):
+        """Número de filas que cumplen las condiciones (todas si no hay)"""
+        self.metrics.append((name, None, conditions))
+        return self
+
+    def sum(self, name, column, *conditions):
+        """Suma de una columna en las filas que cumplen las condiciones"""
+        self.metrics.append((name, column, conditions))
+        return self
+
+    def _expression(self, column, conditions, dialect):
+        if not conditions and column is None:
+            return func.count()
+        if not conditions:
+            aggregate = func.sum(column)
+        elif dialect == 'postgresql':
+            aggregate = (func.count() if column is None else func.sum(column)).filter(and_(*conditions))
+        else:
+            aggregate = func.sum(case((and_(*conditions), 1 if column is None else column), else_=0))
+        # SUM sobre cero filas es NULL
+        return func.coalesce(aggregate, 0)
+
+    def statement(self, dialect=None):
+        dialect = dialect or db.session.get_bind().dialect.name
+        columns = [
+            self._expression(column, conditions, dialect).label(name)
+            for name, column, conditions in self.metrics
+        ]
+        return db.select(*columns).select_from(self.model).where(*self.filters)
+
+    def run(self):
+        """Ejecutar la consulta y devolver {nombre: valor}"""
+        row = db.session.execute(self.statement()).one()
+        return {name: int(value or 0) for name, value in row._mapping.items()}
+
+
+def percentage(part, total, digits=2):
+    """Porcentaje redondeado (0 si el total es 0)"""
+    return round((part / total * 100) if total > 0 else 0, digits)
@@ -0,0 +1,178 @@
+from datetime import datetime, timedelta, timezone
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import sqlalchemy as sa
+from src.models.user import db, User
+
+GRANULARITIES = ('hour', 'day', 'week', 'month')
+DEFAULT_PERIODS = {'hour': 24, 'day': 30, 'week': 12, 'month': 12}
+MAX_PERIODS = 400
+
+# Formato de la etiqueta del bucket en SQLite (mismo que devuelve datetime())
+SQLITE_BUCKET_FORMAT = {
+    'hour': '%Y-%m-%d %H:00:00',
+    'day': '%Y-%m-%d 00:00:00',
+    'week': '%Y-%m-%d 00:00:00',
+    'month': '%Y-%m-01 00:00:00',
+}
+SQLITE_STEP = {'hour': '+1 hour', 'day': '+1 day', 'week': '+7 days', 'month': '+1 month'}
+
+
+def zone_for(name):
+    """ZoneInfo a partir del nombre guardado en users.timezone (UTC si no es válido)"""
+    try:
+        return ZoneInfo(name) if name else timezone.utc
+    except (ZoneInfoNotFoundError, ValueError):
+        return timezone.utc
+
+
+def user_zone(user_id):
+    """Zona horaria configurada por el usuario"""
+    return zone_for(db.session.query(User.timezone).filter(User.id == user_id).scalar())
+
+
+def truncate(value, granularity):
+    """Inicio del bucket que contiene value (semanas de lunes a domingo)"""
+    if granularity == 'hour':
+        return value.replace(minute=0, second=0, microsecond=0)
+    value = value.replace(hour=0, minute=0, second=0, microsecond=0)
+    if granularity == 'week':
+        return value - timedelta(days=value.weekday())
+    if granularity == 'month':
+        return value.replace(day=1)
+    return value
+
+
+def shift(value, granularity, periods):
+    """Desplazar un inicio de bucket n periodos (negativo hacia atrás)"""
+    if granularity == 'month':
+        month_index = value.year * 12 + value.month - 1 + periods
+        return value.replace(year=month_index // 12, month=month_index % 12 + 1)
+    step = {'hour': timedelta(hours=1), 'day': timedelta(days=1), 'week': timedelta(weeks=1)}[granularity]
+    return value + step * periods
+
+
+def to_utc(local, zone):
+    """Hora local sin zona -> UTC sin zona (como se guardan las fechas en la BD)"""
+    return local.replace(tzinfo=zone).astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _offset_minutes(zone, utc_value):
+    return int(utc_value.replace(tzinfo=timezone.utc).astimezone(zone).utcoffset().total_seconds() // 60)
+
+
+def offset_segments(zone, start_utc, end_utc):
+    """[(hasta_utc, offset_minutos)] entre dos instantes; hasta_utc=None en el último tramo.
+
+    Recorre el rango por días y localiza cada cambio de horario con búsqueda binaria.
+    """
+    segments = []
+    current = start_utc
+    offset = _offset_minutes(zone, current)
+    while current < end_utc:
+        following = min(current + timedelta(days=1), end_utc)
+        if _offset_minutes(zone, following) != offset:
+            low, high = current, following
+            while high - low > timedelta(minutes=1):
+                middle = low + (high - low) / 2
+                if _offset_minutes(zone, middle) == offset:
+                    low = middle
+                else:
+                    high = middle
+            high = high.replace(second=0, microsecond=0)
+            segments.append((high, offset))
+            offset = _offset_minutes(zone, high)
+            following = high
+        current = following
+    segments.append((None, offset))
+    return segments
+
+
+def _sqlite_local(column, segments):
+    """Modificador de strftime con el offset de cada tramo (respeta cambios de horario)"""
+    if len(segments) == 1:
+        return sa.literal(f'{segments[0][1]:+d} minutes')
+    whens = [(column < until, sa.literal(f'{offset:+d} minutes')) for until, offset in segments[:-1]]
+    return sa.case(*whens, else_=sa.literal(f'{segments[-1][1]:+d} minutes'))
+
+
+def _sqlite_query(column, value, filters, granularity, first, last, segments):
+    modifier = _sqlite_local(column, segments)
+    bucket_format = SQLITE_BUCKET_FORMAT[granularity]
+    if granularity == 'week':
+        bucket = sa.func.strftime(bucket_format, column, modifier, '-6 days', 'weekday 1')
+    else:
+        bucket = sa.func.strftime(bucket_format, column, modifier)
+
+    facts = sa.select(bucket.label('bucket'), value.label('value'))\
+        .where(*filters).group_by(bucket).subquery('facts')
+
+    first_label = first.strftime('%Y-%m-%d %H:%M:%S')
+    last_label = last.strftime('%Y-%m-%d %H:%M:%S')
+    series = sa.select(sa.literal(first_label).label('bucket')).cte('series', recursive=True)
+    series = series.union_all(
+        sa.select(sa.func.datetime(series.c.bucket, SQLITE_STEP[granularity]))
+        .where(series.c.bucket < last_label)
+    )
+    return series, facts
+
+
+def _postgresql_query(column, value, filters, granularity, first, last, zone_name):
+    if zone_name is None:
+        local = sa.cast(column, sa.DateTime)
+    else:
+        # created_at se guarda en UTC sin zona: UTC -> zona del usuario -> date_trunc
+        local = sa.func.timezone(zone_name, sa.func.timezone('UTC', column))
+    bucket = sa.func.date_trunc(granularity, local)
+
+    facts = sa.select(bucket.label('bucket'), value.label('value'))\
+        .where(*filters).group_by(bucket).subquery('facts')
+
+    step = sa.literal_column(f"interval '1 {granularity}'")
+    series = sa.select(
+        sa.func.generate_series(
+            sa.cast(sa.literal(first), sa.DateTime), sa.cast(sa.literal(last), sa.DateTime), step
+        ).label('bucket')
+    ).cte('series')
+    return series, facts
+
+
+def time_series(column, value, filters, user_id, granularity='day', periods=None, local=False):
+    """Serie temporal con huecos rellenados a 0, en la zona horaria del usuario.
+
+    column: columna de fecha (UTC) que define el bucket, o ya en hora local con
+    local=True (el campo day de las tablas de agregados diarios)
+    value: agregado por bucket (count, sum...)
+    filters: condiciones WHERE (deben acotar por usuario)
+    Devuelve [(inicio_del_bucket_en_hora_local, valor)], del más antiguo al más reciente.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f'Granularidad no válida: {granularity}')
+    periods = max(1, min(periods or DEFAULT_PERIODS[granularity], MAX_PERIODS))
+
+    zone = user_zone(user_id)
+    now_local = datetime.now(zone).replace(tzinfo=None)
+    last = truncate(now_local, granularity)
+    first = shift(last, granularity, -(periods - 1))
+    start_utc = to_utc(first, zone)
+    filters = [*filters, column >= (first.date() if local else start_utc)]
+
+    dialect = db.session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        zone_name = None if local else getattr(zone, 'key', 'UTC')
+        series, facts = _postgresql_query(column, value, filters, granularity, first, last, zone_name)
+    else:
+        segments = [(None, 0)] if local else offset_segments(zone, start_utc, datetime.utcnow())
+        series, facts = _sqlite_query(column, value, filters, granularity, first, last, segments)
+
+    # Una sola consulta: serie de buckets LEFT JOIN agregados
+    query = sa.select(series.c.bucket, sa.func.coalesce(facts.c.value, 0))\
+        .select_from(series.outerjoin(facts, facts.c.bucket == series.c.bucket))\
+        .order_by(series.c.bucket)
+
+    points = []
+    for bucket, total in db.session.execute(query):
+        if isinstance(bucket, str):
+            bucket = datetime.fromisoformat(bucket)
+        points.append((bucket, total))
+    return points
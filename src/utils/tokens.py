@@ -0,0 +1,85 @@
+import hashlib
+import uuid
+from datetime import datetime, timezone
+
+from flask import current_app
+from jose import jwt, JWTError
+
+JWT_ALGORITHM = 'HS256'
+
+
+class TokenError(Exception):
+    """Token inválido, caducado o del tipo incorrecto"""
+
+
+def _password_fingerprint(user):
+    """Huella corta del hash de contraseña: cambiar la contraseña invalida los refresh tokens"""
+    return hashlib.sha256(user.password_hash.encode('utf-8')).hexdigest()[:16]
+
+
+def _encode(claims, expires_delta):
+    now = datetime.now(timezone.utc)
+    claims = dict(claims)
+    claims.update({
+        'iat': int(now.timestamp()),
+        'exp': int((now + expires_delta).timestamp()),
+        'jti': uuid.uuid4().hex
+    })
+    token = jwt.encode(claims, current_app.config['JWT_SECRET_KEY'], algorithm=JWT_ALGORITHM)
+    return token, claims
+
+
+def create_access_token(user):
+    """Token de acceso de corta duración con los claims necesarios para autorizar"""
+    return _encode({
+        'sub': str(user.id),
+        'email': user.email,
+        'name': user.name,
+        'typ': 'access'
+    }, current_app.config['ACCESS_TOKEN_EXPIRES'])
+
+
+def create_refresh_token(user):
+    """Token de refresco de larga duración (revocable)"""
+    return _encode({
+        'sub': str(user.id),
+        'typ': 'refresh',
+        'pwd': _password_fingerprint(user)
+    }, current_app.config['REFRESH_TOKEN_EXPIRES'])
+
+
+def create_token_pair(user):
+    """Emitir un par access/refresh para el usuario"""
+    access_token, _ = create_access_token(user)
+    refresh_token, _ = create_refresh_token(user)
+    return {
+        'access_token': access_token,
+        'refresh_token': refresh_token,
+        'token_type': 'Bearer',
+        'expires_in': int(current_app.config['ACCESS_TOKEN_EXPIRES'].total_seconds())
+    }
+
+
+def decode_token(token, expected_type):
+    """Verificar firma, caducidad y tipo del token (solo CPU, sin consultar la BD)"""
+    try:
+        claims = jwt.decode(token, current_app.config['JWT_SECRET_KEY'], algorithms=[JWT_ALGORITHM])
+    except JWTError as e:
+        raise TokenError(str(e))
+
+    if claims.get('typ') != expected_type:
+        raise TokenError('Tipo de token incorrecto')
+    if not claims.get('sub') or not claims.get('jti'):
+        raise TokenError('Token incompleto')
+
+    return claims
+
+
+def refresh_token_matches_user(claims, user):
+    """Comprobar que el refresh token se emitió con la contraseña actual del usuario"""
+    return claims.get('pwd') == _password_fingerprint(user)
+
+
+def token_expiry(claims):
+    """Fecha de caducidad (UTC naive, como el resto de timestamps del modelo)"""
+    return datetime.utcfromtimestamp(claims['exp'])
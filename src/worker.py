@@ -0,0 +1,102 @@
+"""Worker de importaciones de contactos en segundo plano.
+
+Proceso independiente del web (línea worker del Procfile). Cada hilo reclama
+trabajos de imported_files y los procesa por lotes; con SIGTERM los hilos
+terminan el lote en curso y devuelven el trabajo a la cola para retomarlo.
+
+    python -m src.worker           # IMPORT_WORKER_THREADS hilos (2 por defecto)
+    python -m src.worker --once    # procesa los trabajos pendientes y termina
+"""
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+
+# DON'T CHANGE THIS !!!
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+IMPORT_WORKER_THREADS = int(os.environ.get('IMPORT_WORKER_THREADS', 2))
+# Segundos entre consultas a la cola cuando no hay trabajos
+IMPORT_WORKER_POLL = float(os.environ.get('IMPORT_WORKER_POLL', 2))
+# Cada cuánto se buscan trabajos abandonados por workers caídos
+RECOVER_INTERVAL = 60
+
+logger = logging.getLogger('src.worker')
+
+
+def work(app, stop, once=False):
+    """Bucle de un hilo: reclamar y procesar trabajos hasta que se pida parar"""
+    from src.models.user import db
+    from src.utils.import_jobs import claim_next, run_job
+    from src.utils.importers import ImportSourceError
+
+    while not stop.is_set():
+        job_id = None
+        with app.app_context():
+            try:
+                job_id = claim_next()
+                if job_id is not None:
+                    logger.info('Importación %s iniciada', job_id)
+                    run_job(job_id, stop)
+                    logger.info('Importación %s terminada', job_id)
+            except ImportSourceError as e:
+                # Archivo inválido o no descargable: queda registrado en el trabajo
+                logger.warning('Importación %s fallida: %s', job_id, e)
+            except Exception:
+                logger.exception('Error en la importación %s', job_id)
+                db.session.rollback()
+            finally:
+                db.session.remove()
+        if job_id is not None:
+            continue
+        if once:
+            return
+        stop.wait(IMPORT_WORKER_POLL)
+
+
+def recover(app):
+    """Devolver a la cola los trabajos de workers caídos"""
+    from src.models.user import db
+    from src.utils.import_jobs import recover_stale
+
+    with app.app_context():
+        try:
+            recover_stale()
+        except Exception:
+            logger.exception('Error recuperando importaciones abandonadas')
+        finally:
+            db.session.remove()
+
+
+def main(argv):
+    from src.main import app
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(threadName)s %(message)s')
+    once = '--once' in argv
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stop.set())
+
+    recover(app)
+    recovered_at = time.monotonic()
+    threads = [
+        threading.Thread(target=work, args=(app, stop, once), name=f'import-{i + 1}')
+        for i in range(max(IMPORT_WORKER_THREADS, 1))
+    ]
+    for thread in threads:
+        thread.start()
+    logger.info('Worker de importaciones con %s hilos', len(threads))
+    # join con timeout: el hilo principal sigue atendiendo las señales
+    while any(thread.is_alive() for thread in threads):
+        if time.monotonic() - recovered_at >= RECOVER_INTERVAL:
+            recover(app)
+            recovered_at = time.monotonic()
+        for thread in threads:
+            thread.join(timeout=1)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))